@@ -0,0 +1,143 @@
+"""Comandos de linha de comando (``flask --app run <grupo> <comando>``)."""
+import click
+from flask.cli import AppGroup
+
+produtos_cli = AppGroup('produtos', help='Manutenção do catálogo de produtos.')
+
+
+@produtos_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              default=None, help='Formato do arquivo (padrão: pela extensão).')
+@click.option('--chunk-size', type=int, default=None,
+              help='Linhas gravadas por transação.')
+def import_command(path, fmt, chunk_size):
+    """Importa (upsert) produtos de um arquivo CSV ou NDJSON."""
+    from flask import current_app
+    from app.services.product_import import detect_format, import_products
+
+    fmt = fmt or detect_format(filename=path)
+    chunk_size = chunk_size or current_app.config['IMPORT_CHUNK_SIZE']
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        report = import_products(fh, fmt=fmt, chunk_size=chunk_size)
+
+    for error in report['errors']:
+        click.echo(f"linha {error['row']}: {error['error']}", err=True)
+    click.echo(
+        f"{report['rows']} linhas lidas, {report['created']} criadas, "
+        f"{report['updated']} atualizadas, {report['error_count']} com erro "
+        f"em {report['seconds']}s ({report['rows_per_second']} linhas/s)")
+
+
+@produtos_cli.command('thumbnails')
+def thumbnails_command():
+    """Gera as variantes (miniaturas WebP/AVIF) das imagens já cadastradas."""
+    from app.utils import db
+    from app.models.models import Product
+    from app.services.image_pipeline import get_image_pipeline
+
+    pipeline = get_image_pipeline()
+    if not pipeline.formats:
+        raise click.ClickException("Pillow não instalado (ou sem suporte a WebP/AVIF).")
+    images = db.session.scalars(
+        db.select(Product.image).where(Product.image.isnot(None)).distinct())
+    scheduled = sum(pipeline.schedule(image.split('/')[-1]) is not None
+                    for image in images)
+    pipeline.wait()
+    click.echo(f"{scheduled} imagens processadas.")
+
+
+@produtos_cli.command('reindex')
+def reindex_command():
+    """Reconstrói o índice de busca a partir da tabela de produtos."""
+    from app.utils import db
+    from app.services.search import get_search_backend, rebuild_index
+
+    rebuild_index()
+    db.session.commit()
+    click.echo(f"Índice de busca ({get_search_backend().name}) reconstruído.")
+
+
+assets_cli = AppGroup('assets', help='Arquivos estáticos.')
+
+
+@assets_cli.command('compress')
+def compress_command():
+    """Gera as versões .gz/.br dos arquivos de texto em static/."""
+    from flask import current_app
+    from app.services.assets import brotli, precompress
+
+    written = precompress(current_app.static_folder)
+    if brotli is None:
+        click.echo("pacote 'brotli' não instalado: gerando apenas .gz", err=True)
+    click.echo(f"{written} arquivos comprimidos.")
+
+
+queries_cli = AppGroup('queries', help='Diagnóstico das consultas SQL.')
+
+
+@queries_cli.command('explain')
+@click.option('--verbose', '-v', is_flag=True, help='Mostra o plano completo.')
+def explain_command(verbose):
+    """Roda EXPLAIN nas consultas principais e aponta seq scans (sai com 1)."""
+    from app.services.query_plan import check_query_plans
+
+    flagged = 0
+    for result in check_query_plans():
+        status = 'SEQ SCAN' if result['seq_scans'] else 'ok'
+        click.echo(f"[{status:>8}] {result['name']}")
+        lines = result['plan'] if verbose else result['seq_scans']
+        for line in lines:
+            click.echo(f"           {line}")
+        flagged += bool(result['seq_scans'])
+    if flagged:
+        raise click.ClickException(f"{flagged} consulta(s) com varredura completa.")
+
+
+orders_cli = AppGroup('orders', help='Pedidos e fila de checkout.')
+
+
+@orders_cli.command('process-queue')
+def process_queue_command():
+    """Processa agora os jobs de checkout pendentes (ou abandonados)."""
+    from flask import current_app
+    from app.services.checkout_queue import process_checkout_job, requeue_stale_jobs
+
+    processed = 0
+    for job_id in requeue_stale_jobs(current_app.config['CHECKOUT_JOB_TIMEOUT']):
+        processed += process_checkout_job(job_id)
+    click.echo(f"{processed} jobs processados.")
+
+
+reports_cli = AppGroup('reports', help='Relatórios de vendas.')
+
+
+@reports_cli.command('rebuild')
+def rebuild_reports_command():
+    """Recalcula os agregados de vendas a partir do histórico de pedidos."""
+    from app.services.reporting import rebuild_aggregates
+
+    for table, rows in rebuild_aggregates().items():
+        click.echo(f"{table}: {rows} linhas")
+
+
+reservations_cli = AppGroup('reservations', help='Reservas de estoque dos carrinhos.')
+
+
+@reservations_cli.command('sweep')
+def sweep_reservations_command():
+    """Apaga agora as reservas de estoque vencidas."""
+    from flask import current_app
+    from app.services.reservations import sweep_expired
+
+    swept = sweep_expired(current_app.config['STOCK_HOLD_SWEEP_BATCH'])
+    click.echo(f"{swept} reservas removidas.")
+
+
+def register_commands(app):
+    app.cli.add_command(produtos_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(queries_cli)
+    app.cli.add_command(orders_cli)
+    app.cli.add_command(reports_cli)
+    app.cli.add_command(reservations_cli)
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from flask_login import UserMixin
 from app.utils import db
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -5,6 +7,14 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 class Product(db.Model):
     __tablename__ = 'produtos'
+    __table_args__ = (
+        # paginação por (name, id) e filtro por prefixo do nome
+        db.Index('ix_produtos_name_id', 'name', 'id'),
+        # filtro por faixa de preço
+        db.Index('ix_produtos_price', 'price'),
+        # relatório de estoque baixo
+        db.Index('ix_produtos_stock', 'stock'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     price = db.Column(db.Float, nullable=False)
@@ -13,6 +23,10 @@ class Product(db.Model):
     image = db.Column(db.String(255), nullable=True)
     # optional stock field to support inventory checks
     stock = db.Column(db.Integer, nullable=False, default=0)
+    # incrementada a cada alteração do cadastro (chave do cache de fragmentos);
+    # mudanças só de estoque não alteram a versão
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
 class User(UserMixin, db.Model):
@@ -30,7 +44,6 @@ class User(UserMixin, db.Model):
 
 
 # Orders
-from datetime import datetime
 from enum import Enum
 
 
@@ -43,20 +56,135 @@ class OrderStatus(Enum):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # histórico de pedidos do usuário, mais recentes primeiro
+        db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),
+        # relatórios por status e período
+        db.Index('ix_orders_status_created_at', 'status', 'created_at'),
+        # um pedido por chave de idempotência de cada usuário (checkout repetido)
+        db.UniqueConstraint('user_id', 'idempotency_key',
+                            name='uq_orders_user_id_idempotency_key'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     status = db.Column(db.String(32), nullable=False, default=OrderStatus.PENDING.value)
     total_amount = db.Column(db.Numeric(10, 2), nullable=False, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    items = db.relationship('OrderItem', backref='order', cascade='all, delete-orphan', lazy='joined')
+    idempotency_key = db.Column(db.String(64), nullable=True)
+    # avisos do checkout (JSON), devolvidos de novo quando a chave é repetida
+    warnings = db.Column(db.Text, nullable=True)
+    # sem carga automática: listas usam resumos (order_models.list_orders_page)
+    # e o detalhe pede os itens com selectinload
+    items = db.relationship('OrderItem', backref='order', cascade='all, delete-orphan', lazy='select')
 
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
+    __table_args__ = (
+        db.Index('ix_order_items_order_id', 'order_id'),
+        # vendas por produto
+        db.Index('ix_order_items_product_id_order_id', 'product_id', 'order_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('produtos.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Numeric(10, 2), nullable=False)
     # keep a copy of the product image when the order is created
-    product_image = db.Column(db.String(255), nullable=True)
\ No newline at end of file
+    product_image = db.Column(db.String(255), nullable=True)
+    product = db.relationship('Product', lazy='select')
+
+class CartItem(db.Model):
+    """Linha do carrinho guardada no servidor (ver app/services/cart_store.py).
+
+    Guarda só a quantidade; nome, preço e imagem vêm do catálogo. Não há FK
+    para ``produtos`` porque o carrinho é descartável: itens de produtos
+    removidos são ignorados ao montar o carrinho.
+    """
+    __tablename__ = 'cart_items'
+    cart_id = db.Column(db.String(64), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class StockReservation(db.Model):
+    """Estoque reservado para o carrinho de um usuário até ``expires_at``.
+
+    Ver app/services/reservations.py. Como o carrinho, não tem FK: reservas
+    de produtos removidos só expiram.
+    """
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        # estoque disponível: soma das reservas ativas de um produto só pelo índice
+        db.Index('ix_stock_reservations_product_expires', 'product_id', 'expires_at', 'quantity'),
+        # varredura das reservas expiradas
+        db.Index('ix_stock_reservations_expires_at', 'expires_at'),
+    )
+    user_id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class CheckoutJob(db.Model):
+    """Checkout na fila (``CHECKOUT_MODE=queue``), ver app/services/checkout_queue.py.
+
+    O pedido é criado como ``pending`` ao enfileirar; o worker reserva o
+    estoque, grava os itens e marca o pedido como pago ou cancelado.
+    Em ``running``, ``updated_at`` é o heartbeat da tentativa dona do
+    ``claim_token``.
+    """
+    __tablename__ = 'checkout_jobs'
+    __table_args__ = (
+        # workers buscam os jobs pendentes mais antigos
+        db.Index('ix_checkout_jobs_status_updated_at', 'status', 'updated_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, unique=True)
+    # carrinho como JSON: [{"product_id": ..., "quantity": ...}]
+    cart = db.Column(db.Text, nullable=False)
+    allow_partial = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    # token da tentativa que reivindicou o job; a conclusão exige o mesmo token
+    claim_token = db.Column(db.String(32), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    order = db.relationship('Order', backref=db.backref('checkout_job', uselist=False))
+
+
+# Relatórios: agregados mantidos pelo checkout (app/services/reporting.py).
+# Sem FK para produtos: as vendas de um produto excluído continuam contando.
+
+class SalesDaily(db.Model):
+    """Totais de vendas por dia (UTC)."""
+    __tablename__ = 'sales_daily'
+    day = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class SalesDailyProduct(db.Model):
+    """Vendas de cada produto por dia (UTC)."""
+    __tablename__ = 'sales_daily_product'
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class ProductSales(db.Model):
+    """Vendas acumuladas de cada produto (mais vendidos)."""
+    __tablename__ = 'product_sales'
+    __table_args__ = (
+        db.Index('ix_product_sales_units', 'units'),
+        db.Index('ix_product_sales_revenue', 'revenue'),
+    )
+    product_id = db.Column(db.Integer, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
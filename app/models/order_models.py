@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import selectinload
+
+from app.utils import db
+from app.models.models import Order, OrderItem
+from app.models.product_models import _decode_cursor, _encode_cursor, _page_size
+
+# nº de itens de cada pedido, sem carregar os itens (subconsulta correlacionada
+# que usa ix_order_items_order_id)
+ITEM_COUNT = (
+    select(func.coalesce(func.sum(OrderItem.quantity), 0))
+    .where(OrderItem.order_id == Order.id)
+    .correlate(Order)
+    .scalar_subquery()
+    .label('item_count')
+)
+
+
+def list_orders_page(user_id, cursor=None, limit=None):
+    """Histórico de pedidos do usuário, mais recentes primeiro (keyset).
+
+    Retorna só o resumo de cada pedido (sem os itens) em uma única consulta,
+    então o custo não cresce com o número de itens por pedido. O cursor é
+    ``(created_at, id)`` do último pedido da página, na ordem de
+    ``ix_orders_user_id_created_at``. Lança ValueError se o cursor for inválido.
+    """
+    limit = _page_size(limit)
+    query = db.session.query(
+        Order.id, Order.status, Order.total_amount, Order.created_at, ITEM_COUNT
+    ).filter(Order.user_id == user_id)
+
+    if cursor:
+        last_created, last_id = _decode_cursor(cursor, (str, int))
+        try:
+            last_created = datetime.fromisoformat(last_created)
+        except ValueError:
+            raise ValueError("Cursor de paginação inválido.")
+        query = query.filter(or_(
+            Order.created_at < last_created,
+            and_(Order.created_at == last_created, Order.id < last_id)
+        ))
+
+    rows = (
+        query.order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [
+        {
+            "id": row.id,
+            "status": row.status,
+            "total_amount": row.total_amount,
+            "created_at": row.created_at,
+            "item_count": row.item_count
+        }
+        for row in rows
+    ]
+
+    next_cursor = None
+    if has_next:
+        last = rows[-1]
+        next_cursor = _encode_cursor([last.created_at.isoformat(), last.id])
+
+    return {"items": items, "next_cursor": next_cursor, "limit": limit}
+
+
+def get_user_order(user_id, order_id):
+    """Pedido com itens e produtos (``selectinload``: quatro consultas fixas).
+
+    Retorna None se o pedido não existir ou for de outro usuário.
+    """
+    return (
+        db.session.query(Order)
+        .options(selectinload(Order.items).selectinload(OrderItem.product),
+                 selectinload(Order.checkout_job))
+        .filter(Order.id == order_id, Order.user_id == user_id)
+        .one_or_none()
+    )
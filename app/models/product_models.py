@@ -1,106 +1,347 @@
+import base64
+import json
+import logging
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, or_, select
+
 from app.utils import db
 from app.models.models import Product
+from app.services import product_cache, search
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# colunas usadas pelos templates de catálogo (index.html / product/list.html)
+CATALOG_COLUMNS = (Product.id, Product.name, Product.price, Product.stock, Product.image,
+                   Product.version, Product.updated_at)
+
+
+def _encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor, types=(int,)):
+    """Valores do cursor, um por tipo de ``types`` (ex.: ``(str, int)``).
+
+    Lança ValueError se o cursor não tiver exatamente esse formato.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError("Cursor de paginação inválido.")
+    if (not isinstance(values, list) or len(values) != len(types)
+            or any(isinstance(v, bool) or not isinstance(v, t) for v, t in zip(values, types))):
+        raise ValueError("Cursor de paginação inválido.")
+    return values
+
+
+def _page_size(limit):
+    default = current_app.config.get('CATALOG_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    cap = current_app.config.get('CATALOG_MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+    try:
+        limit = int(limit) if limit else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, cap))
+
+
+def catalog_filters(args):
+    """Lê os filtros do catálogo de uma query string (``request.args``).
+
+    Retorna (kwargs para list_products_page, args para montar os links).
+    Valores inválidos são ignorados.
+    """
+    filters = {}
+    url_args = {}
+
+    for key in ('min_price', 'max_price'):
+        value = args.get(key, '').strip().replace(',', '.')
+        if not value:
+            continue
+        try:
+            filters[key] = float(value)
+            url_args[key] = args.get(key)
+        except ValueError:
+            continue
+
+    if args.get('in_stock') in ('1', 'on', 'true'):
+        filters['in_stock'] = True
+        url_args['in_stock'] = '1'
+
+    name_prefix = args.get('q', '').strip()
+    if name_prefix:
+        filters['name_prefix'] = name_prefix
+        url_args['q'] = name_prefix
+
+    if args.get('order') == 'name':
+        filters['order_by'] = 'name'
+        url_args['order'] = 'name'
+
+    if args.get('limit'):
+        filters['limit'] = args.get('limit')
+        url_args['limit'] = args.get('limit')
+
+    return filters, url_args
+
+
+def list_products_page(cursor=None, limit=None, order_by='id', min_price=None,
+                       max_price=None, in_stock=False, name_prefix=None):
+    """Lista uma página do catálogo usando paginação por cursor (keyset).
+
+    Ordena por ``id`` ou por ``name`` (com ``id`` como desempate) e busca
+    apenas as colunas exibidas nos templates. Retorna um dict com ``items``,
+    ``next_cursor`` (None na última página) e ``limit``.
+    Lança ValueError se o cursor ou a ordenação forem inválidos.
+    As páginas passam pelo cache de produtos.
+    """
+    if order_by not in ('id', 'name'):
+        raise ValueError("Ordenação inválida.")
+    limit = _page_size(limit)
+    params = {
+        "cursor": cursor, "limit": limit, "order_by": order_by,
+        "min_price": min_price, "max_price": max_price,
+        "in_stock": bool(in_stock), "name_prefix": name_prefix
+    }
+    return product_cache.get_catalog_page(
+        params, lambda: _query_products_page(**params))
+
+
+def _query_products_page(cursor, limit, order_by, min_price, max_price,
+                         in_stock, name_prefix):
+    # leitura do catálogo: pode ir para a réplica (ver app/services/database.py)
+    query = db.session.query(*CATALOG_COLUMNS).execution_options(replica=True)
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+    if in_stock:
+        query = query.filter(Product.stock > 0)
+    if name_prefix:
+        query = query.filter(Product.name.startswith(name_prefix, autoescape=True))
+
+    if cursor:
+        values = _decode_cursor(cursor, (str, int) if order_by == 'name' else (int,))
+        if order_by == 'name':
+            last_name, last_id = values
+            query = query.filter(or_(
+                Product.name > last_name,
+                and_(Product.name == last_name, Product.id > last_id)
+            ))
+        else:
+            query = query.filter(Product.id > values[0])
+
+    if order_by == 'name':
+        query = query.order_by(Product.name, Product.id)
+    else:
+        query = query.order_by(Product.id)
 
+    # busca um registro a mais para saber se existe próxima página
+    rows = query.limit(limit + 1).all()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
 
-def list_products():
-    products = Product.query.all()
-    result = [
+    items = [
         {
-            "id": product.id,
-            "name": product.name,
-            "price": product.price,
-            "stock": getattr(product, 'stock', 0),
-            "image": getattr(product, 'image', None),
-            "description": product.description
+            "id": row.id,
+            "name": row.name,
+            "price": row.price,
+            "stock": row.stock,
+            "image": row.image,
+            "version": row.version,
+            "updated_at": row.updated_at
         }
-        for product in products
+        for row in rows
     ]
-    print("Products:", result)  # Debug print
-    return result
+
+    next_cursor = None
+    if has_next:
+        last = rows[-1]
+        next_cursor = _encode_cursor(
+            [last.name, last.id] if order_by == 'name' else [last.id])
+
+    return {"items": items, "next_cursor": next_cursor, "limit": limit}
+
+
+def iter_products(batch_size=1000):
+    """Percorre o catálogo inteiro em lotes (keyset por id), um dict por produto.
+
+    Cada lote é uma consulta curta, então nenhum cursor fica aberto
+    enquanto o consumidor processa os itens.
+    """
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(Product.id, Product.name, Product.price,
+                             Product.description, Product.stock, Product.image)
+            .filter(Product.id > last_id)
+            .order_by(Product.id)
+            .limit(batch_size)
+            .execution_options(replica=True)
+            .all()
+        )
+        if not rows:
+            return
+        for row in rows:
+            yield {
+                "id": row.id,
+                "name": row.name,
+                "price": row.price,
+                "description": row.description,
+                "stock": row.stock,
+                "image": row.image
+            }
+        last_id = rows[-1].id
+
+
+def _load_product(id_product):
+    return db.session.get(Product, id_product)
+
+
+def get_product_snapshot(id_product):
+    """Retorna o produto como dict (via cache) ou None se não existir."""
+    return product_cache.get_product(id_product, _load_product)
+
+
+def _load_products(product_ids):
+    return db.session.scalars(select(Product).where(Product.id.in_(sorted(product_ids)))).all()
+
+
+def get_product_snapshots(product_ids):
+    """{id: dict} dos produtos existentes (cache + um único ``IN`` para os misses)."""
+    return product_cache.get_products(product_ids, _load_products)
+
+
+def load_product_snapshots(product_ids):
+    """{id: dict} lidos do banco num único ``IN`` (sem cache: preço e estoque atuais)."""
+    if not product_ids:
+        return {}
+    return {product.id: product_cache.snapshot(product)
+            for product in _load_products({int(pid) for pid in product_ids})}
 
 
 def product_by_id(id_product):
-    product = Product.query.get(id_product)
+    product = get_product_snapshot(id_product)
     if product:
         return {
-            "id": product.id,
-            "nome": product.name,
-            "preco": product.price,
-            "descricao": product.description,
-            "image": getattr(product, 'image', None),
-            "stock": getattr(product, 'stock', 0)
+            "id": product["id"],
+            "nome": product["name"],
+            "preco": product["price"],
+            "descricao": product["description"],
+            "image": product["image"],
+            "stock": product["stock"],
+            "version": product["version"]
         }
     raise ValueError("Produto não encontrado.")
 
 
-def create_product(data):
-    try:
+class ProductNotFound(ValueError):
+    """Produto inexistente (as rotas respondem 404)."""
 
-        if not data.get("name") or not data.get("price"):
-            raise ValueError("O nome e o preço do produto são obrigatórios.")
-        if data.get("price") > 0:
 
-            stock = int(data.get("stock", 0) or 0)
+def validate_product_data(data):
+    """Valida e normaliza os dados de um novo produto.
 
-            new_product = Product(
-                name=data.get("name"),
-                price=data.get("price"),
-                description=data.get("description"),
-                stock=stock,
-                image=data.get('image')
-            )
+    Aceita valores numéricos ou strings (formulários, CSV). Retorna um dict
+    pronto para ``Product(**dados)``; lança ValueError se algo for inválido.
+    """
+    name = data.get("name")
+    price = data.get("price")
+    if isinstance(name, str):
+        name = name.strip()
+    if isinstance(price, str):
+        price = price.strip().replace(',', '.')
+    if not name or not price:
+        raise ValueError("O nome e o preço do produto são obrigatórios.")
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        raise ValueError("O preço do produto deve ser numérico.")
+    if not price > 0:
+        raise ValueError("O valor do produto deve ser positivo.")
+    try:
+        stock = int(data.get("stock", 0) or 0)
+    except (TypeError, ValueError):
+        raise ValueError("O estoque do produto deve ser um número inteiro.")
 
-            db.session.add(new_product)
-            db.session.commit()
+    return {
+        "name": name,
+        "price": price,
+        "description": data.get("description") or None,
+        "stock": stock,
+        "image": data.get('image') or None
+    }
 
-            return new_product
 
-        else:
-            raise ValueError("O valor do produto deve ser positivo.")
+def create_product(data):
+    try:
+        new_product = Product(**validate_product_data(data))
+
+        db.session.add(new_product)
+        db.session.flush()
+        search.index_products([new_product.id])
+        db.session.commit()
+        product_cache.invalidate_products(new_product.id)
+
+        return new_product
     except Exception as e:
         db.session.rollback()
-        print(f'Erro ao adicionar produto {e}')
+        logger.warning("Erro ao adicionar produto: %s", e,
+                       extra={'event': 'product.create_failed'})
         raise e
 
 
 def update_product(id_product, new_data):
-    product = Product.query.get(id_product)
-    if not product:
-        raise ValueError("Product not found!")
+    """Atualiza os campos enviados em ``new_data`` (atualização parcial).
 
-    print(f"Found product: {product}")
+    O produto resultante passa pelas mesmas regras de ``validate_product_data``.
+    Lança ProductNotFound ou ValueError (dados inválidos).
+    """
+    product = db.session.get(Product, id_product)
+    if not product:
+        raise ProductNotFound("Product not found!")
 
-    product.name = new_data.get("name", product.name)
-    product.price = new_data.get("price", product.price)
-    product.description = new_data.get("description", product.description)
-    # update stock if provided
-    if 'stock' in new_data:
-        try:
-            product.stock = int(new_data.get('stock', product.stock))
-        except Exception:
-            pass
+    logger.debug("Atualizando produto", extra={'event': 'product.update',
+                                                'product_id': product.id})
 
-    # update image if provided
-    if 'image' in new_data:
-        try:
-            product.image = new_data.get('image')
-        except Exception:
-            pass
+    fields = ('name', 'price', 'description', 'stock', 'image')
+    current = {field: getattr(product, field) for field in fields}
+    data = validate_product_data({**current, **{k: v for k, v in new_data.items() if k in fields}})
+    try:
+        for field in fields:
+            if field in new_data:
+                setattr(product, field, data[field])
+        product.version = (product.version or 0) + 1
+        product.updated_at = datetime.utcnow()
 
-    db.session.commit()
+        db.session.flush()
+        search.index_products([product.id])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    product_cache.invalidate_products(product.id)
 
     return product
 
 
 def delete_product(id_product):
-    product = Product.query.get(id_product)
+    product = db.session.get(Product, id_product)
     if not product:
-        raise ValueError("Product not found!")
+        raise ProductNotFound("Product not found!")
     try:
         db.session.delete(product)
+        search.remove_products([id_product])
         db.session.commit()
+        product_cache.invalidate_products(id_product)
         return product
     except Exception as e:
         db.session.rollback()
-        print(f"Error deleting product: {e}")
+        logger.warning("Erro ao deletar produto %s: %s", id_product, e,
+                       extra={'event': 'product.delete_failed'})
         raise e
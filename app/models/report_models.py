@@ -0,0 +1,95 @@
+"""Consultas dos relatórios de vendas e estoque.
+
+Leem só os agregados mantidos por app/services/reporting.py (e o índice
+``ix_produtos_stock``): o custo depende do período ou do ``limit`` pedido,
+não do tamanho do histórico de pedidos.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from app.utils import db
+from app.models.models import Product, ProductSales, SalesDaily, SalesDailyProduct
+from app.models.product_models import _page_size
+
+DEFAULT_PERIOD_DAYS = 30
+MAX_PERIOD_DAYS = 366
+DEFAULT_LOW_STOCK = 5
+
+
+def report_period(start=None, end=None):
+    """Datas ISO (``YYYY-MM-DD``) -> (início, fim), padrão: últimos 30 dias (UTC).
+
+    Lança ValueError para datas inválidas ou período acima de 366 dias.
+    """
+    try:
+        end = date.fromisoformat(end) if end else datetime.utcnow().date()
+        start = date.fromisoformat(start) if start else end - timedelta(days=DEFAULT_PERIOD_DAYS - 1)
+    except ValueError:
+        raise ValueError("Datas devem estar no formato AAAA-MM-DD.")
+    if start > end:
+        raise ValueError("Início do período depois do fim.")
+    if (end - start).days >= MAX_PERIOD_DAYS:
+        raise ValueError(f"Período máximo de {MAX_PERIOD_DAYS} dias.")
+    return start, end
+
+
+def _money(value):
+    return Decimal(value or 0).quantize(Decimal('0.01'))
+
+
+def daily_sales(start, end):
+    """Pedidos, unidades e receita de cada dia com venda no período."""
+    rows = db.session.execute(
+        select(SalesDaily.day, SalesDaily.order_count, SalesDaily.units, SalesDaily.revenue)
+        .where(SalesDaily.day.between(start, end))
+        .order_by(SalesDaily.day)
+    )
+    return [{'day': row.day, 'order_count': row.order_count, 'units': row.units,
+             'revenue': _money(row.revenue)} for row in rows]
+
+
+def daily_product_sales(start, end):
+    """Vendas por dia e produto no período (maior receita primeiro em cada dia)."""
+    rows = db.session.execute(
+        select(SalesDailyProduct.day, SalesDailyProduct.product_id, Product.name,
+               SalesDailyProduct.order_count, SalesDailyProduct.units,
+               SalesDailyProduct.revenue)
+        .outerjoin(Product, Product.id == SalesDailyProduct.product_id)
+        .where(SalesDailyProduct.day.between(start, end))
+        .order_by(SalesDailyProduct.day, SalesDailyProduct.revenue.desc(),
+                  SalesDailyProduct.product_id)
+    )
+    return [{'day': row.day, 'product_id': row.product_id, 'name': row.name,
+             'order_count': row.order_count, 'units': row.units,
+             'revenue': _money(row.revenue)} for row in rows]
+
+
+def top_products(limit=None, by='units'):
+    """Produtos mais vendidos de todo o histórico, por ``units`` ou ``revenue``."""
+    if by not in ('units', 'revenue'):
+        raise ValueError("Ordenação deve ser 'units' ou 'revenue'.")
+    column = getattr(ProductSales, by)
+    rows = db.session.execute(
+        select(ProductSales.product_id, Product.name, ProductSales.order_count,
+               ProductSales.units, ProductSales.revenue)
+        .outerjoin(Product, Product.id == ProductSales.product_id)
+        .order_by(column.desc(), ProductSales.product_id)
+        .limit(_page_size(limit))
+    )
+    return [{'product_id': row.product_id, 'name': row.name,
+             'order_count': row.order_count, 'units': row.units,
+             'revenue': _money(row.revenue)} for row in rows]
+
+
+def low_stock(threshold=DEFAULT_LOW_STOCK, limit=None):
+    """Produtos com estoque até ``threshold``, os mais baixos primeiro."""
+    rows = db.session.execute(
+        select(Product.id, Product.name, Product.stock)
+        .where(Product.stock <= threshold)
+        .order_by(Product.stock, Product.id)
+        .limit(_page_size(limit))
+        .execution_options(replica=True)
+    )
+    return [{'product_id': row.id, 'name': row.name, 'stock': row.stock} for row in rows]
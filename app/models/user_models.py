@@ -1,5 +1,6 @@
 from app.utils import db
 from app.models.models import User
+from app.services.login_guard import get_password_hasher
 
 
 def register_user(username, password, email):
@@ -8,8 +9,9 @@ def register_user(username, password, email):
     if User.query.filter_by(email=email).first():
         raise ValueError("Email já cadastrado")
 
-    new_user = User(username=username, email=email)
-    new_user.set_password(password)
+    # hash no pool limitado do login (pode lançar LoginThrottled)
+    new_user = User(username=username, email=email,
+                    password_hash=get_password_hasher().hash(password))
     db.session.add(new_user)
     db.session.commit()
     return new_user
@@ -0,0 +1,332 @@
+"""API JSON (autenticada por JWT) para produtos e pedidos.
+
+As rotas deste blueprint não usam a sessão do Flask: a autenticação vem do
+header ``Authorization: Bearer <token>`` e nenhuma resposta envia cookie.
+"""
+import io
+import json
+
+from flask import (
+    Blueprint, Response, current_app, jsonify, request, stream_with_context, url_for
+)
+from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required
+
+from app.utils import db
+from app.models.models import User
+from app.models.order_models import get_user_order, list_orders_page
+from app.models.report_models import (
+    DEFAULT_LOW_STOCK, daily_product_sales, daily_sales, low_stock, report_period, top_products
+)
+from app.models.product_models import (
+    catalog_filters, create_product, delete_product, get_product_snapshot,
+    iter_products, list_products_page, update_product, ProductNotFound
+)
+from app.services.order_service import finalize_order
+from app.services.product_import import detect_format, import_products
+from app.services.login_guard import LoginThrottled, authenticate
+from app.services.reporting import csv_stream
+from app.services.search import search_products
+
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+
+def _error(message, status):
+    return jsonify({"error": message}), status
+
+
+def _json_body():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ValueError("Corpo JSON inválido.")
+    return data
+
+
+class TokenUserNotFound(Exception):
+    """Token válido de um usuário que não existe mais (ex.: removido)."""
+
+
+@api_bp.errorhandler(TokenUserNotFound)
+def _token_user_not_found(exc):
+    return _error("Usuário do token não encontrado.", 401)
+
+
+def _current_user():
+    user = db.session.get(User, int(get_jwt_identity()))
+    if user is None:
+        raise TokenUserNotFound()
+    return user
+
+
+def _product_json(product):
+    return {
+        "id": product.id,
+        "name": product.name,
+        "price": product.price,
+        "description": product.description,
+        "stock": product.stock,
+        "image": product.image
+    }
+
+
+def _order_json(order):
+    job = order.checkout_job
+    return {
+        "id": order.id,
+        "status": order.status,
+        "error": job.error if job is not None else None,
+        "total_amount": str(order.total_amount),
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+        "items": [
+            {
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "unit_price": str(item.unit_price)
+            }
+            for item in order.items
+        ]
+    }
+
+
+def _order_summary_json(order):
+    return {
+        "id": order['id'],
+        "status": order['status'],
+        "total_amount": str(order['total_amount']),
+        "created_at": order['created_at'].isoformat() if order['created_at'] else None,
+        "item_count": order['item_count']
+    }
+
+
+@api_bp.route('/auth/token', methods=['POST'])
+def token():
+    try:
+        data = _json_body()
+    except ValueError as e:
+        return _error(str(e), 400)
+    try:
+        user = authenticate(data.get('username'), data.get('password'))
+    except LoginThrottled as exc:
+        return jsonify({"error": str(exc)}), exc.status, {'Retry-After': str(exc.retry_after)}
+    if not user:
+        return _error("Credenciais inválidas", 401)
+    return jsonify({"access_token": create_access_token(identity=str(user.id))})
+
+
+@api_bp.route('/produtos', methods=['GET'])
+@jwt_required()
+def list_products_api():
+    filters, _ = catalog_filters(request.args)
+    try:
+        page = list_products_page(cursor=request.args.get('cursor'), **filters)
+    except ValueError as e:
+        return _error(str(e), 400)
+    return jsonify(page)
+
+
+@api_bp.route('/produtos/busca', methods=['GET'])
+@jwt_required()
+def search_products_api():
+    """Busca ranqueada por nome/descrição: ``?q=<termos>&limit=<n>``."""
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 20, type=int) or 20,
+                current_app.config['CATALOG_MAX_PAGE_SIZE'])
+    return jsonify({"query": query,
+                    "items": search_products(query, limit) if query else []})
+
+
+@api_bp.route('/produtos/export', methods=['GET'])
+@jwt_required()
+def export_products():
+    """Exporta o catálogo inteiro como NDJSON, um produto por linha."""
+    def generate():
+        for product in iter_products():
+            yield json.dumps(product, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson')
+
+
+@api_bp.route('/produtos/import', methods=['POST'])
+@jwt_required()
+def import_products_api():
+    """Importa produtos de um CSV/NDJSON (campo ``file`` ou corpo da requisição).
+
+    Retorna o relatório com erros por linha e a vazão (linhas/s).
+    """
+    upload = request.files.get('file')
+    if upload:
+        raw, filename, content_type = upload.stream, upload.filename, upload.mimetype
+    else:
+        raw, filename, content_type = request.stream, None, request.mimetype
+    fmt = request.args.get('format') or detect_format(filename, content_type)
+    chunk_size = request.args.get(
+        'chunk_size', type=int) or current_app.config['IMPORT_CHUNK_SIZE']
+
+    lines = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+    try:
+        report = import_products(lines, fmt=fmt, chunk_size=chunk_size)
+    except (ValueError, UnicodeDecodeError) as e:
+        return _error(str(e), 400)
+    return jsonify(report)
+
+
+@api_bp.route('/produtos/<int:id_product>', methods=['GET'])
+@jwt_required()
+def get_product_api(id_product):
+    product = get_product_snapshot(id_product)
+    if product is None:
+        return _error("Produto não encontrado.", 404)
+    return jsonify(product)
+
+
+@api_bp.route('/produtos', methods=['POST'])
+@jwt_required()
+def create_product_api():
+    try:
+        product = create_product(_json_body())
+    except (ValueError, TypeError) as e:
+        return _error(str(e), 400)
+    return jsonify(_product_json(product)), 201
+
+
+@api_bp.route('/produtos/<int:id_product>', methods=['PUT'])
+@jwt_required()
+def update_product_api(id_product):
+    try:
+        data = _json_body()
+    except ValueError as e:
+        return _error(str(e), 400)
+    try:
+        product = update_product(id_product, data)
+    except ProductNotFound as e:
+        return _error(str(e), 404)
+    except (ValueError, TypeError) as e:
+        return _error(str(e), 400)
+    return jsonify(_product_json(product))
+
+
+@api_bp.route('/produtos/<int:id_product>', methods=['DELETE'])
+@jwt_required()
+def delete_product_api(id_product):
+    try:
+        delete_product(id_product)
+    except ValueError as e:
+        return _error(str(e), 404)
+    return '', 204
+
+
+@api_bp.route('/orders', methods=['POST'])
+@jwt_required()
+def create_order_api():
+    """Cria um pedido a partir de ``{"items": [{"product_id", "quantity"}]}``.
+
+    O header ``Idempotency-Key`` torna a chamada segura para retry: a mesma
+    chave devolve o mesmo pedido. Com ``CHECKOUT_MODE=queue`` a resposta é
+    202 com o pedido ``pending``; consulte ``GET /api/orders/<id>``.
+    """
+    key = request.headers.get('Idempotency-Key') or None
+    try:
+        data = _json_body()
+        allow_partial = bool(data.get('allow_partial', False))
+        if current_app.config.get('CHECKOUT_MODE') == 'queue':
+            from app.services.checkout_queue import enqueue_order
+            order = enqueue_order(_current_user(), data.get('items'),
+                                  allow_partial=allow_partial, idempotency_key=key)
+            response = jsonify({"order": _order_json(order), "warnings": []})
+            response.headers['Location'] = url_for('api.get_order_api', order_id=order.id)
+            return response, 202
+        order, warnings, _ = finalize_order(
+            _current_user(), data.get('items'),
+            allow_partial=allow_partial, idempotency_key=key)
+    except ValueError as e:
+        return _error(str(e), 400)
+    return jsonify({"order": _order_json(order), "warnings": warnings}), 201
+
+
+@api_bp.route('/orders', methods=['GET'])
+@jwt_required()
+def list_orders_api():
+    """Histórico paginado (``?cursor=&limit=``): só o resumo de cada pedido."""
+    try:
+        page = list_orders_page(int(get_jwt_identity()),
+                                cursor=request.args.get('cursor'),
+                                limit=request.args.get('limit'))
+    except ValueError as e:
+        return _error(str(e), 400)
+    return jsonify({
+        "items": [_order_summary_json(order) for order in page['items']],
+        "next_cursor": page['next_cursor'],
+        "limit": page['limit']
+    })
+
+
+@api_bp.route('/orders/<int:order_id>', methods=['GET'])
+@jwt_required()
+def get_order_api(order_id):
+    order = get_user_order(int(get_jwt_identity()), order_id)
+    if order is None:
+        return _error("Pedido não encontrado.", 404)
+    return jsonify(_order_json(order))
+
+
+# ------- RELATÓRIOS (agregados em app/services/reporting.py) -------
+
+def _report(name, columns, rows, **extra):
+    """JSON ``{"items": [...]}`` ou, com ``?format=csv``, CSV em streaming."""
+    if request.args.get('format') == 'csv':
+        return Response(
+            stream_with_context(csv_stream(columns, rows)), mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={name}.csv'})
+    items = [{key: str(value) if key in ('day', 'revenue') else value
+              for key, value in row.items()} for row in rows]
+    return jsonify({"items": items, **extra})
+
+
+@api_bp.route('/reports/sales/daily', methods=['GET'])
+@jwt_required()
+def daily_sales_report():
+    """Pedidos, unidades e receita por dia (``?start=&end=``, AAAA-MM-DD)."""
+    try:
+        start, end = report_period(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return _error(str(e), 400)
+    rows = daily_sales(start, end)
+    return _report('vendas-diarias', ['day', 'order_count', 'units', 'revenue'], rows,
+                   start=start.isoformat(), end=end.isoformat(),
+                   units=sum(row['units'] for row in rows),
+                   revenue=str(sum(row['revenue'] for row in rows)))
+
+
+@api_bp.route('/reports/sales/products', methods=['GET'])
+@jwt_required()
+def daily_product_sales_report():
+    """Vendas por dia e produto (``?start=&end=``)."""
+    try:
+        start, end = report_period(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return _error(str(e), 400)
+    return _report('vendas-por-produto',
+                   ['day', 'product_id', 'name', 'order_count', 'units', 'revenue'],
+                   daily_product_sales(start, end),
+                   start=start.isoformat(), end=end.isoformat())
+
+
+@api_bp.route('/reports/top-products', methods=['GET'])
+@jwt_required()
+def top_products_report():
+    """Mais vendidos (``?by=units|revenue&limit=``)."""
+    try:
+        rows = top_products(request.args.get('limit'), by=request.args.get('by', 'units'))
+    except ValueError as e:
+        return _error(str(e), 400)
+    return _report('mais-vendidos', ['product_id', 'name', 'order_count', 'units', 'revenue'],
+                   rows)
+
+
+@api_bp.route('/reports/low-stock', methods=['GET'])
+@jwt_required()
+def low_stock_report():
+    """Produtos com estoque até ``?threshold=`` (padrão 5)."""
+    threshold = request.args.get('threshold', DEFAULT_LOW_STOCK, type=int)
+    return _report('estoque-baixo', ['product_id', 'name', 'stock'],
+                   low_stock(threshold, request.args.get('limit')), threshold=threshold)
@@ -0,0 +1,35 @@
+import mimetypes
+
+from flask import Blueprint, abort, request, send_file
+
+from app.services.assets import file_digest, precompressed, static_path
+
+assets_bp = Blueprint('assets', __name__)
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+@assets_bp.route('/assets/<digest>/<path:filename>', endpoint='static_asset')
+def static_asset(digest, filename):
+    """Serve um arquivo de ``static/`` pela URL com fingerprint.
+
+    Se o hash bate com o conteúdo atual a resposta é imutável; um hash antigo
+    (deploy novo) recebe o conteúdo atual sem cache longo.
+    """
+    path = static_path(filename)
+    if path is None:
+        abort(404)
+    current = file_digest(filename)
+    served, encoding = precompressed(path, request.accept_encodings)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_file(served, mimetype=mimetype, conditional=True,
+                         etag=f'{current}-{encoding or "identity"}')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if digest == current:
+        response.headers['Cache-Control'] = IMMUTABLE
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,31 +1,93 @@
-from flask import render_template, request, redirect, url_for, flash, session, current_app
+from flask import render_template, request, redirect, url_for, flash, session, current_app, abort
 from flask_login import login_user, login_required, logout_user, current_user
 from flask import (
     Blueprint, jsonify, request, render_template, url_for, flash, redirect
 )
 from app.models.product_models import (
-    list_products, create_product, update_product,
-    delete_product, product_by_id
+    list_products_page, create_product, update_product,
+    delete_product, product_by_id, get_product_snapshot, get_product_snapshots,
+    catalog_filters
 )
 from app.models.user_models import register_user
-from app.models.models import Product, User
+from app.models.order_models import get_user_order, list_orders_page
 from flask_jwt_extended import (
     create_access_token, jwt_required, get_jwt_identity
 )
 from app.services.order_service import finalize_order
+from app.services import product_cache
+from app.services.assets import asset_url
+from app.services.cart_pricing import price_cart, price_changes, seen_prices
+from app.services.cart_store import get_cart_store
+from app.services.image_pipeline import image_state, store_upload
+from app.services.login_guard import LoginThrottled, authenticate, check_register_rate
+from app.services.reservations import hold_cart, release_holds
+from app.services.search import search_products
+from app.services.user_cache import invalidate_user
 from datetime import timedelta
-from werkzeug.exceptions import BadRequest
-from werkzeug.utils import secure_filename
-import os
+import hashlib
+import json
+import logging
 import uuid
+from werkzeug.exceptions import BadRequest
 
 main_bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
+
+
+def _catalog_page():
+    filters, url_args = catalog_filters(request.args)
+    try:
+        page = list_products_page(cursor=request.args.get('cursor'), **filters)
+    except ValueError as e:
+        flash(str(e), "product_danger")
+        page = list_products_page(**filters)
+    return page, url_args
+
+
+def _catalog_response(template, page, filters, **context):
+    """Renderiza uma página do catálogo com ETag e Last-Modified.
+
+    O ETag cobre tudo o que a página mostra: a página do catálogo (versão,
+    produtos e se as variantes das imagens já existem), o usuário (id e o nome exibido na saudação) e o contador do
+    carrinho. Se o cliente já tem essa
+    versão a resposta é 304, sem renderizar. Com mensagens flash pendentes a
+    página é sempre renderizada (para consumi-las).
+    """
+    items = page['items'] if page else []
+    user_id = current_user.get_id()
+    validators = [
+        request.full_path, asset_url('style.css'), user_id,
+        getattr(current_user, 'username', None),
+        get_cart_store().count(_cart_id()) if user_id else 0,
+        product_cache.catalog_version() if page else None,
+        [(item['id'], item.get('version'), image_state(item.get('image')))
+         for item in items],
+    ]
+    response = current_app.response_class(mimetype='text/html')
+    response.set_etag(hashlib.sha1(
+        json.dumps(validators, default=str).encode('utf-8')).hexdigest())
+    updated = [item['updated_at'] for item in items if item.get('updated_at')]
+    if updated:
+        response.last_modified = max(updated)
+    # revalida sempre; a página depende da sessão
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+
+    if '_flashes' not in session:
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+    response.set_data(render_template(template, page=page, filters=filters, **context))
+    return response
 
 
 @main_bp.route('/')
 def index():
-    product = Product.query.all()
-    return render_template('index.html', product=product)
+    if not current_user.is_authenticated:
+        return _catalog_response('index.html', None, {}, product=[])
+    page, filters = _catalog_page()
+    return _catalog_response('index.html', page, filters, product=page['items'])
 
 
 @main_bp.route('/produtos/novo', methods=["GET", "POST"],
@@ -40,16 +102,8 @@ def create_product_view():
         image_file = request.files.get('image')
         image_path = None
         if image_file and image_file.filename:
-            filename = secure_filename(image_file.filename)
-            # ensure uploads directory exists under static
-            uploads_dir = os.path.join(current_app.static_folder, 'uploads')
-            os.makedirs(uploads_dir, exist_ok=True)
-            # make filename unique
-            unique_name = f"{uuid.uuid4().hex}_{filename}"
-            dest = os.path.join(uploads_dir, unique_name)
-            image_file.save(dest)
-            # store relative path under static/ for use by templates
-            image_path = os.path.join('uploads', unique_name)
+            # salvo pelo hash do conteúdo; miniaturas geradas em segundo plano
+            image_path = store_upload(image_file)
         new_product_data = {
             "name": data["name"],
             "price": float(data["price"]),
@@ -82,13 +136,8 @@ def update_product_view(id_product):
         image_file = request.files.get('image')
         image_path = None
         if image_file and image_file.filename:
-            filename = secure_filename(image_file.filename)
-            uploads_dir = os.path.join(current_app.static_folder, 'uploads')
-            os.makedirs(uploads_dir, exist_ok=True)
-            unique_name = f"{uuid.uuid4().hex}_{filename}"
-            dest = os.path.join(uploads_dir, unique_name)
-            image_file.save(dest)
-            image_path = os.path.join('uploads', unique_name)
+            # salvo pelo hash do conteúdo; miniaturas geradas em segundo plano
+            image_path = store_upload(image_file)
         updated_data = {
             "name": data["name"],
             "price": float(data["price"]),
@@ -132,9 +181,20 @@ def delete_product_view(id_product):
 @main_bp.route('/produtos', methods=['GET'], endpoint='get_products')
 @login_required
 def get_products():
-    products = list_products()
-    print("Products in get_products:", products)  # Debug print
-    return render_template('product/list.html', products=products)
+    page, filters = _catalog_page()
+    logger.debug("Página do catálogo", extra={
+        'event': 'catalog.page', 'items': len(page['items']),
+        'next_cursor': page['next_cursor'], 'filters': filters})
+    return _catalog_response('product/list.html', page, filters,
+                             products=page['items'])
+
+
+@main_bp.route('/busca', methods=['GET'], endpoint='search')
+@login_required
+def search():
+    query = request.args.get('q', '').strip()
+    products = search_products(query) if query else []
+    return render_template('product/search.html', products=products, query=query)
 
 
 @main_bp.route('/produtos/<int:id_product>', methods=["GET"],
@@ -172,11 +232,14 @@ def register_view():
             return render_template("user/register.html"), 400
 
         try:
+            check_register_rate()
             user = register_user(
                 username=username, email=email, password=password)
             login_user(user)
             flash("Usuário registrado com sucesso!", "auth_success")
             return redirect(url_for('main.index'))
+        except LoginThrottled as exc:
+            return _throttled("user/register.html", exc)
         except ValueError as e:
             flash(f"Erro: {e}", "auth_danger")
             return render_template("user/register.html"), 400
@@ -196,8 +259,11 @@ def login():
     if request.method == 'POST':
         username = request.form.get("username")
         password = request.form.get("password")
-        user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        try:
+            user = authenticate(username, password)
+        except LoginThrottled as exc:
+            return _throttled("user/login.html", exc)
+        if user:
             login_user(user)
             flash("Login bem-sucedido!", "auth_success")
             return redirect(url_for('main.index'))
@@ -206,74 +272,107 @@ def login():
     return render_template("user/login.html")
 
 
+def _throttled(template, exc):
+    flash(str(exc), "auth_danger")
+    return render_template(template), exc.status, {'Retry-After': str(exc.retry_after)}
+
+
 @main_bp.route('/logout', methods=['GET', 'POST'],
                endpoint='logout')
 @login_required
 def logout():
+    invalidate_user(current_user.id)
     logout_user()
     session.clear()
     flash("Logout realizado com sucesso.", "auth_success")
     return redirect(url_for('main.index'))
 
 
-# ------- CARRINHO (session-based) -------
+# ------- CARRINHO (server-side, ver app/services/cart_store.py) -------
 
-def _get_cart():
-    cart = session.get('cart', {'items': {}, 'qty': 0, 'total': 0.0})
-    if 'items' in cart:
-        cart['items'] = {str(k): v for k, v in cart['items'].items()}
-    return cart
+def _cart_id():
+    return str(current_user.id)
 
 
-def _recalc_cart(cart):
-    qty = 0
-    total = 0.0
-    for item in cart['items'].values():
-        qty += item['qty']
-        total += item['price'] * item['qty']
-    cart['qty'] = qty
-    cart['total'] = total
+def _get_cart(seen=None, live=False):
+    """Carrinho do usuário precificado com os produtos atuais (ver cart_pricing)."""
+    store = get_cart_store()
+    cart = price_cart(store.items(_cart_id()), seen, live, user_id=current_user.id)
+    for pid in cart['missing']:
+        # produto removido do catálogo
+        store.remove(_cart_id(), pid)
     return cart
 
 
-def _save_cart(cart):
-    cart = _recalc_cart(cart)
-    cart['items'] = {str(k): v for k, v in cart['items'].items()}
-    session['cart'] = cart
-    session.modified = True
+def _apply_cart_quantities(form):
+    """Aplica os campos ``qty_<product_id>`` do formulário aos itens existentes."""
+    store = get_cart_store()
+    current = store.items(_cart_id())
+    for pid, qty in form.items():
+        if not pid.startswith('qty_'):
+            continue
+        product_id_str = pid.split('_', 1)[1]
+        if not (product_id_str.isdigit() and int(product_id_str) in current):
+            continue
+        try:
+            qty = max(1, int(qty))
+        except ValueError:
+            continue
+        store.set(_cart_id(), int(product_id_str), qty)
+
+
+def _hold_cart(quantities):
+    """Reserva o estoque dos itens e avisa quando não há o suficiente."""
+    held = hold_cart(current_user.id, quantities)
+    if any(held[pid] < qty for pid, qty in quantities.items()):
+        names = {p['id']: p['name'] for p in get_product_snapshots(quantities).values()}
+        for pid, qty in quantities.items():
+            if pid not in names or held[pid] >= qty:
+                continue
+            if held[pid]:
+                flash(f"Só {held[pid]} de {qty} unidade(s) de ‘{names[pid]}’ ficaram "
+                      f"reservadas para você.", "product_danger")
+            else:
+                flash(f"‘{names[pid]}’ está sem estoque disponível no momento.",
+                      "product_danger")
+
+
+@main_bp.app_context_processor
+def inject_cart_count():
+    def cart_count():
+        if not current_user.is_authenticated:
+            return 0
+        return get_cart_store().count(_cart_id())
+    return {'cart_count': cart_count}
 
 
 @main_bp.route('/carrinho', methods=['GET'], endpoint='cart_view')
 @login_required
 def cart_view():
     cart = _get_cart()
-    return render_template('cart/cart.html', cart=cart)
+    # chave de idempotência do checkout: reenvios deste formulário geram um só pedido
+    return render_template('cart/cart.html', cart=cart, checkout_key=uuid.uuid4().hex)
 
 
 @main_bp.route('/carrinho/adicionar/<int:product_id>',
                methods=['POST'], endpoint='cart_add')
 @login_required
 def cart_add(product_id):
-    qty = int(request.form.get('qty', 1))
-    product = Product.query.get_or_404(product_id)
-
-    cart = _get_cart()
-    items = cart['items']
-    key = str(product_id)
-
-    if key in items:
-        items[key]['qty'] += qty
-    else:
-        items[key] = {
-            'id': product.id,
-            'name': product.name,
-            'price': float(product.price),
-            'qty': qty,
-            'image': getattr(product, 'image', None)
-        }
-
-    _save_cart(cart)
-    flash(f"‘{product.name}’ adicionado ao carrinho.", "product_success")
+    try:
+        qty = int(request.form.get('qty', 1))
+    except ValueError:
+        qty = 0
+    if qty < 1:
+        flash("Informe uma quantidade de pelo menos 1 unidade.", "product_danger")
+        return redirect(request.referrer or url_for('main.index'))
+    product = get_product_snapshot(product_id)
+    if product is None:
+        abort(404)
+
+    store = get_cart_store()
+    store.add(_cart_id(), product_id, qty)
+    flash(f"‘{product['name']}’ adicionado ao carrinho.", "product_success")
+    _hold_cart({product_id: store.items(_cart_id())[product_id]})
     return redirect(request.referrer or url_for('main.index'))
 
 
@@ -281,34 +380,30 @@ def cart_add(product_id):
                methods=['POST'], endpoint='cart_remove')
 @login_required
 def cart_remove(product_id):
-    cart = _get_cart()
-    key = str(product_id)
-    if key in cart['items']:
-        removed = cart['items'].pop(key)
-        _save_cart(cart)
-        flash(f"‘{removed['name']}’ removido do carrinho.", "product_success")
+    release_holds(current_user.id, [product_id])
+    if get_cart_store().remove(_cart_id(), product_id):
+        product = get_product_snapshot(product_id)
+        name = product['name'] if product else product_id
+        flash(f"‘{name}’ removido do carrinho.", "product_success")
     return redirect(url_for('main.cart_view'))
 
 
 @main_bp.route('/carrinho/atualizar', methods=['POST'], endpoint='cart_update')
 @login_required
 def cart_update():
-    cart = _get_cart()
-    for pid, qty in request.form.items():
-        if not pid.startswith('qty_'):
-            continue
-        product_id_str = pid.split('_', 1)[1]
-        if product_id_str in cart['items']:
-            cart['items'][product_id_str]['qty'] = max(1, int(qty))
-    _save_cart(cart)
+    _apply_cart_quantities(request.form)
+    for warning in price_changes(_get_cart(seen_prices(request.form))):
+        flash(warning['message'], 'product_danger')
     flash("Carrinho atualizado.", "product_success")
+    _hold_cart(get_cart_store().items(_cart_id()))
     return redirect(url_for('main.cart_view'))
 
 
 @main_bp.route('/carrinho/limpar', methods=['POST'], endpoint='cart_clear')
 @login_required
 def cart_clear():
-    session['cart'] = {'items': {}, 'qty': 0, 'total': 0.0}
+    get_cart_store().clear(_cart_id())
+    release_holds(current_user.id)
     flash("Carrinho limpo.", "product_success")
     return redirect(url_for('main.cart_view'))
 
@@ -316,28 +411,51 @@ def cart_clear():
 @main_bp.route('/orders/checkout', methods=['POST'], endpoint='checkout')
 @login_required
 def checkout():
-    # tenta usar o carrinho da sessão, senão aceita cart no body JSON
-    # If quantities were submitted via form (qty_...), update the session cart first
+    # tenta usar o carrinho do servidor, senão aceita cart no body JSON
+    # If quantities were submitted via form (qty_...), update the stored cart first
     if request.form:
-        cart = _get_cart()
-        for pid, qty in request.form.items():
-            if not pid.startswith('qty_'):
-                continue
-            product_id_str = pid.split('_', 1)[1]
-            if product_id_str in cart['items']:
-                cart['items'][product_id_str]['qty'] = max(1, int(qty))
-        _save_cart(cart)
+        _apply_cart_quantities(request.form)
+
+    # preços e estoque do banco: o pedido nunca usa um snapshot antigo do cache
+    cart = _get_cart(seen_prices(request.form), live=True)
+    products = cart['products']
+    changed = price_changes(cart)
+    if changed:
+        # o cliente confirma o total com os preços novos antes de fechar o pedido
+        for warning in changed:
+            flash(warning['message'], 'product_danger')
+        flash("Confira os novos preços e finalize a compra novamente.", 'product_danger')
+        return redirect(url_for('main.cart_view'))
+    if not cart['items']:
+        cart = (request.get_json(silent=True) or {}).get('cart')
+        products = None
+    key = (request.form.get('idempotency_key')
+           or request.headers.get('Idempotency-Key') or None)
+
+    if current_app.config.get('CHECKOUT_MODE') == 'queue':
+        from app.services.checkout_queue import enqueue_order
+        try:
+            order = enqueue_order(current_user, cart, allow_partial=True,
+                                  idempotency_key=key)
+        except ValueError as exc:
+            flash(str(exc), 'product_danger')
+            return redirect(url_for('main.cart_view'))
+        get_cart_store().clear(_cart_id())
+        flash(f"Pedido #{order.id} recebido; estamos processando.", "product_success")
+        return redirect(url_for('main.order_detail', order_id=order.id))
 
-    cart = session.get('cart') or (request.json or {}).get('cart')
     try:
         # do not ignore stock when finalizing an order so that stock is decremented
-        order, warnings, total_val = finalize_order(current_user, cart, allow_partial=True, allow_ignore_stock=False)
+        order, warnings, total_val = finalize_order(current_user, cart, allow_partial=True,
+                                                    allow_ignore_stock=False,
+                                                    idempotency_key=key,
+                                                    products=products)
     except Exception as exc:
         flash(str(exc), 'product_danger')
         return redirect(url_for('main.cart_view'))
 
     # limpar carrinho e informar sucesso
-    session.pop('cart', None)
+    get_cart_store().clear(_cart_id())
     for w in warnings:
         flash(w, 'product_danger')
     # format total as currency R$ 1.234,56
@@ -349,3 +467,25 @@ def checkout():
 
     flash(f"Pedido #{order.id} finalizado (total: {total_str}).", "product_success")
     return redirect(url_for('main.index'))
+
+
+@main_bp.route('/pedidos', endpoint='order_history')
+@login_required
+def order_history():
+    try:
+        page = list_orders_page(current_user.id, cursor=request.args.get('cursor'),
+                                limit=request.args.get('limit'))
+    except ValueError as e:
+        flash(str(e), "product_danger")
+        page = list_orders_page(current_user.id)
+    return render_template('order/list.html', orders=page['items'], page=page,
+                           filters={})
+
+
+@main_bp.route('/pedidos/<int:order_id>', endpoint='order_detail')
+@login_required
+def order_detail(order_id):
+    order = get_user_order(current_user.id, order_id)
+    if order is None:
+        abort(404)
+    return render_template('order/detail.html', order=order)
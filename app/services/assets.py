@@ -0,0 +1,105 @@
+"""URLs com fingerprint e arquivos pré-comprimidos para ``static/``.
+
+``asset_url('style.css')`` gera ``/assets/<hash>/style.css``, onde ``<hash>``
+vem do conteúdo do arquivo. Como a URL muda quando o arquivo muda, ela pode
+ser servida com ``Cache-Control: immutable`` (ver app/routes/assets.py).
+``precompress`` gera ``.gz`` (e ``.br`` se o pacote ``brotli`` estiver
+instalado) ao lado dos arquivos de texto, servidos conforme Accept-Encoding.
+"""
+import gzip
+import hashlib
+import os
+
+from flask import current_app, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli é opcional
+    brotli = None
+
+DIGEST_LENGTH = 12
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+# (Content-Encoding, sufixo do arquivo), em ordem de preferência
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _digests():
+    return current_app.extensions.setdefault('asset_digests', {})
+
+
+def static_path(filename):
+    """Caminho absoluto do arquivo em ``static/`` ou None se não existir."""
+    path = safe_join(current_app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+
+def file_digest(filename):
+    """Hash (curto) do conteúdo, recalculado só quando mtime/tamanho mudam."""
+    path = static_path(filename)
+    if path is None:
+        return None
+    st = os.stat(path)
+    cache = _digests()
+    cached = cache.get(filename)
+    if cached and cached[0] == (st.st_mtime_ns, st.st_size):
+        return cached[1]
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()[:DIGEST_LENGTH]
+    cache[filename] = ((st.st_mtime_ns, st.st_size), digest)
+    return digest
+
+
+def asset_url(filename):
+    """URL com fingerprint para um arquivo de ``static/`` (fallback: url normal)."""
+    digest = file_digest(filename)
+    if digest is None:
+        return url_for('static', filename=filename)
+    return url_for('assets.static_asset', digest=digest, filename=filename)
+
+
+def precompressed(path, accept_encodings):
+    """Escolhe a variante pré-comprimida aceita pelo cliente: (caminho, encoding)."""
+    for encoding, suffix in ENCODINGS:
+        if accept_encodings[encoding] and os.path.isfile(path + suffix):
+            if os.stat(path + suffix).st_mtime_ns >= os.stat(path).st_mtime_ns:
+                return path + suffix, encoding
+    return path, None
+
+
+def precompress(folder):
+    """Gera ``.gz``/``.br`` dos arquivos de texto desatualizados. Retorna quantos."""
+    written = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as fh:
+                data = None
+                for encoding, suffix in ENCODINGS:
+                    if encoding == 'br' and brotli is None:
+                        continue
+                    target = path + suffix
+                    if (os.path.exists(target)
+                            and os.stat(target).st_mtime_ns >= os.stat(path).st_mtime_ns):
+                        continue
+                    if data is None:
+                        data = fh.read()
+                    if encoding == 'br':
+                        compressed = brotli.compress(data, quality=11)
+                    else:
+                        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                    with open(target, 'wb') as out:
+                        out.write(compressed)
+                    written += 1
+    return written
+
+
+def init_assets(app):
+    app.add_template_global(asset_url)
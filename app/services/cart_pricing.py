@@ -0,0 +1,114 @@
+"""Precificação do carrinho com os preços e o estoque atuais.
+
+``price_cart`` recalcula o carrinho inteiro de uma vez. Os valores são
+``Decimal`` (centavos exatos, como em ``Order.total_amount``).
+
+- Na página do carrinho os produtos vêm do cache de produtos e os que
+  faltarem são lidos numa única consulta ``IN``.
+- No checkout (``live=True``) preço e estoque são lidos do banco, numa única
+  consulta ``IN``: o cache é por processo e pode estar até
+  ``PRODUCT_CACHE_TTL`` segundos atrasado em relação a outro worker. Esses
+  snapshots vão para ``finalize_order``, que não busca os produtos de novo.
+
+Cada linha traz avisos:
+
+- ``price_changed``: o preço atual difere do que o cliente viu (``seen``,
+  os campos ``price_<id>`` do formulário do carrinho);
+- ``low_stock`` / ``out_of_stock``: a quantidade pedida passa do estoque.
+  Com ``user_id`` o estoque é o disponível para esse usuário
+  (``reservations.available_stock``: sem as reservas dos outros carrinhos),
+  lido do banco numa consulta ``IN`` a mais. O débito no checkout continua
+  sendo o UPDATE condicional de ``reserve_stock``.
+"""
+from decimal import Decimal, InvalidOperation
+
+from app.models.product_models import get_product_snapshots, load_product_snapshots
+from app.services.reservations import available_stock
+
+CENTS = Decimal('0.01')
+
+
+def to_money(value):
+    return Decimal(str(value)).quantize(CENTS)
+
+
+def format_brl(value):
+    return f"R$ {to_money(value)}".replace('.', ',')
+
+
+def seen_prices(form):
+    """Preços exibidos ao cliente, dos campos ``price_<id>``: {id: Decimal}."""
+    prices = {}
+    for name, value in form.items():
+        pid = name[len('price_'):] if name.startswith('price_') else ''
+        if not pid.isdigit():
+            continue
+        try:
+            prices[int(pid)] = to_money(value.replace(',', '.'))
+        except (InvalidOperation, ValueError):
+            continue
+    return prices
+
+
+def _line_warnings(line, seen):
+    warnings = []
+    if seen is not None and seen != line['price']:
+        warnings.append({
+            'code': 'price_changed',
+            'message': (f"O preço de '{line['name']}' mudou de {format_brl(seen)} "
+                        f"para {format_brl(line['price'])}."),
+        })
+    if line['stock'] <= 0:
+        warnings.append({'code': 'out_of_stock',
+                         'message': f"'{line['name']}' está sem estoque."})
+    elif line['qty'] > line['stock']:
+        warnings.append({
+            'code': 'low_stock',
+            'message': f"Só há {line['stock']} unidade(s) de '{line['name']}' em estoque.",
+        })
+    return warnings
+
+
+def price_cart(quantities, seen=None, live=False, user_id=None):
+    """Precifica ``{product_id: qty}`` com os produtos atuais.
+
+    Com ``live`` ignora o cache e lê os produtos do banco (checkout). Com
+    ``user_id`` os avisos de estoque descontam as reservas dos outros usuários.
+
+    Retorna ``{'items': {str(id): linha}, 'qty', 'total', 'warnings',
+    'missing', 'products'}``. ``missing`` lista os ids que não existem mais
+    (fora do carrinho precificado); ``products`` são os snapshots usados,
+    para repassar a ``finalize_order``.
+    """
+    seen = seen or {}
+    products = (load_product_snapshots if live else get_product_snapshots)(quantities)
+    available = available_stock(products, user_id) if user_id is not None else {}
+    cart = {'items': {}, 'qty': 0, 'total': Decimal('0.00'), 'warnings': [],
+            'missing': [], 'products': products}
+    for pid, qty in quantities.items():
+        product = products.get(int(pid))
+        if product is None:
+            cart['missing'].append(int(pid))
+            continue
+        qty = int(qty)
+        price = to_money(product['price'])
+        line = {
+            'id': product['id'],
+            'name': product['name'],
+            'image': product['image'],
+            'price': price,
+            'qty': qty,
+            'stock': available.get(product['id'], product['stock'] or 0),
+            'subtotal': price * qty,
+        }
+        line['warnings'] = _line_warnings(line, seen.get(int(pid)))
+        cart['items'][str(pid)] = line
+        cart['qty'] += qty
+        cart['total'] += line['subtotal']
+        cart['warnings'].extend(line['warnings'])
+    return cart
+
+
+def price_changes(cart):
+    """Avisos de preço alterado do carrinho precificado."""
+    return [w for w in cart['warnings'] if w['code'] == 'price_changed']
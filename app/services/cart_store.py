@@ -0,0 +1,193 @@
+"""Armazenamento do carrinho no servidor.
+
+O carrinho guarda apenas {product_id: quantidade} por ``cart_id`` (o id do
+usuário), sempre com quantidade >= 1 (``add``/``set`` recusam o resto com
+``ValueError``); nome, preço e imagem são lidos do catálogo na hora de exibir. Cada
+operação altera só a linha afetada, sem reescrever o carrinho inteiro.
+
+Backends (``CART_STORE``):
+
+- ``sql`` (padrão): tabela ``cart_items`` no banco da aplicação (SQLite ou outro);
+- ``memory``: dict no processo, útil em testes e num único worker;
+- ``redis``: um hash por carrinho; usa qualquer cliente compatível com
+  redis-py (HINCRBY/HSET/HDEL/HGETALL/HVALS/DEL/EXPIRE), ex. um fake local;
+- ``"modulo:Classe"``: backend próprio com a mesma interface.
+"""
+import threading
+from datetime import datetime
+from importlib import import_module
+
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.utils import db
+from app.models.models import CartItem
+
+
+def _check_qty(qty):
+    # quantidade zero ou negativa nunca entra no carrinho (nem soma no add)
+    if not isinstance(qty, int) or qty < 1:
+        raise ValueError(f"Quantidade inválida para o carrinho: {qty!r}")
+
+
+class MemoryCartStore:
+    """Carrinhos num dict do processo (não compartilhado entre workers)."""
+
+    def __init__(self):
+        self._carts = {}
+        self._lock = threading.Lock()
+
+    def items(self, cart_id):
+        with self._lock:
+            return dict(self._carts.get(cart_id, {}))
+
+    def count(self, cart_id):
+        with self._lock:
+            return sum(self._carts.get(cart_id, {}).values())
+
+    def add(self, cart_id, product_id, qty):
+        _check_qty(qty)
+        with self._lock:
+            cart = self._carts.setdefault(cart_id, {})
+            cart[product_id] = cart.get(product_id, 0) + qty
+
+    def set(self, cart_id, product_id, qty):
+        _check_qty(qty)
+        with self._lock:
+            self._carts.setdefault(cart_id, {})[product_id] = qty
+
+    def remove(self, cart_id, product_id):
+        with self._lock:
+            return self._carts.get(cart_id, {}).pop(product_id, None) is not None
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+
+class SQLCartStore:
+    """Carrinhos na tabela ``cart_items``; cada operação é uma transação curta."""
+
+    def items(self, cart_id):
+        rows = db.session.execute(
+            select(CartItem.product_id, CartItem.quantity)
+            .where(CartItem.cart_id == cart_id))
+        return {row.product_id: row.quantity for row in rows}
+
+    def count(self, cart_id):
+        return db.session.scalar(
+            select(func.coalesce(func.sum(CartItem.quantity), 0))
+            .where(CartItem.cart_id == cart_id))
+
+    def _update(self, cart_id, product_id, quantity):
+        return db.session.execute(
+            update(CartItem)
+            .where(CartItem.cart_id == cart_id, CartItem.product_id == product_id)
+            .values(quantity=quantity, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    def _upsert(self, cart_id, product_id, quantity, qty):
+        if self._update(cart_id, product_id, quantity):
+            db.session.commit()
+            return
+        try:
+            db.session.add(CartItem(cart_id=cart_id, product_id=product_id,
+                                    quantity=qty))
+            db.session.commit()
+        except IntegrityError:
+            # outra requisição inseriu a linha primeiro
+            db.session.rollback()
+            self._update(cart_id, product_id, quantity)
+            db.session.commit()
+
+    def add(self, cart_id, product_id, qty):
+        _check_qty(qty)
+        self._upsert(cart_id, product_id, CartItem.quantity + qty, qty)
+
+    def set(self, cart_id, product_id, qty):
+        _check_qty(qty)
+        self._upsert(cart_id, product_id, qty, qty)
+
+    def remove(self, cart_id, product_id):
+        removed = db.session.execute(
+            delete(CartItem)
+            .where(CartItem.cart_id == cart_id, CartItem.product_id == product_id)
+        ).rowcount
+        db.session.commit()
+        return removed > 0
+
+    def clear(self, cart_id):
+        db.session.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+        db.session.commit()
+
+
+class RedisCartStore:
+    """Um hash Redis por carrinho (``cart:<id>``: product_id -> quantidade)."""
+
+    def __init__(self, client, ttl=None):
+        self.client = client
+        self.ttl = ttl
+
+    def _key(self, cart_id):
+        return f'cart:{cart_id}'
+
+    def _touch(self, key):
+        if self.ttl:
+            self.client.expire(key, self.ttl)
+
+    def items(self, cart_id):
+        raw = self.client.hgetall(self._key(cart_id))
+        return {int(pid): int(qty) for pid, qty in raw.items()}
+
+    def count(self, cart_id):
+        return sum(int(qty) for qty in self.client.hvals(self._key(cart_id)))
+
+    def add(self, cart_id, product_id, qty):
+        _check_qty(qty)
+        key = self._key(cart_id)
+        self.client.hincrby(key, product_id, qty)
+        self._touch(key)
+
+    def set(self, cart_id, product_id, qty):
+        _check_qty(qty)
+        key = self._key(cart_id)
+        self.client.hset(key, product_id, qty)
+        self._touch(key)
+
+    def remove(self, cart_id, product_id):
+        return bool(self.client.hdel(self._key(cart_id), product_id))
+
+    def clear(self, cart_id):
+        self.client.delete(self._key(cart_id))
+
+
+def _redis_store(app):
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("CART_STORE=redis requer o pacote 'redis' instalado.")
+    client = redis.Redis.from_url(app.config['REDIS_URL'])
+    return RedisCartStore(client, ttl=app.config.get('CART_TTL'))
+
+
+def init_cart_store(app, store=None):
+    """Cria o backend do carrinho configurado e registra em ``app.extensions``."""
+    if store is None:
+        name = app.config.get('CART_STORE', 'sql')
+        if name == 'sql':
+            store = SQLCartStore()
+        elif name == 'memory':
+            store = MemoryCartStore()
+        elif name == 'redis':
+            store = _redis_store(app)
+        else:
+            module_name, _, class_name = name.partition(':')
+            store = getattr(import_module(module_name), class_name)()
+    app.extensions['cart_store'] = store
+    return store
+
+
+def get_cart_store():
+    return current_app.extensions['cart_store']
@@ -0,0 +1,311 @@
+"""Checkout em segundo plano (``CHECKOUT_MODE=queue``).
+
+A requisição só grava o pedido como ``pending`` e um ``CheckoutJob`` com o
+carrinho (a fila é a própria tabela ``checkout_jobs`` no banco da
+aplicação) e devolve o id do pedido para consulta. Um pool local de threads
+(``CHECKOUT_WORKERS``) processa os jobs: reserva o estoque, grava os itens e
+marca o pedido como pago, ou cancelado com o erro no job.
+
+Cada job é reivindicado com um UPDATE condicional (``queued`` -> ``running``)
+que grava um token da tentativa (``claim_token``). Enquanto a tentativa
+roda, uma thread de heartbeat renova ``updated_at`` a cada
+``CHECKOUT_JOB_TIMEOUT / 4`` segundos. Só jobs em ``running`` sem heartbeat
+há mais de ``CHECKOUT_JOB_TIMEOUT`` segundos (ex.: processo reiniciado) são
+reenfileirados, no primeiro uso do pool ou por ``flask orders process-queue``.
+
+A conclusão (``done``/``failed``) é um UPDATE condicional ao token, na mesma
+transação que debita o estoque: se o job foi reenfileirado e pego por outra
+tentativa, a antiga não encontra mais o seu token e desfaz tudo, então o
+estoque e os agregados nunca são contados duas vezes.
+
+Nada disto é carregado no boot: o módulo só é importado quando
+``CHECKOUT_MODE=queue`` é usado e o pool nasce no primeiro job.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.utils import db
+from app.models.models import CheckoutJob, Order, OrderStatus
+from app.services import product_cache
+from app.services.order_service import fill_order, find_order_by_key, validate_items
+
+logger = logging.getLogger(__name__)
+
+# tentativas de um job quando o banco está ocupado (no SQLite, dois workers
+# que leram antes de escrever: o segundo recebe "database is locked")
+LOCKED_RETRIES = 3
+
+
+def enqueue_order(user, cart, allow_partial=False, idempotency_key=None):
+    """Cria o pedido pendente e o job; retorna o Order (sem processar).
+
+    Com ``idempotency_key`` repetida devolve o pedido já existente.
+    Lança ValueError se o carrinho estiver vazio ou for inválido.
+    """
+    if idempotency_key:
+        existing = find_order_by_key(user.id, idempotency_key)
+        if existing is not None:
+            return existing
+
+    items = validate_items(cart)
+
+    try:
+        order = Order(user_id=user.id, status=OrderStatus.PENDING.value,
+                      total_amount=Decimal('0.00'), idempotency_key=idempotency_key)
+        db.session.add(order)
+        db.session.flush()
+        job = CheckoutJob(order_id=order.id, cart=json.dumps(items),
+                          allow_partial=bool(allow_partial))
+        db.session.add(job)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        existing = idempotency_key and find_order_by_key(user.id, idempotency_key)
+        if existing:
+            return existing
+        raise
+
+    get_checkout_pool().submit(job.id)
+    return order
+
+
+class JobReclaimed(Exception):
+    """O job foi reenfileirado e pertence a outra tentativa."""
+
+
+def process_checkout_job(job_id):
+    """Processa um job da fila; retorna False se outro worker já o pegou."""
+    token = _claim_job(job_id)
+    if token is None:
+        return False
+
+    app = current_app._get_current_object()
+    interval = app.config.get('CHECKOUT_JOB_TIMEOUT', 300) / 4
+    with _Heartbeat(app, job_id, token, interval):
+        for attempt in range(LOCKED_RETRIES):
+            try:
+                touched = _fill_job(job_id, token)
+                break
+            except OperationalError:
+                db.session.rollback()
+                if attempt < LOCKED_RETRIES - 1:
+                    time.sleep(0.05 * (attempt + 1))
+                    continue
+                # volta para a fila; será tentado de novo na próxima recuperação
+                _update_claimed(job_id, token, status='queued', claim_token=None)
+                db.session.commit()
+                raise
+
+    if touched:
+        product_cache.invalidate_products(*touched)
+    return True
+
+
+def _claim_job(job_id):
+    """Reivindica o job ``queued``; retorna o token da tentativa ou None."""
+    token = uuid.uuid4().hex
+    claimed = db.session.execute(
+        update(CheckoutJob)
+        .where(CheckoutJob.id == job_id, CheckoutJob.status == 'queued')
+        .values(status='running', claim_token=token, attempts=CheckoutJob.attempts + 1,
+                updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return token if claimed else None
+
+
+def _update_claimed(job_id, token, **values):
+    """UPDATE do job só se ainda é desta tentativa; retorna se atualizou.
+
+    É uma escrita direta: como primeiro comando da transação, o busy_timeout
+    do SQLite vale (ler antes de escrever falharia na hora).
+    """
+    return db.session.execute(
+        update(CheckoutJob)
+        .where(CheckoutJob.id == job_id, CheckoutJob.status == 'running',
+               CheckoutJob.claim_token == token)
+        .values(updated_at=datetime.utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount > 0
+
+
+def _fill_job(job_id, token):
+    """Uma tentativa do job; retorna os produtos alterados."""
+    job = db.session.get(CheckoutJob, job_id)
+    order_id = job.order_id
+    order = db.session.get(Order, order_id)
+    try:
+        with db.session.begin_nested():
+            # a conclusão vem antes do débito e na mesma transação: sem o token
+            # (job reenfileirado) nada do pedido é gravado
+            if not _update_claimed(job_id, token, status='done'):
+                raise JobReclaimed(job_id)
+            _, _, touched = fill_order(order, json.loads(job.cart),
+                                       allow_partial=job.allow_partial)
+        db.session.commit()
+    except JobReclaimed:
+        db.session.rollback()
+        logger.warning("Job de checkout %s reenfileirado; tentativa descartada", job_id,
+                       extra={'event': 'checkout.job_reclaimed', 'job_id': job_id})
+        return ()
+    except ValueError as exc:
+        _fail_job(job_id, token, order_id, str(exc))
+        return ()
+    except OperationalError:
+        raise  # banco ocupado: process_checkout_job tenta de novo
+    except Exception as exc:
+        # erro inesperado (ex.: carrinho gravado malformado, IntegrityError):
+        # repetir não resolve, então o job falha em vez de ficar em "running"
+        logger.exception("Erro inesperado no job de checkout %s", job_id,
+                         extra={'event': 'checkout.job_error', 'job_id': job_id})
+        _fail_job(job_id, token, order_id, f'{type(exc).__name__}: {exc}')
+        return ()
+    return touched
+
+
+def _fail_job(job_id, token, order_id, error):
+    """Cancela o pedido e marca o job como ``failed`` com o erro (se ainda é desta tentativa)."""
+    db.session.rollback()
+    if _update_claimed(job_id, token, status='failed', error=error):
+        db.session.execute(
+            update(Order).where(Order.id == order_id)
+            .values(status=OrderStatus.CANCELLED.value)
+            .execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+class _Heartbeat:
+    """Renova ``updated_at`` do job enquanto a tentativa roda (no ``with``)."""
+
+    def __init__(self, app, job_id, token, interval):
+        self.app = app
+        self.job_id = job_id
+        self.token = token
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f'checkout-heartbeat-{job_id}')
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    _update_claimed(self.job_id, self.token)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    logger.warning("Falha no heartbeat do job de checkout %s", self.job_id,
+                                   exc_info=True, extra={'event': 'checkout.heartbeat_failed',
+                                                         'job_id': self.job_id})
+                finally:
+                    db.session.remove()
+
+
+def requeue_stale_jobs(timeout):
+    """Ids dos jobs a (re)processar: na fila ou em ``running`` sem heartbeat há ``timeout`` s."""
+    limit = datetime.utcnow() - timedelta(seconds=timeout)
+    db.session.execute(
+        update(CheckoutJob)
+        .where(CheckoutJob.status == 'running', CheckoutJob.updated_at < limit)
+        .values(status='queued', claim_token=None)
+        .execution_options(synchronize_session=False))
+    db.session.commit()
+    return list(db.session.scalars(
+        select(CheckoutJob.id).where(CheckoutJob.status == 'queued')
+        .order_by(CheckoutJob.id)))
+
+
+class CheckoutWorkerPool:
+    """Pool de threads do processo que consome os jobs de checkout."""
+
+    def __init__(self, app, workers=2, job_timeout=300):
+        self.app = app
+        self.job_timeout = job_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='checkout')
+        self._lock = threading.Lock()
+        self._futures = set()
+        self._recovered = False
+
+    def submit(self, job_id):
+        self._recover_once()
+        future = self._executor.submit(self._run, job_id)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _recover_once(self):
+        with self._lock:
+            if self._recovered:
+                return
+            self._recovered = True
+        for job_id in requeue_stale_jobs(self.job_timeout):
+            future = self._executor.submit(self._run, job_id)
+            with self._lock:
+                self._futures.add(future)
+            future.add_done_callback(self._discard)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                process_checkout_job(job_id)
+            except Exception:
+                logger.exception("Falha no job de checkout %s", job_id,
+                                 extra={'event': 'checkout.job_failed', 'job_id': job_id})
+            finally:
+                db.session.remove()
+
+    def wait(self):
+        """Aguarda os jobs em andamento (usado em testes)."""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.result()
+
+
+def init_checkout_queue(app):
+    pool = CheckoutWorkerPool(
+        app,
+        workers=app.config.get('CHECKOUT_WORKERS', 2),
+        job_timeout=app.config.get('CHECKOUT_JOB_TIMEOUT', 300),
+    )
+    app.extensions['checkout_queue'] = pool
+    return pool
+
+
+_pool_lock = threading.Lock()
+
+
+def get_checkout_pool():
+    """Pool da aplicação, criado no primeiro uso (a fila é opcional)."""
+    pool = current_app.extensions.get('checkout_queue')
+    if pool is None:
+        with _pool_lock:
+            pool = current_app.extensions.get('checkout_queue')
+            if pool is None:
+                pool = init_checkout_queue(current_app._get_current_object())
+    return pool
@@ -0,0 +1,159 @@
+"""Configuração dos engines do banco: pool, pragmas do SQLite e réplica de leitura.
+
+Os perfis (``DB_PROFILE``: ``development``, ``production`` ou ``test``) definem
+os valores padrão; cada chave pode ser sobrescrita por variável de ambiente
+``DB_<CHAVE>`` (ex.: ``DB_POOL_SIZE=20``, ``DB_SQLITE_BUSY_TIMEOUT=10000``).
+
+No SQLite os pragmas (WAL, ``synchronous``, ``busy_timeout``) são aplicados a
+cada conexão nova por um listener ``connect``. Em outros bancos valem as
+opções de pool (tamanho, overflow, timeout, recycle e pre-ping).
+
+Com ``DATABASE_REPLICA_URL`` definido, as consultas marcadas com
+``execution_options(replica=True)`` (leituras do catálogo) vão para o engine
+da réplica, desde que a sessão não tenha escritas pendentes.
+"""
+import os
+
+from flask import current_app
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+from app.utils import db
+
+PROFILES = {
+    'development': {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'pool_recycle': -1,
+        'pool_pre_ping': False,
+        'sqlite_journal_mode': 'WAL',
+        'sqlite_synchronous': 'NORMAL',
+        'sqlite_busy_timeout': 5000,
+    },
+    'production': {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+        'sqlite_journal_mode': 'WAL',
+        'sqlite_synchronous': 'NORMAL',
+        'sqlite_busy_timeout': 15000,
+    },
+    'test': {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'pool_recycle': -1,
+        'pool_pre_ping': False,
+        'sqlite_journal_mode': 'WAL',
+        'sqlite_synchronous': 'OFF',
+        'sqlite_busy_timeout': 5000,
+    },
+}
+
+POOL_KEYS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'pool_pre_ping')
+
+
+def _cast(value, default):
+    if isinstance(default, bool):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    if isinstance(default, int):
+        return int(value)
+    return value
+
+
+def load_profile(name=None, environ=None):
+    """Valores do perfil ``name`` com as sobrescritas ``DB_<CHAVE>`` do ambiente."""
+    environ = os.environ if environ is None else environ
+    name = name or environ.get('DB_PROFILE', 'development')
+    if name not in PROFILES:
+        raise ValueError(f"DB_PROFILE inválido: {name!r} (use {', '.join(PROFILES)}).")
+    settings = dict(PROFILES[name])
+    for key, default in PROFILES[name].items():
+        value = environ.get(f'DB_{key.upper()}')
+        if value not in (None, ''):
+            settings[key] = _cast(value, default)
+    return settings
+
+
+def _is_sqlite_memory(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(uri, settings):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` para a URL (o SQLite em memória usa o pool próprio)."""
+    if _is_sqlite_memory(make_url(uri)):
+        return {}
+    return {key: settings[key] for key in POOL_KEYS}
+
+
+def _sqlite_pragmas(settings):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout = {int(settings['sqlite_busy_timeout'])}")
+            cursor.execute(f"PRAGMA journal_mode = {settings['sqlite_journal_mode']}")
+            cursor.execute(f"PRAGMA synchronous = {settings['sqlite_synchronous']}")
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def configure_database(app):
+    """Preenche a configuração do SQLAlchemy; chamar antes de ``db.init_app``."""
+    settings = load_profile(app.config.get('DB_PROFILE'))
+    app.config['DB_SETTINGS'] = settings
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(uri, settings)
+
+
+def init_database(app):
+    """Instala os pragmas nos engines SQLite e o roteamento para a réplica.
+
+    A réplica é um engine à parte (e não um bind do Flask-SQLAlchemy): não
+    tem tabelas próprias e não deve entrar em ``create_all``/migrações.
+    """
+    settings = app.config['DB_SETTINGS']
+    with app.app_context():
+        engines = list(db.engines.values())
+    replica = None
+    replica_url = app.config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        replica = create_engine(replica_url, **engine_options(replica_url, settings))
+        engines.append(replica)
+    for engine in engines:
+        if engine.dialect.name == 'sqlite' and not _is_sqlite_memory(engine.url):
+            event.listen(engine, 'connect', _sqlite_pragmas(settings))
+    app.extensions['database'] = {'replica': replica}
+
+    if not event.contains(db.session, 'do_orm_execute', _route_reads):
+        event.listen(db.session, 'do_orm_execute', _route_reads)
+        event.listen(db.session, 'after_flush', _mark_written)
+        event.listen(db.session, 'after_commit', _clear_written)
+        event.listen(db.session, 'after_rollback', _clear_written)
+
+
+def _mark_written(session, flush_context):
+    session.info['db_written'] = True
+
+
+def _clear_written(session):
+    session.info.pop('db_written', None)
+
+
+def _route_reads(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        # DML em massa (update()/insert()) não passa pelo flush
+        state.session.info['db_written'] = True
+        return None
+    if not state.is_select or not state.execution_options.get('replica'):
+        return None
+    replica = current_app.extensions.get('database', {}).get('replica')
+    session = state.session
+    # leitura após escrita na mesma transação fica no primário
+    if (replica is None or session.info.get('db_written')
+            or session.new or session.dirty or session.deleted):
+        return None
+    return state.invoke_statement(bind_arguments={'bind': replica})
@@ -0,0 +1,130 @@
+"""Cache de fragmentos HTML do catálogo.
+
+Guarda o HTML já renderizado de:
+
+- cada card de produto, pela chave ``card:<variante>:<id>:<versão>`` — a
+  versão (``Product.version``) é incrementada por ``update_product`` e pela
+  importação, então um card alterado nunca é servido de novo;
+- a grade completa de uma página do catálogo, pela versão do catálogo
+  (``product_cache.catalog_version``), endpoint, parâmetros da página e o
+  estado das imagens dos produtos (variantes prontas ou não).
+
+Os fragmentos não contêm nada do usuário (saudação, contador do carrinho,
+mensagens flash): isso fica no template da página, fora do cache.
+
+O despejo é LRU com orçamento de memória em bytes (``FRAGMENT_CACHE_MAX_BYTES``,
+0 desliga o cache).
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from flask import current_app, render_template, request
+from markupsafe import Markup
+
+from app.services import product_cache
+from app.services.image_pipeline import image_state
+
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+
+class FragmentCache:
+    """LRU de strings limitado pelo tamanho total (UTF-8) dos valores."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[0]
+            self._data[key] = (size, html)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'entries': len(self._data),
+                    'bytes': self.size}
+
+
+def init_fragment_cache(app):
+    max_bytes = int(app.config.get('FRAGMENT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+    cache = FragmentCache(max_bytes) if max_bytes > 0 else None
+    app.extensions['fragment_cache'] = cache
+    app.add_template_global(product_card)
+    app.add_template_global(catalog_grid)
+    app.add_template_global(product_detail)
+    return cache
+
+
+def get_fragment_cache():
+    return current_app.extensions.get('fragment_cache')
+
+
+def _cached(key, render):
+    cache = get_fragment_cache()
+    if cache is None:
+        return Markup(render())
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.set(key, html)
+    return Markup(html)
+
+
+def product_card(produto, variant):
+    """HTML do card de um produto (``variant``: 'index' ou 'list')."""
+    key = 'card:{}:{}:{}:{}'.format(variant, produto['id'], produto.get('version', 1),
+                                    image_state(produto.get('image')))
+    return _cached(key, lambda: render_template(
+        'product/_card.html', produto=produto, variant=variant))
+
+
+def catalog_grid(products, page, filters, variant):
+    """HTML da lista de produtos de uma página do catálogo, com a paginação."""
+    # os cards já entram pela versão do catálogo; as imagens não a mudam
+    key = 'grid:{}:{}:{}:{}:{}:{}'.format(
+        variant, product_cache.catalog_version(), request.endpoint,
+        request.args.get('cursor', ''), json.dumps(filters, sort_keys=True),
+        ''.join(image_state(p.get('image')) for p in products))
+    return _cached(key, lambda: render_template(
+        'product/_grid.html', products=products, page=page, filters=filters,
+        variant=variant))
+
+
+def product_detail(product):
+    """Corpo da página de detalhe (o estoque faz parte da chave)."""
+    key = 'detail:{}:{}:{}:{}'.format(product['id'], product.get('version', 1),
+                                      product['stock'], image_state(product.get('image')))
+    return _cached(key, lambda: render_template(
+        'product/_detail_card.html', product=product))
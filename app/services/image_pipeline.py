@@ -0,0 +1,217 @@
+"""Processamento das imagens enviadas para os produtos.
+
+- Armazenamento endereçado por conteúdo: o arquivo é salvo como
+  ``uploads/<sha256>.<ext>``, então o mesmo upload nunca é gravado duas vezes.
+- Variantes (miniaturas redimensionadas em WebP e, se o Pillow suportar,
+  AVIF) são geradas num pool de threads em segundo plano; o upload não espera.
+- Ao terminar, um manifesto ``<nome>.json`` lista as variantes; os templates
+  usam ``image_sources`` para montar ``srcset`` só quando ele existe.
+
+O Pillow é opcional: sem ele as imagens são deduplicadas mas sem variantes.
+Ele só é importado no primeiro uso, e o pipeline (com o pool de threads) só
+é criado quando alguma imagem é enviada ou exibida (não pesa no boot).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app.services.assets import asset_url
+
+Image = ImageOps = None
+
+
+def _load_pillow():
+    global Image, ImageOps
+    if Image is None:
+        try:
+            from PIL import Image as _Image, ImageOps as _ImageOps
+        except ImportError:  # pragma: no cover - Pillow é opcional
+            return False
+        Image, ImageOps = _Image, _ImageOps
+    return True
+
+UPLOAD_DIR = 'uploads'
+DEFAULT_WIDTHS = (160, 320, 640)
+
+
+class ImagePipeline:
+    def __init__(self, static_folder, widths=DEFAULT_WIDTHS, workers=2):
+        self.upload_dir = os.path.join(static_folder, UPLOAD_DIR)
+        self.widths = tuple(sorted(widths))
+        self._formats = None
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='image-pipeline')
+        self._pending = {}
+        self._lock = threading.RLock()
+        # manifestos completos nunca mudam (nome = hash do conteúdo)
+        self._manifests = {}
+
+    @property
+    def formats(self):
+        """Formatos de variante suportados pelo Pillow instalado."""
+        if self._formats is None:
+            if not _load_pillow():
+                self._formats = ()
+            else:
+                from PIL import features
+                self._formats = tuple(fmt for fmt in ('avif', 'webp')
+                                      if features.check(fmt))
+        return self._formats
+
+    def store(self, file_storage):
+        """Salva o upload pelo hash do conteúdo e agenda as variantes.
+
+        Retorna o caminho relativo a ``static/`` usado em ``Product.image``.
+        """
+        digest = hashlib.sha256()
+        os.makedirs(self.upload_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.upload_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter(lambda: file_storage.stream.read(64 * 1024), b''):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            ext = os.path.splitext(secure_filename(file_storage.filename or ''))[1].lower()
+            name = digest.hexdigest() + ext
+            dest = os.path.join(self.upload_dir, name)
+            if os.path.exists(dest):
+                os.unlink(tmp_path)
+            else:
+                os.replace(tmp_path, dest)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self.schedule(name)
+        return f'{UPLOAD_DIR}/{name}'
+
+    def schedule(self, name):
+        """Agenda a geração das variantes de ``uploads/<name>`` se ainda faltarem."""
+        if not self.formats or os.path.exists(self._manifest_path(name)):
+            return None
+        with self._lock:
+            future = self._pending.get(name)
+            if future is None:
+                future = self._executor.submit(self._build_variants, name)
+                self._pending[name] = future
+                future.add_done_callback(lambda _: self._forget(name))
+        return future
+
+    def _forget(self, name):
+        with self._lock:
+            self._pending.pop(name, None)
+
+    def wait(self):
+        """Aguarda as variantes pendentes (usado em testes e no comando de backfill)."""
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            future.result()
+
+    def _manifest_path(self, name):
+        return os.path.join(self.upload_dir, os.path.splitext(name)[0] + '.json')
+
+    def _build_variants(self, name):
+        stem = os.path.splitext(name)[0]
+        with Image.open(os.path.join(self.upload_dir, name)) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            width, height = image.size
+            widths = [w for w in self.widths if w < width] or [width]
+            for w in widths:
+                resized = image.resize((w, max(1, round(height * w / width))),
+                                       Image.LANCZOS)
+                for fmt in self.formats:
+                    path = os.path.join(self.upload_dir, f'{stem}-{w}.{fmt}')
+                    resized.save(path + '.part', format=fmt.upper(),
+                                 quality=50 if fmt == 'avif' else 80)
+                    os.replace(path + '.part', path)
+
+        manifest = {'width': width, 'height': height,
+                    'widths': widths, 'formats': list(self.formats)}
+        tmp = self._manifest_path(name) + '.part'
+        with open(tmp, 'w') as fh:
+            json.dump(manifest, fh)
+        os.replace(tmp, self._manifest_path(name))
+        return manifest
+
+    def manifest(self, image):
+        """Manifesto das variantes de ``image`` (caminho relativo) ou None."""
+        name = os.path.basename(image)
+        manifest = self._manifests.get(name)
+        if manifest is None:
+            try:
+                with open(self._manifest_path(name)) as fh:
+                    manifest = json.load(fh)
+            except (OSError, ValueError):
+                return None
+            self._manifests[name] = manifest
+        return manifest
+
+
+def init_image_pipeline(app):
+    pipeline = ImagePipeline(
+        app.static_folder,
+        widths=app.config.get('IMAGE_WIDTHS', DEFAULT_WIDTHS),
+        workers=app.config.get('IMAGE_WORKERS', 2),
+    )
+    app.extensions['image_pipeline'] = pipeline
+    return pipeline
+
+
+_pipeline_lock = threading.Lock()
+
+
+def get_image_pipeline():
+    """Pipeline da aplicação, criado no primeiro uso (upload ou manifesto)."""
+    pipeline = current_app.extensions.get('image_pipeline')
+    if pipeline is None:
+        with _pipeline_lock:
+            pipeline = current_app.extensions.get('image_pipeline')
+            if pipeline is None:
+                pipeline = init_image_pipeline(current_app._get_current_object())
+    return pipeline
+
+
+def store_upload(file_storage):
+    return get_image_pipeline().store(file_storage)
+
+
+def image_state(image):
+    """'-' sem imagem, 'o' só com o original, 'v' com as variantes prontas.
+
+    Entra nas chaves de cache e nos ETags do HTML que usa ``image_sources``:
+    o manifesto surge em segundo plano, sem mudar a versão do produto.
+    """
+    if not image:
+        return '-'
+    return 'v' if get_image_pipeline().manifest(image) else 'o'
+
+
+def image_sources(image):
+    """URLs para ``<picture>``: ``{'src': ..., 'sources': [(mime, srcset)]}``.
+
+    Enquanto as variantes não existem, ``sources`` fica vazio e o template
+    usa só a imagem original.
+    """
+    if not image:
+        return None
+    result = {'src': asset_url(image), 'sources': []}
+    manifest = get_image_pipeline().manifest(image)
+    if manifest is None:
+        return result
+    stem = os.path.splitext(image)[0]
+    for fmt in manifest['formats']:
+        srcset = ', '.join(
+            f"{asset_url(f'{stem}-{w}.{fmt}')} {w}w"
+            for w in manifest['widths'])
+        result['sources'].append((f'image/{fmt}', srcset))
+    return result
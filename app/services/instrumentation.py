@@ -0,0 +1,205 @@
+"""Instrumentação por requisição (opcional, ``INSTRUMENTATION=1``).
+
+Para cada requisição mede o tempo total, o número de comandos SQL, o tempo
+acumulado no banco (eventos ``before/after_cursor_execute`` dos engines) e o
+tempo de renderização dos templates Jinja (sinais ``before_render_template``
+e ``template_rendered``). Os valores vão:
+
+- no header ``Server-Timing`` da resposta (visível no DevTools do navegador);
+- para histogramas por endpoint, expostos em ``/metrics`` no formato texto
+  do Prometheus.
+
+Um mesmo comando SQL repetido ``N_PLUS_ONE_THRESHOLD`` vezes ou mais na
+mesma requisição (ex.: um ``SELECT ... WHERE id = ?`` por item) é tratado
+como padrão N+1: gera um aviso no log e incrementa
+``http_request_n_plus_one_total`` para o endpoint.
+
+Respostas em streaming têm medido só o tempo até o início da resposta.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import Response, g, has_app_context, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+
+from app.utils import db
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    """Forma do comando SQL, com listas ``IN (?, ?, ...)`` colapsadas."""
+    statement = _SPACES_RE.sub(' ', statement).strip()
+    return _IN_LIST_RE.sub('(?)', statement)
+
+
+class Histogram:
+    """Histograma cumulativo por label (semântica do Prometheus)."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, label, value):
+        series = self._series.get(label)
+        if series is None:
+            series = self._series[label] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self, label_name):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label, (counts, total, count) in sorted(self._series.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label_name}="{label}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_name}="{label}"}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{label_name}="{label}"}} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.duration = Histogram('http_request_duration_seconds',
+                                  'Tempo total da requisição.', DURATION_BUCKETS)
+        self.sql_queries = Histogram('http_request_sql_queries',
+                                     'Comandos SQL por requisição.', QUERY_BUCKETS)
+        self.sql_duration = Histogram('http_request_sql_duration_seconds',
+                                      'Tempo acumulado no banco por requisição.',
+                                      DURATION_BUCKETS)
+        self.render_duration = Histogram('http_request_render_duration_seconds',
+                                         'Tempo de renderização de templates.',
+                                         DURATION_BUCKETS)
+        self.n_plus_one = Counter()
+
+    def record(self, endpoint, perf, wall):
+        with self._lock:
+            self.duration.observe(endpoint, wall)
+            self.sql_queries.observe(endpoint, perf['sql_count'])
+            self.sql_duration.observe(endpoint, perf['sql_time'])
+            self.render_duration.observe(endpoint, perf['render_time'])
+            if perf['n_plus_one']:
+                self.n_plus_one[endpoint] += 1
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for histogram in (self.duration, self.sql_queries,
+                              self.sql_duration, self.render_duration):
+                lines.extend(histogram.render('endpoint'))
+            lines.append('# HELP http_request_n_plus_one_total '
+                         'Requisições com o mesmo SQL repetido (padrão N+1).')
+            lines.append('# TYPE http_request_n_plus_one_total counter')
+            for endpoint, count in sorted(self.n_plus_one.items()):
+                lines.append(f'http_request_n_plus_one_total{{endpoint="{endpoint}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _current_perf():
+    return g.get('_perf') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_perf() is not None:
+        conn.info.setdefault('_perf_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    perf = _current_perf()
+    started = conn.info.get('_perf_started')
+    if perf is None or not started:
+        return
+    perf['sql_time'] += time.perf_counter() - started.pop()
+    perf['sql_count'] += 1
+    perf['statements'][normalize_statement(statement)] += 1
+
+
+def _before_render(sender, template, context, **extra):
+    perf = _current_perf()
+    if perf is not None:
+        perf['render_started'].append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    perf = _current_perf()
+    if perf is not None and perf['render_started']:
+        perf['render_time'] += time.perf_counter() - perf['render_started'].pop()
+
+
+def init_instrumentation(app):
+    """Liga a instrumentação se ``INSTRUMENTATION`` estiver ativo na config."""
+    if not app.config.get('INSTRUMENTATION'):
+        return None
+    threshold = app.config.get('N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD)
+    registry = MetricsRegistry()
+    app.extensions['instrumentation'] = registry
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    replica = app.extensions.get('database', {}).get('replica')
+    if replica is not None:
+        engines.append(replica)
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_timer():
+        g._perf = {
+            'started': time.perf_counter(),
+            'sql_count': 0,
+            'sql_time': 0.0,
+            'render_time': 0.0,
+            'render_started': [],
+            'statements': Counter(),
+            'n_plus_one': [],
+        }
+
+    @app.after_request
+    def record_timings(response):
+        perf = g.pop('_perf', None)
+        if perf is None or request.endpoint == 'metrics':
+            return response
+        wall = time.perf_counter() - perf['started']
+        endpoint = request.endpoint or 'unknown'
+        perf['n_plus_one'] = [
+            (statement, count) for statement, count in perf['statements'].items()
+            if count >= threshold
+        ]
+        for statement, count in perf['n_plus_one']:
+            logger.warning("Possível N+1 em %s: %dx %s", endpoint, count, statement)
+        registry.record(endpoint, perf, wall)
+
+        response.headers.add('Server-Timing', ', '.join([
+            f'app;dur={wall * 1000:.2f}',
+            f'db;dur={perf["sql_time"] * 1000:.2f};desc="{perf["sql_count"]} queries"',
+            f'render;dur={perf["render_time"] * 1000:.2f}',
+        ]))
+        return response
+
+    @app.route('/metrics', endpoint='metrics')
+    def metrics():
+        return Response(registry.render(),
+                        mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    return registry
@@ -0,0 +1,125 @@
+"""Logging estruturado e não bloqueante da aplicação.
+
+Os módulos usam ``logging.getLogger(__name__)`` (loggers ``app.*``). O logger
+``app`` recebe um ``QueueHandler``: a requisição só enfileira o registro, e
+um ``QueueListener`` em outra thread formata e escreve na saída.
+
+Configuração (variáveis de ambiente lidas em ``create_app``):
+
+- ``LOG_LEVEL``: nível do logger ``app`` (padrão ``INFO``);
+- ``LOG_LEVELS``: níveis por módulo, ex. ``app.services.search=DEBUG,app.routes=WARNING``;
+- ``LOG_FORMAT``: ``json`` (padrão, uma linha JSON por evento) ou ``text``;
+- ``LOG_SAMPLING``: fração mantida por evento de alto volume, ex.
+  ``catalog.page=0.01``. O evento é o ``extra={'event': ...}`` do registro;
+  os mantidos levam ``sample_rate`` para que as contagens possam ser
+  reescaladas.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+ROOT_LOGGER = 'app'
+
+# atributos padrão de LogRecord; o resto veio de ``extra=``
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_handler = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos passados em ``extra``."""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Mantém só uma fração dos registros de cada evento configurado."""
+
+    def __init__(self, rates, rng=random.random):
+        super().__init__()
+        self.rates = rates
+        self.rng = rng
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None))
+        if rate is None or rate >= 1:
+            return True
+        if self.rng() < rate:
+            record.sample_rate = rate
+            return True
+        return False
+
+
+def parse_mapping(value, cast=str):
+    """``'a=1,b=2'`` -> ``{'a': cast('1'), 'b': cast('2')}`` (entradas vazias ignoradas)."""
+    result = {}
+    for item in (value or '').split(','):
+        key, sep, raw = item.partition('=')
+        if sep and key.strip():
+            result[key.strip()] = cast(raw.strip())
+    return result
+
+
+def init_logging(app, stream=None):
+    """Configura o logger ``app`` com fila, níveis por módulo e amostragem.
+
+    Pode ser chamado de novo (ex.: um ``create_app`` por teste): o listener
+    anterior é parado e substituído.
+    """
+    shutdown_logging()
+
+    if app.config.get('LOG_FORMAT', 'json') == 'text':
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+    else:
+        formatter = JSONFormatter()
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(formatter)
+
+    global _listener, _handler
+    log_queue = queue.SimpleQueue()
+    _handler = logging.handlers.QueueHandler(log_queue)
+    _handler.addFilter(SamplingFilter(app.config.get('LOG_SAMPLING') or {}))
+    _listener = logging.handlers.QueueListener(log_queue, output)
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    logger.addHandler(_handler)
+    # a saída é só a do listener (evita duplicar em handlers da raiz)
+    logger.propagate = False
+    for name, level in (app.config.get('LOG_LEVELS') or {}).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Esvazia a fila e para o listener (chamado também no encerramento)."""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger(ROOT_LOGGER).removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,212 @@
+"""Proteção do login e do cadastro contra rajadas de tentativas.
+
+- Limite de taxa por *token bucket*, em memória do processo: por IP
+  (``LOGIN_IP_RATE``) e por usuário (``LOGIN_USER_RATE``) no login e no token
+  da API, por IP no cadastro (``REGISTER_IP_RATE``). O formato é
+  ``<tentativas>/<segundos>`` (ex.: ``10/60``); ``0`` desliga o limite.
+- O hash de senha (scrypt/pbkdf2, CPU pura) roda num pool de processos
+  limitado (``PASSWORD_HASH_WORKERS``), fora das threads que servem o
+  catálogo. Com ``PASSWORD_HASH_QUEUE`` pedidos já esperando, o próximo é
+  recusado na hora. ``PASSWORD_HASH_WORKERS=0`` calcula na própria thread.
+- Um login correto com hash em parâmetros antigos (método ou custo diferente
+  de ``PASSWORD_HASH_METHOD``) regrava o hash com os parâmetros atuais.
+
+Limite excedido e pool cheio viram ``LoginThrottled``; as rotas respondem 429
+com ``Retry-After``. Um hash que passa de ``PASSWORD_HASH_TIMEOUT`` segundos
+ou um worker que morreu viram ``HashUnavailable`` (503); o pool quebrado é
+descartado e recriado na próxima chamada.
+"""
+import functools
+import math
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app, request
+
+from app.utils import db
+from app.models.models import User
+from app.services import passwords
+
+DEFAULT_HASH_METHOD = 'scrypt'
+DEFAULT_HASH_TIMEOUT = 10
+MAX_BUCKETS = 10000
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class LoginThrottled(Exception):
+    """Tentativa recusada sem verificar a senha (responder ``status``)."""
+
+    status = 429
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class HashUnavailable(LoginThrottled):
+    """Pool de hash travado ou quebrado (responder 503)."""
+
+    status = 503
+
+
+def parse_rate(value):
+    """``'10/60'`` -> ``(10, 60.0)``; ``None`` se o limite estiver desligado."""
+    if not value or str(value).strip() == '0':
+        return None
+    count, _, period = str(value).partition('/')
+    count, period = int(count), float(period or 1)
+    if count <= 0 or period <= 0:
+        return None
+    return count, period
+
+
+class TokenBucketLimiter:
+    """Token bucket por chave: ``capacity`` tentativas repostas em ``period`` s.
+
+    Guarda no máximo ``max_keys`` chaves; as usadas há mais tempo são
+    descartadas primeiro (um bucket descartado volta cheio).
+    """
+
+    def __init__(self, capacity, period, max_keys=MAX_BUCKETS, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Consome um token; retorna 0 ou os segundos até haver um disponível."""
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_prefix(method):
+    # um hash completo (caro), então calculado uma vez por método e processo
+    return passwords.hash_prefix(method)
+
+
+def _process_pool(workers):
+    # um pool por processo (compartilhado entre apps), criado no primeiro uso:
+    # nada é herdado por workers de servidores que fazem fork após o preload
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return pool
+
+
+def _discard_pool(workers, pool):
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class PasswordHasher:
+    """Hash/verificação de senha com concorrência e fila limitadas."""
+
+    def __init__(self, method=DEFAULT_HASH_METHOD, workers=2, queue_limit=8,
+                 timeout=DEFAULT_HASH_TIMEOUT):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_limit) if workers else None
+
+    def _call(self, fn, *args):
+        if self._slots is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise LoginThrottled("Muitas tentativas de login no momento; tente novamente.", 1)
+        pool = _process_pool(self.workers)
+        try:
+            return pool.submit(fn, *args).result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashUnavailable("Login temporariamente indisponível; tente novamente.",
+                                  self.timeout)
+        except BrokenProcessPool:
+            _discard_pool(self.workers, pool)
+            raise HashUnavailable("Login temporariamente indisponível; tente novamente.", 1)
+        finally:
+            self._slots.release()
+
+    def needs_upgrade(self, pwhash):
+        return pwhash.split('$', 1)[0] != _hash_prefix(self.method)
+
+    def hash(self, password):
+        return self._call(passwords.hash_password, password, self.method)
+
+    def verify(self, pwhash, password):
+        """``(válida, novo_hash)``; ``novo_hash`` se os parâmetros mudaram."""
+        upgrade = self.method if self.needs_upgrade(pwhash) else None
+        return self._call(passwords.verify_password, pwhash, password, upgrade)
+
+
+def init_login_guard(app):
+    limiters = {}
+    for name, key in (('login_ip', 'LOGIN_IP_RATE'), ('login_user', 'LOGIN_USER_RATE'),
+                      ('register_ip', 'REGISTER_IP_RATE')):
+        rate = parse_rate(app.config.get(key))
+        if rate is not None:
+            limiters[name] = TokenBucketLimiter(*rate)
+    hasher = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        queue_limit=app.config.get('PASSWORD_HASH_QUEUE', 8),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', DEFAULT_HASH_TIMEOUT),
+    )
+    guard = {'limiters': limiters, 'hasher': hasher}
+    app.extensions['login_guard'] = guard
+    return guard
+
+
+def get_password_hasher():
+    return current_app.extensions['login_guard']['hasher']
+
+
+def _check_rate(name, key):
+    limiter = current_app.extensions['login_guard']['limiters'].get(name)
+    if limiter is None:
+        return
+    wait = limiter.hit(key)
+    if wait:
+        raise LoginThrottled("Muitas tentativas; aguarde antes de tentar novamente.", wait)
+
+
+def check_register_rate():
+    _check_rate('register_ip', request.remote_addr or '-')
+
+
+def authenticate(username, password):
+    """Usuário com essas credenciais, ou None. Lança LoginThrottled."""
+    _check_rate('login_ip', request.remote_addr or '-')
+    _check_rate('login_user', (username or '').lower())
+    user = User.query.filter_by(username=username).first()
+    if user is None or not password:
+        return None
+    valid, new_hash = get_password_hasher().verify(user.password_hash, password)
+    if not valid:
+        return None
+    if new_hash:
+        user.password_hash = new_hash
+        db.session.commit()
+    return user
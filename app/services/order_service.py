@@ -1,6 +1,12 @@
+import json
 from decimal import Decimal
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from app.utils import db
 from app.models.models import Order, OrderItem, OrderStatus, Product
+from app.services import product_cache
+from app.services.reservations import available_stock, held_quantity, take_holds
+from app.services.reporting import record_sale
 
 
 def _normalize_cart(cart):
@@ -22,72 +28,267 @@ def _normalize_cart(cart):
     return items
 
 
-def finalize_order(user, cart, allow_partial=False, allow_ignore_stock=False):
-    """Transforma o carrinho em um Order persistido.
+def _as_int(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    raise ValueError
 
-    Lança ValueError em caso de erro (carrinho vazio, produto inexistente, estoque insuficiente).
-    Retorna a instância Order criada.
+
+def validate_items(cart):
+    """Itens do carrinho como ``[{product_id, quantity}]`` com inteiros.
+
+    Lança ValueError se o carrinho estiver vazio, não for uma lista/dict de
+    itens ou tiver quantidade não positiva.
     """
-    items = _normalize_cart(cart)
+    if cart and not isinstance(cart, (list, dict)):
+        raise ValueError('Os itens devem ser uma lista de {product_id, quantity}.')
+    try:
+        entries = _normalize_cart(cart)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError('Os itens devem ser uma lista de {product_id, quantity}.')
+    items = []
+    for entry in entries:
+        try:
+            pid, qty = _as_int(entry['product_id']), _as_int(entry['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Cada item precisa de product_id e quantity inteiros.')
+        if qty <= 0:
+            raise ValueError(f'Quantidade inválida para o produto {pid}.')
+        items.append({'product_id': pid, 'quantity': qty})
     if not items:
         raise ValueError('Carrinho vazio')
+    return items
+
+
+def _load_products(product_ids):
+    """Carrega todos os produtos do carrinho numa única consulta ``IN (...)``.
+
+    Não trava as linhas: o débito de estoque é feito por ``reserve_stock``
+    com um UPDATE condicional. Retorna um dict {id: Product}.
+    """
+    if not product_ids:
+        return {}
+    stmt = select(Product).where(Product.id.in_(sorted(set(product_ids))))
+    return {product.id: product for product in db.session.scalars(stmt)}
+
+
+# tentativas de reservar o que sobrou quando allow_partial=True e outro
+# checkout consumiu o estoque entre a leitura e o UPDATE
+_PARTIAL_RETRIES = 5
+
+
+def _conditional_decrement(product_id, quantity, respect_holds=True):
+    # respect_holds: só debita o que não está reservado para outros carrinhos
+    available = Product.stock - held_quantity(Product.id) if respect_holds else Product.stock
+    stmt = (
+        update(Product)
+        .where(Product.id == product_id, available >= quantity)
+        .values(stock=Product.stock - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(stmt).rowcount == 1
+
+
+def _reserve_all(quantities, respect_holds=True):
+    """Tenta debitar todas as linhas do carrinho num único executemany.
+
+    Só funciona em dialetos que informam o rowcount somado de executemany;
+    se alguma linha não tiver estoque o SAVEPOINT interno é desfeito e
+    retorna False para que o chamador reserve linha a linha.
+    """
+    if not quantities or not db.engine.dialect.supports_sane_multi_rowcount:
+        return False
+    table = Product.__table__
+    available = table.c.stock - held_quantity(table.c.id) if respect_holds else table.c.stock
+    stmt = (
+        table.update()
+        .where(table.c.id == bindparam('pid'), available >= bindparam('qty'))
+        .values(stock=table.c.stock - bindparam('qty'))
+    )
+    params = [{'pid': pid, 'qty': qty} for pid, qty in quantities.items()]
+    # pendências do ORM (o Order) não podem ir para dentro do SAVEPOINT interno
+    db.session.flush()
+    savepoint = db.session.begin_nested()
+    if db.session.execute(stmt, params).rowcount == len(params):
+        savepoint.commit()
+        return True
+    savepoint.rollback()
+    return False
+
+
+def reserve_stock(product_id, quantity, allow_partial=False):
+    """Debita o estoque de forma atômica.
+
+    Executa ``UPDATE produtos SET stock = stock - :q WHERE id = :id AND
+    stock - <reservas ativas> >= :q`` e confere o rowcount, sem
+    ler-modificar-escrever em Python.
+    Com ``allow_partial`` reserva o que estiver disponível quando não houver
+    a quantidade pedida. Retorna a quantidade reservada (0 se nada).
+    """
+    quantity = int(quantity)
+    if quantity <= 0:
+        return 0
+    if _conditional_decrement(product_id, quantity):
+        return quantity
+    if not allow_partial:
+        return 0
+
+    for _ in range(_PARTIAL_RETRIES):
+        available = available_stock([product_id]).get(product_id)
+        if not available or available <= 0:
+            return 0
+        wanted = min(available, quantity)
+        if _conditional_decrement(product_id, wanted):
+            return wanted
+    return 0
+
+
+def find_order_by_key(user_id, idempotency_key):
+    """Pedido já criado com a chave de idempotência do usuário, ou None."""
+    return db.session.execute(
+        select(Order).where(Order.user_id == user_id,
+                            Order.idempotency_key == idempotency_key)
+    ).scalar_one_or_none()
+
+
+def _replay(order):
+    return order, json.loads(order.warnings or '[]'), order.total_amount
+
+
+def fill_order(order, items, allow_partial=False, allow_ignore_stock=False, products=None):
+    """Reserva o estoque e grava os itens de ``order`` (já na sessão).
+
+    ``products`` ({id: snapshot}, ver ``cart_pricing.price_cart``) evita
+    carregar de novo os produtos que o carrinho acabou de precificar.
+
+    As reservas de estoque do usuário (app/services/reservations.py) viram
+    débito direto: a quantidade reservada não disputa com outros carrinhos.
+
+    Deve rodar dentro de uma transação/savepoint do chamador. Marca o pedido
+    como pago, soma a venda aos agregados dos relatórios e retorna (warnings, total, ids dos produtos com estoque alterado).
+    Lança ValueError se um produto não existir ou faltar estoque.
+    """
+    warnings = []
+    touched = []
+    total = Decimal('0.00')
+
+    if products is None:
+        products = {pid: product_cache.snapshot(product) for pid, product in
+                    _load_products([int(entry['product_id']) for entry in items]).items()}
+    order_items = []
+
+    reserved_all = False
+    prepaid = {}
+    if not allow_ignore_stock:
+        wanted = {}
+        for entry in items:
+            pid = int(entry['product_id'])
+            if int(entry['quantity']) <= 0:
+                raise ValueError(f'Quantidade inválida para o produto {pid}.')
+            wanted[pid] = wanted.get(pid, 0) + int(entry['quantity'])
+        # reservas ativas: debitadas de uma vez, sem descontar as dos outros
+        held = take_holds(order.user_id, wanted)
+        covered = {pid: min(qty, held[pid]) for pid, qty in wanted.items()
+                   if qty > 0 and held.get(pid)}
+        if covered and _reserve_all(covered, respect_holds=False):
+            prepaid = covered
+        # caminho rápido: o restante de todas as linhas é debitado de uma vez
+        rest = {pid: qty - prepaid.get(pid, 0) for pid, qty in wanted.items()
+                if qty > prepaid.get(pid, 0)}
+        reserved_all = not rest or _reserve_all(rest)
+
+    for entry in items:
+        pid = int(entry['product_id'])
+        qty = int(entry['quantity'])
+        product = products.get(pid)
+        if product is None:
+            raise ValueError(f'Produto {pid} não encontrado')
+
+        used_qty = qty
+        if reserved_all:
+            touched.append(pid)
+        elif not allow_ignore_stock:
+            from_hold = min(qty, prepaid.get(pid, 0))
+            if from_hold:
+                prepaid[pid] -= from_hold
+            used_qty = from_hold + reserve_stock(pid, qty - from_hold, allow_partial=allow_partial)
+            if used_qty == 0 and allow_partial:
+                # silently skip items with zero stock (no warning requested)
+                continue
+            if used_qty < qty:
+                if not allow_partial:
+                    raise ValueError(f"Estoque insuficiente para produto {product['name']}")
+                warnings.append(f"Quantidade do produto '{product['name']}' reduzida de {qty} para {used_qty} por falta de estoque.")
+            touched.append(pid)
+
+        unit_price = Decimal(str(product['price'])).quantize(Decimal('0.01'))
+        total += unit_price * used_qty
+
+        order_items.append({'product_id': pid, 'quantity': used_qty, 'unit_price': unit_price,
+                            'product_image': product.get('image')})
+
+    order.total_amount = total
+    order.warnings = json.dumps(warnings) if warnings else None
+    # marca como PAID por enquanto (integração de pagamento pode alterar)
+    order.status = OrderStatus.PAID.value
+    # flush para obter order.id e inserir os itens num único INSERT em lote
+    db.session.flush()
+    if order_items:
+        for oi in order_items:
+            oi['order_id'] = order.id
+        db.session.execute(insert(OrderItem), order_items)
+    # relatórios: agregados de vendas na mesma transação
+    record_sale(order, order_items)
+    return warnings, total, touched
+
+
+def finalize_order(user, cart, allow_partial=False, allow_ignore_stock=False,
+                   idempotency_key=None, products=None):
+    """Transforma o carrinho em um Order persistido.
+
+    Lança ValueError em caso de erro (carrinho vazio, produto inexistente, estoque insuficiente).
+    Retorna (order, warnings, total).
+
+    Com ``idempotency_key``, uma repetição (duplo clique, retry do cliente)
+    devolve o pedido já criado com a mesma chave, sem debitar o estoque de
+    novo. A restrição única (user_id, idempotency_key) resolve repetições
+    concorrentes. ``products`` é repassado a ``fill_order``.
+    """
+    if idempotency_key:
+        existing = find_order_by_key(user.id, idempotency_key)
+        if existing is not None:
+            return _replay(existing)
+
+    items = validate_items(cart)
 
     # Use a nested transaction (SAVEPOINT) to avoid "A transaction is already begun on this Session"
     # which can occur when the Flask app/request context already started a transaction.
-    warnings = []
     try:
         with db.session.begin_nested():
-            order = Order(user_id=user.id, status=OrderStatus.PENDING.value, total_amount=Decimal('0.00'))
-            db.session.add(order)
-            total = Decimal('0.00')
-
-            for entry in items:
-                pid = int(entry['product_id'])
-                qty = int(entry['quantity'])
-                product = db.session.get(Product, pid)
-                if product is None:
-                    raise ValueError(f'Produto {pid} não encontrado')
-
-                available = getattr(product, 'stock', None)
-                used_qty = qty
-                # If ignoring stock, always use requested qty and do not decrement stock below
-                if allow_ignore_stock:
-                    used_qty = qty
-                    decrement_stock = False
-                else:
-                    decrement_stock = True
-                    if available is not None and available < qty:
-                        if allow_partial:
-                            if available > 0:
-                                used_qty = available
-                                warnings.append(f"Quantidade do produto '{product.name}' reduzida de {qty} para {used_qty} por falta de estoque.")
-                            else:
-                                # silently skip items with zero stock (no warning requested)
-                                continue
-                        else:
-                            raise ValueError(f'Estoque insuficiente para produto {product.name}')
-
-                unit_price = Decimal(str(getattr(product, 'price', 0)))
-                total += unit_price * used_qty
-
-                # debit stock by the used quantity (unless we're purposely ignoring stock)
-                if decrement_stock and getattr(product, 'stock', None) is not None and used_qty > 0:
-                    product.stock = product.stock - used_qty
-                    db.session.add(product)
-
-                oi = OrderItem(order=order, product_id=pid, quantity=used_qty, unit_price=unit_price,
-                               product_image=getattr(product, 'image', None))
-                db.session.add(oi)
-
-            order.total_amount = total
-            # marca como PAID por enquanto (integração de pagamento pode alterar)
-            order.status = OrderStatus.PAID.value
+            order = Order(user_id=user.id, status=OrderStatus.PENDING.value,
+                          total_amount=Decimal('0.00'), idempotency_key=idempotency_key)
             db.session.add(order)
+            warnings, total, touched = fill_order(order, items, allow_partial,
+                                                  allow_ignore_stock, products)
 
         # commit the outer transaction
         db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        existing = idempotency_key and find_order_by_key(user.id, idempotency_key)
+        if existing:
+            return _replay(existing)
+        raise
     except Exception:
         db.session.rollback()
         raise
 
+    # estoque mudou: remove os produtos afetados do cache
+    if touched:
+        product_cache.invalidate_products(*touched)
+
     return order, warnings, total
@@ -0,0 +1,24 @@
+"""Hash e verificação de senha executados nos processos do pool de login.
+
+Este módulo é importado pelos processos filhos (contexto ``spawn``), então
+não deve importar Flask, modelos nem nada da aplicação além do Werkzeug.
+"""
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+def hash_password(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def verify_password(pwhash, password, upgrade_method=None):
+    """Retorna ``(válida, novo_hash)``; ``novo_hash`` só com ``upgrade_method``."""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if upgrade_method is None:
+        return True, None
+    return True, generate_password_hash(password, method=upgrade_method)
+
+
+def hash_prefix(method):
+    """Parâmetros efetivos de ``method`` (a parte do hash antes do sal)."""
+    return generate_password_hash('', method=method).split('$', 1)[0]
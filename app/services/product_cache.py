@@ -0,0 +1,210 @@
+"""Cache de leitura (read-through) para produtos e páginas do catálogo.
+
+O backend é plugável: por padrão usa um cache em memória do processo com
+TTL e despejo LRU. Qualquer classe com a mesma interface de
+``MemoryCacheBackend`` (get/set/delete/clear/stats) pode ser configurada em
+``PRODUCT_CACHE_BACKEND`` como ``"modulo:Classe"``.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from importlib import import_module
+
+from flask import current_app
+
+_MISSING = object()
+_CATALOG_VERSION_KEY = 'catalog:version'
+
+
+class NullCacheBackend:
+    """Backend que não guarda nada (cache desligado)."""
+
+    def get(self, key, default=None):
+        return default
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0}
+
+
+class MemoryCacheBackend:
+    """Cache em memória com expiração por TTL e despejo LRU.
+
+    Thread-safe; mantém contadores de hits, misses e evictions.
+    """
+
+    def __init__(self, max_entries=1024, default_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+            }
+
+
+def _load_backend(name, max_entries, ttl):
+    if not name or name == 'memory':
+        return MemoryCacheBackend(max_entries=max_entries, default_ttl=ttl)
+    if name == 'null':
+        return NullCacheBackend()
+    module_name, _, class_name = name.partition(':')
+    backend_cls = getattr(import_module(module_name), class_name)
+    return backend_cls(max_entries=max_entries, default_ttl=ttl)
+
+
+def init_product_cache(app):
+    """Cria o backend de cache configurado e registra em ``app.extensions``."""
+    backend = _load_backend(
+        app.config.get('PRODUCT_CACHE_BACKEND', 'memory'),
+        int(app.config.get('PRODUCT_CACHE_MAX_ENTRIES', 1024)),
+        int(app.config.get('PRODUCT_CACHE_TTL', 60)),
+    )
+    app.extensions['product_cache'] = backend
+    return backend
+
+
+def get_cache():
+    return current_app.extensions.get('product_cache') or NullCacheBackend()
+
+
+def _product_key(product_id):
+    return f'product:{int(product_id)}'
+
+
+def _catalog_version(cache):
+    version = cache.get(_CATALOG_VERSION_KEY)
+    if version is None:
+        # um token novo (e não um contador) garante que, se a versão for
+        # despejada pelo LRU, páginas antigas nunca voltem a ser servidas
+        version = uuid.uuid4().hex
+        cache.set(_CATALOG_VERSION_KEY, version, ttl=0)
+    return version
+
+
+def catalog_version():
+    """Token da versão atual do catálogo (muda a cada invalidação)."""
+    return _catalog_version(get_cache())
+
+
+def snapshot(product):
+    """Converte um Product em um dict simples, seguro para guardar no cache."""
+    return {
+        "id": product.id,
+        "name": product.name,
+        "price": product.price,
+        "description": product.description,
+        "image": getattr(product, 'image', None),
+        "stock": getattr(product, 'stock', 0),
+        "version": getattr(product, 'version', None) or 1
+    }
+
+
+def get_product(product_id, loader):
+    """Retorna o snapshot do produto, chamando ``loader`` em caso de miss.
+
+    ``loader`` recebe o id e deve retornar um Product ou None. Produtos
+    inexistentes não são guardados no cache.
+    """
+    cache = get_cache()
+    key = _product_key(product_id)
+    data = cache.get(key, _MISSING)
+    if data is _MISSING:
+        product = loader(product_id)
+        if product is None:
+            return None
+        data = snapshot(product)
+        cache.set(key, data)
+    return dict(data)
+
+
+def get_products(product_ids, loader):
+    """Snapshots de vários produtos: {id: dict}, lendo do banco só os misses.
+
+    ``loader`` recebe a lista de ids ausentes do cache e deve retornar os
+    Products encontrados (uma única consulta). Inexistentes ficam de fora.
+    """
+    cache = get_cache()
+    found, missing = {}, []
+    for pid in dict.fromkeys(int(pid) for pid in product_ids):
+        data = cache.get(_product_key(pid), _MISSING)
+        if data is _MISSING:
+            missing.append(pid)
+        else:
+            found[pid] = dict(data)
+    if missing:
+        for product in loader(missing):
+            data = snapshot(product)
+            cache.set(_product_key(product.id), data)
+            found[product.id] = dict(data)
+    return found
+
+
+def get_catalog_page(params, loader):
+    """Retorna uma página do catálogo cacheada pelos parâmetros da consulta."""
+    cache = get_cache()
+    key = 'catalog:{}:{}'.format(
+        _catalog_version(cache), json.dumps(params, sort_keys=True, default=str))
+    page = cache.get(key, _MISSING)
+    if page is _MISSING:
+        page = loader()
+        cache.set(key, page)
+    return {**page, 'items': [dict(item) for item in page['items']]}
+
+
+def invalidate_products(*product_ids):
+    """Remove os produtos do cache e invalida todas as páginas do catálogo."""
+    cache = get_cache()
+    cache.delete(*[_product_key(pid) for pid in product_ids])
+    cache.delete(_CATALOG_VERSION_KEY)
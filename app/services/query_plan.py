@@ -0,0 +1,107 @@
+"""Verificação dos planos de execução das consultas principais da aplicação.
+
+Roda ``EXPLAIN`` (``EXPLAIN QUERY PLAN`` no SQLite) sobre as consultas dos
+caminhos mais usados e aponta as que fazem varredura completa (seq scan).
+Usado pelo comando ``flask queries explain``.
+
+Observação: no PostgreSQL o planejador prefere seq scan em tabelas pequenas;
+rode a verificação num banco com volume realista (e após ANALYZE).
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, text
+
+from app.utils import db
+from app.models.models import CartItem, Order, OrderItem, OrderStatus, Product, StockReservation
+from app.models.order_models import ITEM_COUNT
+from app.models.product_models import CATALOG_COLUMNS
+from app.services.reservations import held_quantity
+
+
+# consultas em que percorrer a tabela na ordem da PK é esperado: a leitura
+# para no LIMIT (ex.: primeira página do catálogo, sem filtro)
+ORDERED_SCAN_OK = {"catálogo: primeira página por id"}
+
+
+def main_queries():
+    """Consultas representativas de cada caminho quente: [(nome, statement)]."""
+    since = datetime(2000, 1, 1)
+    return [
+        ("catálogo: primeira página por id",
+         select(*CATALOG_COLUMNS).order_by(Product.id).limit(21)),
+        ("catálogo: página seguinte por nome",
+         select(*CATALOG_COLUMNS)
+         .where(or_(Product.name > 'M',
+                    and_(Product.name == 'M', Product.id > 10)))
+         .order_by(Product.name, Product.id).limit(21)),
+        ("catálogo: faixa de preço",
+         select(*CATALOG_COLUMNS)
+         .where(Product.price >= 10, Product.price <= 50)
+         .order_by(Product.id).limit(21)),
+        ("catálogo: prefixo do nome",
+         select(*CATALOG_COLUMNS)
+         .where(Product.name.startswith('Vin', autoescape=True))
+         .order_by(Product.name, Product.id).limit(21)),
+        ("produto por id",
+         select(Product).where(Product.id == 1)),
+        ("histórico de pedidos do usuário",
+         select(Order.id, Order.status, Order.total_amount, Order.created_at,
+                ITEM_COUNT)
+         .where(Order.user_id == 1)
+         .order_by(Order.created_at.desc(), Order.id.desc()).limit(20)),
+        ("itens dos pedidos",
+         select(OrderItem).where(OrderItem.order_id.in_([1, 2, 3]))),
+        ("vendas de um produto",
+         select(OrderItem.order_id, OrderItem.quantity)
+         .where(OrderItem.product_id == 1)),
+        ("pedidos pagos no período",
+         select(Order.id, Order.total_amount)
+         .where(Order.status == OrderStatus.PAID.value,
+                Order.created_at >= since,
+                Order.created_at < since + timedelta(days=1))),
+        ("carrinho do usuário",
+         select(CartItem.product_id, CartItem.quantity)
+         .where(CartItem.cart_id == '1')),
+        ("estoque disponível (menos reservas ativas)",
+         select(Product.id, Product.stock - held_quantity(Product.id, since))
+         .where(Product.id.in_([1, 2, 3]))),
+        ("reservas vencidas",
+         select(StockReservation.expires_at)
+         .where(StockReservation.expires_at <= since)
+         .order_by(StockReservation.expires_at).limit(500)),
+    ]
+
+
+def _explain(conn, statement):
+    dialect = conn.dialect.name
+    sql = str(statement.compile(dialect=conn.dialect,
+                                compile_kwargs={"literal_binds": True}))
+    if dialect == 'sqlite':
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        plan = [row[-1] for row in rows]
+        seq = [line for line in plan
+               if line.startswith('SCAN ') and 'USING' not in line
+               and line != 'SCAN CONSTANT ROW']
+    elif dialect == 'postgresql':
+        plan = [row[0] for row in conn.execute(text(f"EXPLAIN {sql}"))]
+        seq = [line for line in plan if 'Seq Scan' in line]
+    elif dialect in ('mysql', 'mariadb'):
+        result = conn.execute(text(f"EXPLAIN {sql}"))
+        rows = [dict(row._mapping) for row in result]
+        plan = [str(row) for row in rows]
+        seq = [str(row) for row in rows if row.get('type') == 'ALL']
+    else:
+        raise ValueError(f"EXPLAIN não suportado para o dialeto {dialect}")
+    return plan, seq
+
+
+def check_query_plans(queries=None):
+    """Retorna [{name, plan, seq_scans}] para cada consulta principal."""
+    results = []
+    with db.engine.connect() as conn:
+        for name, statement in queries or main_queries():
+            plan, seq = _explain(conn, statement)
+            if name in ORDERED_SCAN_OK:
+                seq = []
+            results.append({"name": name, "plan": plan, "seq_scans": seq})
+    return results
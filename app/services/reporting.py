@@ -0,0 +1,135 @@
+"""Agregados de vendas para os relatórios.
+
+Três tabelas são mantidas de forma incremental pelo checkout: ``fill_order``
+chama ``record_sale`` na mesma transação que grava os itens.
+
+- ``sales_daily``: pedidos, unidades e receita por dia (UTC);
+- ``sales_daily_product``: o mesmo por dia e produto;
+- ``product_sales``: acumulado por produto (mais vendidos).
+
+Assim os relatórios (app/models/report_models.py) leem linhas proporcionais
+ao período ou ao ``limit`` pedido, nunca o histórico de ``orders`` /
+``order_items``. ``rebuild_aggregates`` (``flask reports rebuild``) recalcula
+tudo a partir do histórico: use depois da migração ou para corrigir
+divergências.
+"""
+import csv
+import io
+from datetime import datetime
+from decimal import Decimal
+from importlib import import_module
+
+from sqlalchemy import delete, distinct, func, insert, select
+
+from app.utils import db
+from app.models.models import (
+    Order, OrderItem, OrderStatus, ProductSales, SalesDaily, SalesDailyProduct
+)
+
+# pedidos que contam como venda
+SOLD_STATUSES = (OrderStatus.PAID.value, OrderStatus.COMPLETED.value)
+COUNTERS = ('order_count', 'units', 'revenue')
+
+# dialetos com INSERT ... ON CONFLICT DO UPDATE; o módulo do dialeto só é
+# importado quando usado (o do PostgreSQL pesa ~40 ms no boot)
+_UPSERT_DIALECTS = ('sqlite', 'postgresql')
+
+
+def _upsert_insert(dialect_name):
+    if dialect_name not in _UPSERT_DIALECTS:
+        return None
+    return import_module(f'sqlalchemy.dialects.{dialect_name}').insert
+
+
+def _increment(model, keys, rows):
+    """Soma ``COUNTERS`` de ``rows`` às linhas de ``model`` (criando as que faltam)."""
+    table = model.__table__
+    upsert = _upsert_insert(db.session.get_bind(mapper=model).dialect.name)
+    if upsert is not None:
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + stmt.excluded[name] for name in COUNTERS})
+        db.session.execute(stmt, rows)
+        return
+    for row in rows:
+        updated = db.session.execute(
+            table.update()
+            .where(*[table.c[key] == row[key] for key in keys])
+            .values({name: table.c[name] + row[name] for name in COUNTERS})
+        ).rowcount
+        if not updated:
+            db.session.execute(table.insert(), row)
+
+
+def record_sale(order, items):
+    """Soma um pedido pago aos agregados (chamado dentro da transação do checkout).
+
+    ``items`` são dicts com ``product_id``, ``quantity`` e ``unit_price``.
+    """
+    if not items:
+        return
+    day = (order.created_at or datetime.utcnow()).date()
+    per_product = {}
+    for item in items:
+        units, revenue = per_product.get(item['product_id'], (0, Decimal('0.00')))
+        quantity = int(item['quantity'])
+        per_product[item['product_id']] = (
+            units + quantity, revenue + Decimal(item['unit_price']) * quantity)
+
+    rows = [{'product_id': pid, 'order_count': 1, 'units': units, 'revenue': revenue}
+            for pid, (units, revenue) in sorted(per_product.items())]
+    _increment(SalesDaily, ['day'], [{
+        'day': day, 'order_count': 1,
+        'units': sum(row['units'] for row in rows),
+        'revenue': sum((row['revenue'] for row in rows), Decimal('0.00')),
+    }])
+    _increment(SalesDailyProduct, ['day', 'product_id'], [{**row, 'day': day} for row in rows])
+    _increment(ProductSales, ['product_id'], rows)
+
+
+def rebuild_aggregates():
+    """Recalcula os agregados a partir de ``orders``/``order_items`` numa transação.
+
+    Retorna o nº de linhas gravadas em cada tabela.
+    """
+    day = func.date(Order.created_at)
+    sold = (select()
+            .select_from(OrderItem)
+            .join(Order, Order.id == OrderItem.order_id)
+            .where(Order.status.in_(SOLD_STATUSES)))
+    counters = (func.count(distinct(Order.id)), func.sum(OrderItem.quantity),
+                func.sum(OrderItem.quantity * OrderItem.unit_price))
+    queries = (
+        (SalesDaily, ['day'], sold.add_columns(day, *counters).group_by(day)),
+        (SalesDailyProduct, ['day', 'product_id'],
+         sold.add_columns(day, OrderItem.product_id, *counters)
+         .group_by(day, OrderItem.product_id)),
+        (ProductSales, ['product_id'],
+         sold.add_columns(OrderItem.product_id, *counters).group_by(OrderItem.product_id)),
+    )
+    result = {}
+    try:
+        for model, keys, query in queries:
+            db.session.execute(delete(model))
+            db.session.execute(insert(model).from_select(keys + list(COUNTERS), query))
+            result[model.__tablename__] = db.session.scalar(
+                select(func.count()).select_from(model))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+def csv_stream(columns, rows):
+    """Gera o CSV (cabeçalho + uma linha por dict de ``rows``) aos pedaços."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
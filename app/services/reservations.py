@@ -0,0 +1,231 @@
+"""Reservas de estoque dos carrinhos, com expiração.
+
+``cart_add``/``cart_update`` reservam a quantidade do carrinho por
+``STOCK_HOLD_TTL`` segundos (0 desliga as reservas). A reserva é gravada com
+um único ``INSERT ... SELECT`` limitado ao estoque disponível. Duas reservas
+simultâneas do mesmo produto são serializadas: no SQLite pelo lock de escrita
+(o DELETE inicial), nos demais bancos por ``SELECT ... FOR UPDATE`` na linha
+do produto, antes de ler o disponível.
+
+- Estoque disponível = ``stock`` - reservas ativas dos outros usuários. A
+  soma das reservas de um produto é lida só pelo índice
+  ``ix_stock_reservations_product_expires``.
+- Reservas vencidas deixam de contar na hora (o filtro é ``expires_at``);
+  a thread de varredura (``STOCK_HOLD_SWEEP_INTERVAL`` segundos, iniciada no
+  primeiro uso) ou ``flask reservations sweep`` apagam as linhas em lotes de
+  ``STOCK_HOLD_SWEEP_BATCH``.
+- No checkout, ``fill_order`` troca as reservas do usuário pelo débito do
+  estoque (``take_holds``): a quantidade reservada é debitada sem
+  descontar as reservas dos outros nem tentar de novo.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case, delete, func, insert, literal, select
+
+from app.utils import db
+from app.models.models import Product, StockReservation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 15 * 60
+
+
+def held_quantity(product_id, now=None):
+    """Expressão SQL: unidades de ``product_id`` em reservas ativas."""
+    now = now or datetime.utcnow()
+    return func.coalesce(
+        select(func.sum(StockReservation.quantity))
+        .where(StockReservation.product_id == product_id,
+               StockReservation.expires_at > now)
+        .scalar_subquery(), 0)
+
+
+def held_by_others(product_id, user_id, now=None):
+    """Como ``held_quantity``, sem as reservas do próprio ``user_id``."""
+    now = now or datetime.utcnow()
+    return func.coalesce(
+        select(func.sum(StockReservation.quantity))
+        .where(StockReservation.product_id == product_id,
+               StockReservation.user_id != user_id,
+               StockReservation.expires_at > now)
+        .scalar_subquery(), 0)
+
+
+def available_stock(product_ids, user_id=None):
+    """{id: estoque disponível} (``stock`` - reservas ativas, nunca negativo).
+
+    Com ``user_id``, as reservas desse usuário continuam disponíveis para ele.
+    Uma única consulta ``IN``.
+    """
+    if not product_ids:
+        return {}
+    held = (held_quantity(Product.id) if user_id is None
+            else held_by_others(Product.id, user_id))
+    rows = db.session.execute(
+        select(Product.id, Product.stock - held)
+        .where(Product.id.in_(sorted(set(product_ids)))))
+    return {pid: max(0, available or 0) for pid, available in rows}
+
+
+def _hold(user_id, product_id, quantity, expires_at, now):
+    # a reserva anterior sai primeiro (e não conta no disponível); a escrita
+    # vem antes da leitura, então no SQLite a transação já começa como escrita
+    # e segura o lock até o commit
+    db.session.execute(delete(StockReservation).where(
+        StockReservation.user_id == user_id, StockReservation.product_id == product_id))
+    if quantity <= 0:
+        return 0
+    if db.session.get_bind(mapper=Product).dialect.name != 'sqlite':
+        # READ COMMITTED: sem o lock, dois INSERT ... SELECT veriam o mesmo disponível
+        db.session.execute(select(Product.id).where(Product.id == product_id).with_for_update())
+    available = Product.stock - held_quantity(Product.id, now)
+    db.session.execute(insert(StockReservation).from_select(
+        ['user_id', 'product_id', 'quantity', 'expires_at'],
+        select(literal(user_id), Product.id,
+               case((available < quantity, available), else_=quantity),
+               literal(expires_at, db.DateTime))
+        .where(Product.id == product_id, available > 0)))
+    return db.session.scalar(select(StockReservation.quantity).where(
+        StockReservation.user_id == user_id,
+        StockReservation.product_id == product_id)) or 0
+
+
+def hold_cart(user_id, quantities):
+    """Reserva ``{product_id: qty}`` para o usuário, renovando a expiração.
+
+    Retorna {id: quantidade reservada}, que pode ser menor que a pedida.
+    Com as reservas desligadas, devolve as quantidades pedidas.
+    """
+    ttl = current_app.config.get('STOCK_HOLD_TTL', DEFAULT_TTL)
+    if not ttl:
+        return dict(quantities)
+    get_sweeper().ensure_running()
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    try:
+        held = {pid: _hold(user_id, pid, int(qty), expires_at, now)
+                for pid, qty in sorted(quantities.items())}
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return held
+
+
+def release_holds(user_id, product_ids=None):
+    """Libera as reservas do usuário (todas ou só de ``product_ids``)."""
+    stmt = delete(StockReservation).where(StockReservation.user_id == user_id)
+    if product_ids is not None:
+        stmt = stmt.where(StockReservation.product_id.in_(list(product_ids)))
+    try:
+        db.session.execute(stmt)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def take_holds(user_id, product_ids):
+    """Remove as reservas do usuário para ``product_ids`` (na transação do chamador).
+
+    Retorna {id: quantidade} só das que ainda estavam ativas.
+    """
+    if not product_ids:
+        return {}
+    now = datetime.utcnow()
+    stmt = delete(StockReservation).where(
+        StockReservation.user_id == user_id,
+        StockReservation.product_id.in_(sorted(set(product_ids))))
+    columns = (StockReservation.product_id, StockReservation.quantity,
+               StockReservation.expires_at)
+    if db.session.get_bind(mapper=StockReservation).dialect.delete_returning:
+        rows = db.session.execute(stmt.returning(*columns)).all()
+    else:
+        rows = db.session.execute(select(*columns).where(stmt.whereclause)).all()
+        db.session.execute(stmt)
+    return {pid: qty for pid, qty, expires_at in rows if expires_at > now}
+
+
+def sweep_expired(batch_size=500):
+    """Apaga as reservas vencidas em lotes (um commit por lote); retorna quantas."""
+    total = 0
+    while True:
+        now = datetime.utcnow()
+        # expiração da última linha do lote: o DELETE usa só o índice de expires_at
+        cutoff = db.session.scalar(
+            select(StockReservation.expires_at)
+            .where(StockReservation.expires_at <= now)
+            .order_by(StockReservation.expires_at)
+            .offset(batch_size - 1).limit(1)) or now
+        try:
+            deleted = db.session.execute(
+                delete(StockReservation).where(StockReservation.expires_at <= cutoff)
+            ).rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        total += deleted
+        if cutoff == now:
+            return total
+
+
+class ReservationSweeper:
+    """Thread do processo que apaga as reservas vencidas periodicamente."""
+
+    def __init__(self, app, interval=60, batch_size=500):
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    def ensure_running(self):
+        # iniciada no primeiro uso, em cada processo (threads não sobrevivem ao fork)
+        if not self.interval or (self._pid == os.getpid() and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='reservation-sweeper',
+                                            daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    swept = sweep_expired(self.batch_size)
+                    if swept:
+                        logger.info("Reservas expiradas removidas", extra={
+                            'event': 'reservations.swept', 'count': swept})
+                except Exception:
+                    logger.exception("Falha na varredura das reservas",
+                                     extra={'event': 'reservations.sweep_failed'})
+                finally:
+                    db.session.remove()
+
+
+def init_reservations(app):
+    sweeper = ReservationSweeper(
+        app,
+        interval=app.config.get('STOCK_HOLD_SWEEP_INTERVAL', 60),
+        batch_size=app.config.get('STOCK_HOLD_SWEEP_BATCH', 500),
+    )
+    app.extensions['reservations'] = sweeper
+    return sweeper
+
+
+def get_sweeper():
+    return current_app.extensions['reservations']
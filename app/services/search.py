@@ -0,0 +1,333 @@
+"""Busca textual de produtos por nome e descrição, com ranking.
+
+Dois backends (``SEARCH_BACKEND``):
+
+- ``fts5``: tabela virtual FTS5 ``produtos_fts`` do SQLite, com tokenizador
+  ``unicode61 remove_diacritics 2`` e ranking bm25 (nome pesa mais);
+- ``memory``: índice invertido no processo, construído na primeira busca,
+  com o mesmo tratamento de acentos, prefixo e ranking tf-idf.
+
+``auto`` (padrão) usa FTS5 quando o banco é SQLite e a tabela existe.
+O índice é atualizado de forma incremental por ``index_products`` e
+``remove_products``, chamados por create/update/delete_product e pela
+importação em lote. No FTS5 a atualização vai na mesma transação da
+escrita; no índice em memória os ids ficam pendentes na sessão e são
+aplicados só depois do commit, relendo o estado gravado (um rollback não
+deixa entradas fantasmas).
+
+Os dois backends ranqueiam todos os documentos que casam com a busca e
+devolvem os ``limit`` melhores.
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from flask import current_app
+from sqlalchemy import DDL, event, select, text
+from sqlalchemy.orm import Session
+
+from app.utils import db
+from app.models.models import Product
+
+FTS_TABLE = 'produtos_fts'
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+# limite de termos do vocabulário expandidos por um prefixo (backend memory)
+MAX_PREFIX_EXPANSION = 256
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+CREATE_FTS = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, description, tokenize = 'unicode61 remove_diacritics 2', "
+    "prefix = '2 3 4 5 6')"
+)
+
+
+def normalize(value):
+    """Minúsculas e sem acentos: 'Vinho Tinto Português' -> 'vinho tinto portugues'."""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(value):
+    return _TOKEN_RE.findall(normalize(value))
+
+
+def query_terms(query):
+    """Termos da busca; plurais simples viram prefixo ('tintos' -> 'tinto')."""
+    terms = []
+    for token in tokenize(query):
+        if len(token) > 3 and token.endswith('s'):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def _fts5_available(bind):
+    if bind.dialect.name != 'sqlite':
+        return False
+    options = {row[0] for row in bind.exec_driver_sql('PRAGMA compile_options')}
+    return 'ENABLE_FTS5' in options
+
+
+# db.create_all() também cria a tabela FTS (em produção, via migração)
+event.listen(
+    Product.__table__, 'after_create',
+    DDL(CREATE_FTS).execute_if(
+        callable_=lambda ddl, target, bind, **kw: _fts5_available(bind))
+)
+
+
+class FTS5SearchBackend:
+    name = 'fts5'
+
+    def index(self, product_ids):
+        ids = sorted(set(product_ids))
+        params = {f'p{i}': pid for i, pid in enumerate(ids)}
+        marks = ', '.join(f':{key}' for key in params)
+        db.session.execute(
+            text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})"), params)
+        db.session.execute(text(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+            f"SELECT id, name, coalesce(description, '') FROM produtos "
+            f"WHERE id IN ({marks})"), params)
+
+    def remove(self, product_ids):
+        for pid in set(product_ids):
+            db.session.execute(
+                text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :pid"), {'pid': pid})
+
+    def rebuild(self):
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        db.session.execute(text(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+            f"SELECT id, name, coalesce(description, '') FROM produtos"))
+
+    def search(self, query, limit):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # ORDER BY rank LIMIT: o FTS5 ranqueia todos os casamentos com bm25
+        # (pesos via "rank MATCH") e mantém só os melhores
+        rows = db.session.execute(text(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+            f"AND rank MATCH 'bm25({NAME_WEIGHT}, {DESCRIPTION_WEIGHT})' "
+            f"ORDER BY rank, rowid DESC LIMIT :limit"),
+            {'match': match, 'limit': limit})
+        return [row[0] for row in rows]
+
+
+class MemorySearchBackend:
+    """Índice invertido em memória (por processo), com prefixo e tf-idf."""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._postings = {}   # token -> {product_id: peso}
+        self._vocab = []      # tokens ordenados, para busca por prefixo
+        self._docs = {}       # product_id -> tokens do documento
+
+    def _add(self, pid, name, description):
+        weights = {}
+        for token in tokenize(name):
+            weights[token] = weights.get(token, 0.0) + NAME_WEIGHT
+        for token in tokenize(description):
+            weights[token] = weights.get(token, 0.0) + DESCRIPTION_WEIGHT
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                if self._built:
+                    self._vocab.insert(bisect_left(self._vocab, token), token)
+            postings[pid] = weight
+        self._docs[pid] = tuple(weights)
+
+    def _discard(self, pid):
+        for token in self._docs.pop(pid, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(pid, None)
+            if not postings:
+                del self._postings[token]
+                i = bisect_left(self._vocab, token)
+                if i < len(self._vocab) and self._vocab[i] == token:
+                    del self._vocab[i]
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        from app.models.product_models import iter_products
+        with self._lock:
+            if self._built:
+                return
+            for product in iter_products(batch_size=5000):
+                self._add(product['id'], product['name'], product['description'])
+            self._vocab = sorted(self._postings)
+            self._built = True
+
+    def index(self, product_ids):
+        if not self._built:
+            return  # a construção lerá o estado atual do banco
+        # aplicado no commit (ver _apply_pending); remoção e atualização são
+        # iguais: o estado gravado de cada id é relido
+        pending = db.session.info.setdefault(_PENDING_KEY, {})
+        pending.setdefault(self, set()).update(product_ids)
+
+    remove = index
+
+    def apply(self, bind, product_ids):
+        """Reindexa ``product_ids`` com o estado já gravado no banco."""
+        with bind.connect() as conn:
+            rows = conn.execute(
+                select(Product.id, Product.name, Product.description)
+                .where(Product.id.in_(sorted(product_ids)))).all()
+        with self._lock:
+            for pid in product_ids:
+                self._discard(pid)
+            for row in rows:
+                self._add(row.id, row.name, row.description)
+
+    def rebuild(self):
+        with self._lock:
+            self._built = False
+            self._postings, self._vocab, self._docs = {}, [], {}
+        self._ensure_built()
+
+    def _expand(self, term, total_docs):
+        """[(postings, idf)] dos tokens do vocabulário que começam com ``term``."""
+        expanded = []
+        start = bisect_left(self._vocab, term)
+        for token in self._vocab[start:start + MAX_PREFIX_EXPANSION]:
+            if not token.startswith(term):
+                break
+            postings = self._postings[token]
+            expanded.append((postings, math.log(1 + total_docs / len(postings))))
+        return expanded
+
+    def search(self, query, limit):
+        terms = query_terms(query)
+        if not terms or limit <= 0:
+            return []
+        self._ensure_built()
+        with self._lock:
+            total_docs = max(len(self._docs), 1)
+            expanded = [self._expand(term, total_docs) for term in terms]
+            if not all(expanded):
+                return []
+            # percorre o termo mais raro e confere os demais por lookup
+            expanded.sort(key=lambda e: sum(len(postings) for postings, _ in e))
+            primary = expanded[0]
+
+            # todos os documentos do termo mais raro são pontuados; o heap
+            # guarda só os ``limit`` melhores (empate: o mais recente)
+            top = []
+            seen = set()
+            for postings, _ in primary:
+                for pid in postings:
+                    if pid in seen:
+                        continue
+                    seen.add(pid)
+                    total = 0.0
+                    for term in expanded:
+                        best = 0.0
+                        for term_postings, idf in term:
+                            weight = term_postings.get(pid)
+                            if weight is not None and weight * idf > best:
+                                best = weight * idf
+                        if not best:
+                            break
+                        total += best
+                    else:
+                        if len(top) < limit:
+                            heapq.heappush(top, (total, pid))
+                        elif (total, pid) > top[0]:
+                            heapq.heapreplace(top, (total, pid))
+        return [pid for _, pid in sorted(top, reverse=True)]
+
+
+_PENDING_KEY = 'search_pending'
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    bind = session.get_bind(mapper=Product)
+    for backend, product_ids in pending.items():
+        backend.apply(bind, product_ids)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction):
+    # só o rollback da transação externa; savepoints desfeitos não importam,
+    # porque o commit relê o estado gravado
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+def init_search(app):
+    app.extensions['search'] = {'backend': None}
+
+
+def get_search_backend():
+    """Backend configurado, resolvido na primeira chamada de cada app."""
+    state = current_app.extensions['search']
+    if state['backend'] is None:
+        choice = current_app.config.get('SEARCH_BACKEND', 'auto')
+        if choice == 'auto':
+            table = None
+            if db.engine.dialect.name == 'sqlite':
+                table = db.session.execute(text(
+                    "SELECT name FROM sqlite_master WHERE name = :name"),
+                    {'name': FTS_TABLE}).scalar()
+            choice = 'fts5' if table else 'memory'
+        state['backend'] = FTS5SearchBackend() if choice == 'fts5' else MemorySearchBackend()
+    return state['backend']
+
+
+def index_products(product_ids):
+    """Atualiza o índice para os produtos (na transação corrente)."""
+    if product_ids:
+        get_search_backend().index(list(product_ids))
+
+
+def remove_products(product_ids):
+    if product_ids:
+        get_search_backend().remove(list(product_ids))
+
+
+def rebuild_index():
+    get_search_backend().rebuild()
+
+
+def search_products(query, limit=20):
+    """Busca ranqueada: lista de dicts com as colunas do catálogo, melhores primeiro."""
+    from app.models.product_models import CATALOG_COLUMNS
+
+    ids = get_search_backend().search(query, limit)
+    if not ids:
+        return []
+    rows = db.session.query(*CATALOG_COLUMNS).filter(Product.id.in_(ids)) \
+        .execution_options(replica=True).all()
+    by_id = {row.id: row for row in rows}
+    return [
+        {
+            "id": row.id,
+            "name": row.name,
+            "price": row.price,
+            "stock": row.stock,
+            "image": row.image,
+            "version": row.version,
+            "updated_at": row.updated_at
+        }
+        for row in (by_id.get(pid) for pid in ids) if row is not None
+    ]
@@ -0,0 +1,125 @@
+"""Inicialização da aplicação: preparo do banco e pré-carga.
+
+``STARTUP_MODE`` (variável de ambiente lida em ``create_app``):
+
+- ``development`` (padrão): ``run.py`` cria as tabelas que faltam com
+  ``db.create_all()``;
+- ``production``: nenhum DDL no boot. ``check_migrations`` só confere, com
+  uma consulta à ``alembic_version``, que o banco está na última migração de
+  ``migrations/versions`` e interrompe o boot se não estiver. O Flask-Migrate
+  (que importa o Alembic, a dependência mais pesada da aplicação) só é
+  carregado pelo comando ``flask``, e ``preload`` roda antes da primeira
+  requisição.
+
+``preload`` compila todos os templates e carrega os módulos adiados. Com um
+servidor que faz fork depois de carregar a aplicação (ex.: ``gunicorn
+--preload run:app``) isso acontece uma vez no processo mestre e os workers
+herdam o resultado; as conexões do mestre são fechadas antes do fork e cada
+filho descarta o pool herdado e reinicia a thread do logging.
+"""
+import ast
+import logging
+import os
+import weakref
+
+import click
+from sqlalchemy import inspect, text
+
+from app.utils import APP_DIR, db
+from app.services.image_pipeline import get_image_pipeline
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(APP_DIR), 'migrations')
+
+_preloaded_apps = weakref.WeakSet()
+_fork_hook_registered = False
+
+
+def migration_heads(directory=MIGRATIONS_DIR):
+    """Revisões finais da cadeia de migrações (lidas dos arquivos, sem Alembic)."""
+    revisions, parents = set(), set()
+    versions = os.path.join(directory, 'versions')
+    for name in os.listdir(versions):
+        if not name.endswith('.py'):
+            continue
+        with open(os.path.join(versions, name), encoding='utf-8') as fh:
+            tree = ast.parse(fh.read(), name)
+        for node in tree.body:
+            if not isinstance(node, ast.Assign) or len(node.targets) != 1:
+                continue
+            target = getattr(node.targets[0], 'id', None)
+            if target == 'revision':
+                revisions.add(ast.literal_eval(node.value))
+            elif target == 'down_revision':
+                value = ast.literal_eval(node.value)
+                if isinstance(value, (tuple, list)):
+                    parents.update(value)
+                elif value:
+                    parents.add(value)
+    return revisions - parents
+
+
+def current_revisions(engine):
+    """Revisões gravadas em ``alembic_version`` (vazio se o banco nunca foi migrado)."""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table('alembic_version'):
+            return set()
+        return set(conn.scalars(text('SELECT version_num FROM alembic_version')))
+
+
+def check_migrations(app):
+    """Lança RuntimeError se o banco não estiver na última migração."""
+    with app.app_context():
+        current = current_revisions(db.engine)
+    heads = migration_heads(app.config.get('MIGRATIONS_DIR', MIGRATIONS_DIR))
+    if current != heads:
+        raise RuntimeError(
+            "Banco desatualizado (revisão {}, esperada {}): rode 'flask db upgrade'."
+            .format(', '.join(sorted(current)) or 'nenhuma', ', '.join(sorted(heads))))
+
+
+def prepare_database(app):
+    """Cria as tabelas (desenvolvimento) ou confere as migrações (produção)."""
+    if app.config.get('STARTUP_MODE') == 'production':
+        # sob o comando flask (ex.: ``flask db upgrade``) o banco pode estar atrás
+        if click.get_current_context(silent=True) is None:
+            check_migrations(app)
+        return
+    with app.app_context():
+        db.create_all()
+
+
+def preload(app):
+    """Aquece a aplicação antes da primeira requisição (e antes do fork)."""
+    for name in app.jinja_env.list_templates(extensions=('html',)):
+        app.jinja_env.get_template(name)
+    with app.app_context():
+        get_image_pipeline().formats  # cria o pipeline e carrega o Pillow
+    # nenhuma conexão aberta deve ser herdada pelos workers
+    _dispose_engines(app, close=True)
+
+    global _fork_hook_registered
+    _preloaded_apps.add(app)
+    if not _fork_hook_registered and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_after_fork)
+        _fork_hook_registered = True
+
+
+def _dispose_engines(app, close):
+    with app.app_context():
+        engines = list(db.engines.values())
+    replica = app.extensions.get('database', {}).get('replica')
+    if replica is not None:
+        engines.append(replica)
+    for engine in engines:
+        engine.dispose(close=close)
+
+
+def _after_fork():
+    from app.services.logging_config import init_logging
+
+    for app in list(_preloaded_apps):
+        # close=False: os sockets herdados continuam sendo do processo mestre
+        _dispose_engines(app, close=False)
+        init_logging(app)
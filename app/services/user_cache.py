@@ -0,0 +1,81 @@
+"""Cache da identidade do usuário logado (``user_loader`` do Flask-Login).
+
+Em vez de carregar o ``User`` do ORM a cada requisição autenticada, o
+loader devolve uma ``UserIdentity`` (id, username e email), lida com um
+SELECT só dessas colunas e guardada por ``USER_CACHE_TTL`` segundos num
+cache em memória do processo (0 desliga). Quem precisa do modelo completo
+chama ``current_user.load()``.
+
+A entrada é removida quando o usuário é alterado ou excluído pelo ORM
+(eventos do mapper) e no logout. Alterações feitas em outro processo ou por
+UPDATE direto aparecem depois de no máximo ``USER_CACHE_TTL`` segundos.
+"""
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, select
+
+from app.utils import db
+from app.models.models import User
+from app.services.product_cache import MemoryCacheBackend, NullCacheBackend
+
+DEFAULT_TTL = 30
+
+
+class UserIdentity(UserMixin):
+    """Usuário autenticado sem o modelo do ORM (só o que as páginas usam)."""
+
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+
+    def load(self):
+        """O ``User`` completo do banco."""
+        return db.session.get(User, self.id)
+
+    def __repr__(self):
+        return f'<UserIdentity {self.id} {self.username!r}>'
+
+
+def init_user_cache(app):
+    ttl = int(app.config.get('USER_CACHE_TTL', DEFAULT_TTL))
+    if ttl > 0:
+        cache = MemoryCacheBackend(
+            max_entries=int(app.config.get('USER_CACHE_MAX_ENTRIES', 4096)), default_ttl=ttl)
+    else:
+        cache = NullCacheBackend()
+    app.extensions['user_cache'] = cache
+    return cache
+
+
+def _get_cache():
+    return current_app.extensions.get('user_cache') or NullCacheBackend()
+
+
+def load_identity(user_id):
+    """``user_loader``: identidade do usuário (do cache ou de um SELECT) ou None."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    cache = _get_cache()
+    row = cache.get(user_id)
+    if row is None:
+        row = db.session.execute(
+            select(User.id, User.username, User.email).where(User.id == user_id)).first()
+        if row is None:
+            return None
+        row = tuple(row)
+        cache.set(user_id, row)
+    return UserIdentity(*row)
+
+
+def invalidate_user(user_id):
+    if has_app_context():
+        _get_cache().delete(int(user_id))
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.id)
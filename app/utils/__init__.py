@@ -1,54 +1,203 @@
-from flask import Flask, session
+import click
+from flask import Flask, request, session
 from flask_jwt_extended import JWTManager
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_migrate import Migrate
 import os
-from dotenv import load_dotenv
 from datetime import timedelta
 import secrets
+import time
 
-load_dotenv()
+# diretório do pacote app/ (static/ fica ao lado de templates/)
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 db = SQLAlchemy()
 jwt = JWTManager()
 login_manager = LoginManager()
-migrate = Migrate()
+_dotenv_loaded = False
+
+
+def _load_dotenv():
+    # uma vez por processo; FLASK_SKIP_DOTENV=1 pula (variáveis já vêm do ambiente)
+    global _dotenv_loaded
+    if _dotenv_loaded or os.getenv('FLASK_SKIP_DOTENV', '').lower() in ('1', 'true', 'on'):
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _dotenv_loaded = True
 
 
 def create_app():
+    _load_dotenv()
     app = Flask(__name__, template_folder=os.path.join(
-        os.getcwd(), 'app', 'templates'))
-
-    print("Template folder:", app.template_folder)
+        os.getcwd(), 'app', 'templates'),
+        static_folder=os.path.join(APP_DIR, 'static'))
 
+    # "development" (create_all no boot) ou "production" (só confere as
+    # migrações; ver app/services/startup.py)
+    app.config['STARTUP_MODE'] = os.getenv('STARTUP_MODE', 'development')
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=15)
+    # "sliding" (padrão) renova o cookie só perto de expirar; "always" renova em toda requisição
+    app.config['SESSION_REFRESH_MODE'] = os.getenv('SESSION_REFRESH_MODE', 'sliding')
+    # fração do tempo de vida após a qual a sessão é renovada (modo sliding)
+    app.config['SESSION_REFRESH_THRESHOLD'] = float(os.getenv('SESSION_REFRESH_THRESHOLD', 0.5))
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
         'DATABASE_URL', 'sqlite:///produtos.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
+    # engine: perfil de pool/pragmas ("development", "production", "test"),
+    # sobrescrito por DB_<CHAVE>; réplica opcional para leituras do catálogo
+    app.config['DB_PROFILE'] = os.getenv('DB_PROFILE', 'development')
+    app.config['DATABASE_REPLICA_URL'] = os.getenv('DATABASE_REPLICA_URL')
+    # paginação do catálogo: tamanho padrão e limite máximo por página
+    app.config['CATALOG_PAGE_SIZE'] = int(os.getenv('CATALOG_PAGE_SIZE', 20))
+    app.config['CATALOG_MAX_PAGE_SIZE'] = int(os.getenv('CATALOG_MAX_PAGE_SIZE', 100))
+
+    # cache de produtos: backend ("memory", "null" ou "modulo:Classe"), TTL em segundos e nº máximo de entradas
+    app.config['PRODUCT_CACHE_BACKEND'] = os.getenv('PRODUCT_CACHE_BACKEND', 'memory')
+    app.config['PRODUCT_CACHE_TTL'] = int(os.getenv('PRODUCT_CACHE_TTL', 60))
+    app.config['PRODUCT_CACHE_MAX_ENTRIES'] = int(os.getenv('PRODUCT_CACHE_MAX_ENTRIES', 1024))
+
+    # importação em lote: linhas gravadas por transação
+    app.config['IMPORT_CHUNK_SIZE'] = int(os.getenv('IMPORT_CHUNK_SIZE', 500))
+
+    # carrinho no servidor: "sql" (padrão), "memory", "redis" ou "modulo:Classe"
+    app.config['CART_STORE'] = os.getenv('CART_STORE', 'sql')
+    app.config['REDIS_URL'] = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    app.config['CART_TTL'] = int(os.getenv('CART_TTL', 7 * 24 * 3600))
+
+    # imagens: larguras das miniaturas e threads do pool que gera as variantes
+    app.config['IMAGE_WIDTHS'] = tuple(
+        int(w) for w in os.getenv('IMAGE_WIDTHS', '160,320,640').split(','))
+    app.config['IMAGE_WORKERS'] = int(os.getenv('IMAGE_WORKERS', 2))
+
+    # cache de fragmentos HTML do catálogo: orçamento de memória em bytes (0 desliga)
+    app.config['FRAGMENT_CACHE_MAX_BYTES'] = int(os.getenv('FRAGMENT_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+
+    # checkout: "sync" (padrão) ou "queue" (fila no banco + pool de workers no processo)
+    app.config['CHECKOUT_MODE'] = os.getenv('CHECKOUT_MODE', 'sync')
+    app.config['CHECKOUT_WORKERS'] = int(os.getenv('CHECKOUT_WORKERS', 2))
+    # segundos após os quais um job "running" é considerado abandonado
+    app.config['CHECKOUT_JOB_TIMEOUT'] = int(os.getenv('CHECKOUT_JOB_TIMEOUT', 300))
+    # reservas de estoque do carrinho: validade em segundos (0 desliga) e varredura das vencidas
+    app.config['STOCK_HOLD_TTL'] = int(os.getenv('STOCK_HOLD_TTL', 15 * 60))
+    app.config['STOCK_HOLD_SWEEP_INTERVAL'] = int(os.getenv('STOCK_HOLD_SWEEP_INTERVAL', 60))
+    app.config['STOCK_HOLD_SWEEP_BATCH'] = int(os.getenv('STOCK_HOLD_SWEEP_BATCH', 500))
+
+    # busca: "auto" (FTS5 no SQLite, senão índice em memória), "fts5" ou "memory"
+    app.config['SEARCH_BACKEND'] = os.getenv('SEARCH_BACKEND', 'auto')
+
+    # instrumentação por requisição (Server-Timing e /metrics); desligada por padrão
+    app.config['INSTRUMENTATION'] = os.getenv('INSTRUMENTATION', '').lower() in ('1', 'true', 'on')
+    # repetições do mesmo SQL numa requisição a partir das quais é sinalizado N+1
+    app.config['N_PLUS_ONE_THRESHOLD'] = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+
+    # login/cadastro: limites "<tentativas>/<segundos>" (0 desliga) e pool de hash de senha
+    app.config['LOGIN_IP_RATE'] = os.getenv('LOGIN_IP_RATE', '20/60')
+    app.config['LOGIN_USER_RATE'] = os.getenv('LOGIN_USER_RATE', '5/60')
+    app.config['REGISTER_IP_RATE'] = os.getenv('REGISTER_IP_RATE', '5/300')
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', 8))
+    # segundos de espera por um hash antes de responder 503
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    # identidade do usuário logado em cache por N segundos (0 desliga)
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 30))
+
+    # logging estruturado (ver app/services/logging_config.py)
+    from app.services.logging_config import init_logging, parse_mapping
+    app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO').upper()
+    app.config['LOG_FORMAT'] = os.getenv('LOG_FORMAT', 'json')
+    app.config['LOG_LEVELS'] = parse_mapping(os.getenv('LOG_LEVELS'))
+    app.config['LOG_SAMPLING'] = parse_mapping(os.getenv('LOG_SAMPLING'), float)
+    init_logging(app)
 
     # ensure SECRET_KEY is set for session support; prefer env var, fallback to secure random for dev
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY') or secrets.token_hex(32)
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY') or app.config['SECRET_KEY']
+    # a API só aceita o token no header Authorization (nunca em cookie)
+    app.config['JWT_TOKEN_LOCATION'] = ['headers']
 
+    from app.services.database import configure_database, init_database
+    configure_database(app)
     db.init_app(app)
+    init_database(app)
+
+    from app.services.instrumentation import init_instrumentation
+    init_instrumentation(app)
     jwt.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
-    migrate.init_app(app, db, render_as_batch=True)
+    # o Flask-Migrate importa o Alembic; em produção só o comando flask precisa dele
+    if app.config['STARTUP_MODE'] != 'production' or click.get_current_context(silent=True):
+        from flask_migrate import Migrate
+        Migrate(app, db, render_as_batch=True)
+
+    from app.services.search import init_search
+    init_search(app)
+
+    from app.services.product_cache import init_product_cache
+    init_product_cache(app)
+
+    from app.services.cart_store import init_cart_store
+    init_cart_store(app)
+
+    from app.services.assets import init_assets
+    init_assets(app)
+
+    # o pipeline de imagens e a fila de checkout são criados no primeiro uso
+    from app.services.image_pipeline import image_sources
+    app.add_template_global(image_sources)
+
+    from app.services.fragment_cache import init_fragment_cache
+    init_fragment_cache(app)
 
-    from app.models.models import Product, User
+    from app.services.reservations import init_reservations
+    init_reservations(app)
 
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
-    
-    @app.before_request
-    def before_request():
-        session.permanent = True
-        app.permanent_session_lifetime = timedelta(minutes=15)
-        session.modified = True
+    from app.services.login_guard import init_login_guard
+    init_login_guard(app)
+
+    from app.services.user_cache import init_user_cache, load_identity
+    init_user_cache(app)
+    login_manager.user_loader(load_identity)
+
+    if app.config['SESSION_REFRESH_MODE'] == 'always':
+        @app.before_request
+        def before_request():
+            # a API JSON é stateless: não toca na sessão para não emitir cookie
+            if request.blueprint == 'api':
+                return
+            session.permanent = True
+            session.modified = True
+    else:
+        # expiração deslizante: o cookie só é reemitido quando a sessão já
+        # mudou na requisição ou quando passou a fração configurada do tempo de vida
+        app.config['SESSION_REFRESH_EACH_REQUEST'] = False
+
+        @app.after_request
+        def refresh_session(response):
+            if request.blueprint in ('api', 'assets') or request.endpoint in (None, 'static'):
+                return response
+            if not session:
+                return response
+            now = int(time.time())
+            lifetime = app.permanent_session_lifetime.total_seconds()
+            threshold = lifetime * app.config['SESSION_REFRESH_THRESHOLD']
+            if (session.modified or not session.permanent
+                    or now - session.get('_refreshed_at', 0) >= threshold):
+                session.permanent = True
+                session['_refreshed_at'] = now
+            return response
 
     from app.routes.routes import main_bp
     app.register_blueprint(main_bp)
 
+    from app.routes.api import api_bp
+    app.register_blueprint(api_bp)
+
+    from app.routes.assets import assets_bp
+    app.register_blueprint(assets_bp)
+
+    from app.cli import register_commands
+    register_commands(app)
+
     return app
\ No newline at end of file
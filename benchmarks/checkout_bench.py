@@ -0,0 +1,80 @@
+"""Benchmark do finalize_order por tamanho de carrinho.
+
+Mede a latência média e o número de comandos SQL por checkout para
+carrinhos de tamanhos diferentes. Com o carregamento em lote a latência
+e a contagem de SQL devem ficar praticamente constantes.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.checkout_bench [--rounds 20] [--sizes 1,10,40,100]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import event
+
+
+def run(sizes, rounds):
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file.name}'
+
+    from app.utils import create_app, db
+    from app.models.models import Product, User
+    from app.services.order_service import finalize_order
+
+    app = create_app()
+    results = []
+    with app.app_context():
+        db.create_all()
+        max_size = max(sizes)
+        db.session.add_all([
+            Product(name=f'Vinho {i}', price=10 + i, stock=10 ** 9)
+            for i in range(max_size)
+        ])
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+        product_ids = [p.id for p in Product.query.order_by(Product.id)]
+
+        statements = []
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        for size in sizes:
+            cart = {'items': {str(pid): {'qty': 1} for pid in product_ids[:size]}}
+            finalize_order(user, cart)  # aquecimento
+            statements.clear()
+            started = time.perf_counter()
+            for _ in range(rounds):
+                finalize_order(user, cart)
+            elapsed = time.perf_counter() - started
+            results.append({
+                'cart_size': size,
+                'avg_ms': elapsed / rounds * 1000,
+                'sql_per_checkout': len(statements) / rounds,
+            })
+
+        event.remove(db.engine, 'before_cursor_execute', count)
+    os.unlink(db_file.name)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--sizes', default='1,10,40,100')
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    print(f"{'itens':>6} {'ms/checkout':>12} {'SQL/checkout':>13}")
+    for row in run(sizes, args.rounds):
+        print(f"{row['cart_size']:>6} {row['avg_ms']:>12.2f} {row['sql_per_checkout']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
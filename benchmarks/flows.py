@@ -0,0 +1,338 @@
+"""Teste de carga dos fluxos principais da loja, com baselines em JSON.
+
+Cada usuário virtual faz login (fora da medição) e repete o fluxo de compra:
+
+    /produtos -> /produtos/<id> -> cart_add -> /carrinho -> cart_update -> checkout
+
+O fluxo roda contra a aplicação real, por um de dois drivers:
+
+- ``client``: ``app.test_client()`` (sem rede; mede a aplicação);
+- ``server``: servidor WSGI local do Werkzeug (com threads) e ``urllib``,
+  um processo só, mas com HTTP, cookies e conexões de verdade.
+
+O banco é um SQLite temporário semeado pela camada de modelos com
+``--products`` produtos, ``--users`` usuários (um por usuário virtual) e
+``--orders`` pedidos antigos. O relatório traz vazão (req/s) e p50/p95/p99
+por endpoint; ``--save`` grava o resultado em JSON e ``compare`` falha
+(código 1) se um resultado piorou além da tolerância em relação à baseline.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.flows run [--driver client|server] [--users 4]
+        [--iterations 25] [--products 500] [--orders 200]
+        [--save benchmarks/baselines/flows-client.json]
+        [--baseline benchmarks/baselines/flows-client.json]
+    python -m benchmarks.flows compare BASELINE ATUAL [--tolerance 0.4]
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+
+PASSWORD = 'bench'
+PERCENTILES = (50, 95, 99)
+# p99 com poucas amostras é ruído: a comparação usa só estas métricas
+COMPARED = ('p50', 'p95')
+DEFAULT_TOLERANCE = 0.4
+
+_KEY_RE = re.compile(r'name="idempotency_key" value="([0-9a-f]+)"')
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def seed(app, products, users, orders, rng):
+    """Cria o catálogo, os usuários e o histórico de pedidos; retorna (nomes, ids)."""
+    from app.utils import db
+    from app.models.models import Order, OrderItem, OrderStatus, Product, User
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Product(name=f'Vinho {i}', price=Decimal(10 + i % 90), stock=10 ** 9,
+                    description='Tinto seco ' * 10)
+            for i in range(products)
+        ])
+        usernames = [f'bench{i}' for i in range(users)]
+        for name in usernames:
+            user = User(username=name, email=f'{name}@example.com')
+            user.set_password(PASSWORD)
+            db.session.add(user)
+        db.session.commit()
+
+        product_ids = list(db.session.scalars(db.select(Product.id).order_by(Product.id)))
+        user_ids = list(db.session.scalars(db.select(User.id).order_by(User.id)))
+        for _ in range(orders):
+            order = Order(user_id=rng.choice(user_ids), status=OrderStatus.PAID.value,
+                          total_amount=Decimal('0.00'))
+            total = Decimal('0.00')
+            for pid in rng.sample(product_ids, min(3, len(product_ids))):
+                order.items.append(OrderItem(product_id=pid, quantity=1,
+                                             unit_price=Decimal('10.00')))
+                total += Decimal('10.00')
+            order.total_amount = total
+            db.session.add(order)
+        db.session.commit()
+    return usernames, product_ids
+
+
+class ClientDriver:
+    """Sessão de navegador sobre ``app.test_client()``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def request(method, path, data=None):
+            resp = client.open(path, method=method, data=data)
+            body = resp.get_data(as_text=True)
+            resp.close()
+            return resp.status_code, body
+        return request
+
+    def close(self):
+        pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # o redirect conta como a resposta do endpoint (302), não é seguido
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ServerDriver:
+    """Sessão de navegador via HTTP contra um servidor WSGI local."""
+
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True,
+                                  request_handler=QuietHandler)
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def session(self):
+        opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+        def request(method, path, data=None):
+            body = urllib.parse.urlencode(data).encode() if data is not None else None
+            req = urllib.request.Request(self.base + path, data=body, method=method)
+            try:
+                with opener.open(req) as resp:
+                    return resp.status, resp.read().decode('utf-8')
+            except urllib.error.HTTPError as exc:
+                exc.read()
+                return exc.code, ''
+        return request
+
+    def close(self):
+        self.server.shutdown()
+        self._thread.join()
+
+
+DRIVERS = {'client': ClientDriver, 'server': ServerDriver}
+
+
+def _virtual_user(request, username, product_ids, iterations, rng, record, ready):
+    def step(name, method, path, data=None, expect=(200,)):
+        started = time.perf_counter()
+        status, body = request(method, path, data)
+        record(name, time.perf_counter() - started, status in expect)
+        return body
+
+    status, _ = request('POST', '/login', {'username': username, 'password': PASSWORD})
+    if status != 302:
+        ready.abort()
+        raise RuntimeError(f'login de {username} falhou ({status})')
+    # todos começam juntos, depois dos logins (o hash da senha é lento)
+    ready.wait()
+    for _ in range(iterations):
+        pid = rng.choice(product_ids)
+        step('get_products', 'GET', '/produtos')
+        step('get_products_id', 'GET', f'/produtos/{pid}')
+        step('cart_add', 'POST', f'/carrinho/adicionar/{pid}', {'qty': 1}, expect=(302,))
+        page = step('cart_view', 'GET', '/carrinho')
+        match = _KEY_RE.search(page)
+        key = match.group(1) if match else ''
+        step('cart_update', 'POST', '/carrinho/atualizar', {f'qty_{pid}': 2}, expect=(302,))
+        step('checkout', 'POST', '/orders/checkout',
+             {f'qty_{pid}': 2, 'idempotency_key': key}, expect=(302,))
+
+
+def run(driver='client', users=4, iterations=25, products=500, orders=200, seed_value=42):
+    """Executa o teste de carga e devolve o resultado (dicionário serializável)."""
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file.name}'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # todos os usuários virtuais entram pelo mesmo IP
+    os.environ.setdefault('LOGIN_IP_RATE', '0')
+
+    from app.utils import create_app, db
+
+    app = create_app()
+    rng = random.Random(seed_value)
+    usernames, product_ids = seed(app, products, users, orders, rng)
+
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def record(name, elapsed, ok):
+        with lock:
+            timings[name].append(elapsed * 1000)
+            if not ok:
+                errors[name] += 1
+
+    runner = DRIVERS[driver](app)
+    ready = threading.Barrier(users + 1)
+    threads = [
+        threading.Thread(target=_virtual_user, args=(
+            runner.session(), name, product_ids, iterations,
+            random.Random(seed_value + i), record, ready))
+        for i, name in enumerate(usernames)
+    ]
+    for t in threads:
+        t.start()
+    ready.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    runner.close()
+
+    with app.app_context():
+        db.engine.dispose()
+    os.unlink(db_file.name)
+
+    endpoints = {}
+    for name, values in sorted(timings.items()):
+        row = {'count': len(values), 'errors': errors[name],
+               'rps': round(len(values) / wall, 2)}
+        for pct in PERCENTILES:
+            row[f'p{pct}'] = round(_percentile(values, pct), 3)
+        endpoints[name] = row
+    total = sum(len(values) for values in timings.values())
+    return {
+        'driver': driver,
+        'params': {'users': users, 'iterations': iterations,
+                   'products': products, 'orders': orders, 'seed': seed_value},
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'total': {'requests': total, 'errors': sum(errors.values()),
+                  'seconds': round(wall, 3), 'rps': round(total / wall, 2)},
+        'endpoints': endpoints,
+    }
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Lista de regressões do resultado ``current`` em relação à ``baseline``.
+
+    Conta como regressão: erros de HTTP, p50/p95 de um endpoint acima de
+    ``(1 + tolerance)`` vezes a baseline, ou vazão total abaixo de
+    ``(1 - tolerance)`` vezes a baseline. Endpoints novos são ignorados.
+    """
+    problems = []
+    if current['total']['errors']:
+        problems.append(f"{current['total']['errors']} respostas com erro")
+    for name, base in baseline['endpoints'].items():
+        row = current['endpoints'].get(name)
+        if row is None:
+            problems.append(f'{name}: ausente no resultado atual')
+            continue
+        for metric in COMPARED:
+            if row[metric] > base[metric] * (1 + tolerance):
+                problems.append(f'{name}: {metric} {row[metric]:.2f} ms '
+                                f'(baseline {base[metric]:.2f} ms)')
+    base_rps, rps = baseline['total']['rps'], current['total']['rps']
+    if rps < base_rps * (1 - tolerance):
+        problems.append(f'vazão {rps:.1f} req/s (baseline {base_rps:.1f} req/s)')
+    return problems
+
+
+def print_report(result):
+    total = result['total']
+    print(f"driver={result['driver']} {total['requests']} requisições em "
+          f"{total['seconds']:.2f} s ({total['rps']:.1f} req/s, {total['errors']} erros)")
+    print(f"{'endpoint':>16} {'n':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'erros':>6}")
+    for name, row in result['endpoints'].items():
+        print(f"{name:>16} {row['count']:>6} {row['rps']:>8.1f} {row['p50']:>8.2f} "
+              f"{row['p95']:>8.2f} {row['p99']:>8.2f} {row['errors']:>6}")
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def _report_comparison(baseline, current, tolerance):
+    problems = compare(baseline, current, tolerance)
+    for problem in problems:
+        print(f'REGRESSÃO {problem}')
+    if not problems:
+        print(f'sem regressões (tolerância {tolerance:.0%})')
+    return 1 if problems else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='executa o teste de carga')
+    run_parser.add_argument('--driver', choices=sorted(DRIVERS), default='client')
+    run_parser.add_argument('--users', type=int, default=4)
+    run_parser.add_argument('--iterations', type=int, default=25)
+    run_parser.add_argument('--products', type=int, default=500)
+    run_parser.add_argument('--orders', type=int, default=200)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--save', help='grava o resultado neste arquivo JSON')
+    run_parser.add_argument('--baseline', help='compara com esta baseline ao final')
+    run_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+
+    compare_parser = commands.add_parser('compare', help='compara dois resultados')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        return _report_comparison(_load(args.baseline), _load(args.current), args.tolerance)
+
+    result = run(args.driver, args.users, args.iterations, args.products,
+                 args.orders, args.seed)
+    print_report(result)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as fh:
+            json.dump(result, fh, indent=2, ensure_ascii=False)
+            fh.write('\n')
+    if args.baseline:
+        return _report_comparison(_load(args.baseline), result, args.tolerance)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
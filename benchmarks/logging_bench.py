@@ -0,0 +1,103 @@
+"""Benchmark do custo do logging na página do catálogo (``/produtos``).
+
+Modos:
+
+- ``off``: ``LOG_LEVEL=INFO``; o evento ``catalog.page`` (DEBUG) nem é criado;
+- ``queue``: ``LOG_LEVEL=DEBUG`` com o QueueHandler da aplicação;
+- ``sampled``: como ``queue``, mas mantendo 1% dos eventos ``catalog.page``;
+- ``sync``: ``LOG_LEVEL=DEBUG`` escrevendo direto no arquivo, sem fila
+  (o que a requisição pagaria sem o QueueListener).
+
+Em todos os modos a saída vai para um arquivo temporário.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.logging_bench [--requests 500] [--products 1000] [--limit 100]
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+MODES = ('off', 'queue', 'sampled', 'sync')
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(mode, requests, products, limit):
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    log_file = tempfile.NamedTemporaryFile('w', suffix='.log', delete=False)
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file.name}'
+    os.environ['PRODUCT_CACHE_BACKEND'] = 'null'
+
+    from app.utils import create_app, db
+    from app.models.models import Product, User
+    from app.services.logging_config import (
+        JSONFormatter, ROOT_LOGGER, init_logging, shutdown_logging)
+
+    app = create_app()
+    app.config['LOG_LEVEL'] = 'INFO' if mode == 'off' else 'DEBUG'
+    app.config['LOG_SAMPLING'] = {'catalog.page': 0.01} if mode == 'sampled' else {}
+    init_logging(app, stream=log_file)
+    if mode == 'sync':
+        shutdown_logging()
+        handler = logging.StreamHandler(log_file)
+        handler.setFormatter(JSONFormatter())
+        logging.getLogger(ROOT_LOGGER).addHandler(handler)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Product(name=f'Vinho {i}', price=10 + i, stock=5,
+                                    description='Tinto seco ' * 20)
+                            for i in range(products)])
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+    client.get('/produtos')  # aquecimento e flash do login
+
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get(f'/produtos?limit={limit}').close()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    shutdown_logging()
+    if mode == 'sync':
+        logging.getLogger(ROOT_LOGGER).removeHandler(handler)
+    log_file.close()
+    lines = sum(1 for _ in open(log_file.name))
+    with app.app_context():
+        db.engine.dispose()
+    os.unlink(db_file.name)
+    os.unlink(log_file.name)
+    return {
+        'p50': statistics.median(timings),
+        'p99': _percentile(timings, 99),
+        'lines': lines,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'modo':>8} {'p50 ms':>8} {'p99 ms':>8} {'linhas':>7}")
+    for mode in MODES:
+        row = run(mode, args.requests, args.products, args.limit)
+        print(f"{mode:>8} {row['p50']:>8.2f} {row['p99']:>8.2f} {row['lines']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark da busca de produtos (FTS5 e índice em memória).
+
+Popula N produtos com nomes/descrições sintéticos em português e mede a
+latência (p50/p95/p99) de um conjunto de buscas em cada backend.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.search_bench [--products 100000] [--rounds 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+WORDS = ['vinho', 'tinto', 'branco', 'rosé', 'espumante', 'português', 'chileno',
+         'argentino', 'seco', 'suave', 'reserva', 'safra', 'uva', 'malbec',
+         'cabernet', 'merlot', 'carménère', 'tannat', 'licoroso', 'frutado',
+         'encorpado', 'cítrico', 'madeira', 'porto', 'verde', 'douro', 'alentejo']
+QUERIES = ['malbec reserva', 'portugues', 'vinho tinto seco', 'carmen', 'douro',
+           'espumantes', 'cabernet safra', 'zzz inexistente', 'alentejo frutado', 'uva']
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(products, rounds):
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file.name}'
+
+    from sqlalchemy import insert
+    from app.utils import create_app, db
+    from app.models.models import Product
+    from app.services.search import get_search_backend, rebuild_index, search_products
+
+    app = create_app()
+    rng = random.Random(42)
+    results = {}
+    with app.app_context():
+        db.create_all()
+        rows = [{'name': ' '.join(rng.sample(WORDS, 3)).title() + f' {i}',
+                 'description': ' '.join(rng.sample(WORDS, 8)),
+                 'price': rng.uniform(20, 500), 'stock': rng.randint(0, 50)}
+                for i in range(products)]
+        for start in range(0, products, 10000):
+            db.session.execute(insert(Product), rows[start:start + 10000])
+        db.session.commit()
+
+        for backend in ('fts5', 'memory'):
+            app.config['SEARCH_BACKEND'] = backend
+            app.extensions['search']['backend'] = None
+            started = time.perf_counter()
+            rebuild_index()
+            db.session.commit()
+            build = time.perf_counter() - started
+
+            search_products(QUERIES[0])  # aquecimento
+            timings = []
+            for _ in range(rounds):
+                for query in QUERIES:
+                    t0 = time.perf_counter()
+                    search_products(query)
+                    timings.append((time.perf_counter() - t0) * 1000)
+            results[get_search_backend().name] = {
+                'build_s': build,
+                'p50': statistics.median(timings),
+                'p95': _percentile(timings, 95),
+                'p99': _percentile(timings, 99),
+            }
+    os.unlink(db_file.name)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'índice (s)':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, row in run(args.products, args.rounds).items():
+        print(f"{name:>8} {row['build_s']:>10.2f} {row['p50']:>8.2f} "
+              f"{row['p95']:>8.2f} {row['p99']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark da renovação de sessão na página do catálogo.
+
+Compara o modo antigo (``SESSION_REFRESH_MODE=always``, sessão reescrita em
+toda requisição) com a expiração deslizante (``sliding``): requisições por
+segundo em ``/`` e quantas respostas trazem Set-Cookie, incluindo os
+arquivos estáticos.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.session_bench [--requests 500] [--products 50]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def run(mode, requests, products):
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_file.name}'
+    os.environ['SESSION_REFRESH_MODE'] = mode
+
+    from app.utils import create_app, db
+    from app.models.models import Product, User
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Product(name=f'Vinho {i}', price=10 + i, stock=5)
+                            for i in range(products)])
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+    client.get('/')  # consome o flash do login
+
+    result = {'mode': mode}
+    for name, path in (('catalogo', '/'), ('static', '/static/style.css')):
+        cookies = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            resp = client.get(path)
+            cookies += 'Set-Cookie' in resp.headers
+            resp.close()
+        elapsed = time.perf_counter() - started
+        result[name] = {'rps': requests / elapsed, 'set_cookie': cookies}
+
+    with app.app_context():
+        db.engine.dispose()
+    os.unlink(db_file.name)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--products', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'modo':>8} {'rota':>9} {'req/s':>9} {'Set-Cookie':>11}")
+    for mode in ('always', 'sliding'):
+        result = run(mode, args.requests, args.products)
+        for name in ('catalogo', 'static'):
+            row = result[name]
+            print(f"{mode:>8} {name:>9} {row['rps']:>9.1f} "
+                  f"{row['set_cookie']:>5}/{args.requests}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Tempo de inicialização da aplicação, por fase, em processos novos.
+
+Para cada modo (``STARTUP_MODE``) o boot é repetido ``--runs`` vezes num
+interpretador novo, medindo:
+
+- ``import``: importação de ``app.utils`` e ``app.services.startup``;
+- ``create_app``: criação da aplicação (extensões, blueprints e o resto das
+  importações);
+- ``prepare``: ``prepare_database`` (``create_all`` ou conferência das migrações);
+- ``preload``: compilação dos templates e módulos adiados (só em produção);
+- ``first_request``: primeira requisição a ``/`` pelo ``test_client``.
+
+O banco é um SQLite temporário já criado e marcado na última migração.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.startup_bench [--runs 5] [--products 50]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+MODES = ('development', 'production')
+PHASES = ('import', 'create_app', 'prepare', 'preload', 'first_request')
+
+_CHILD = r"""
+import json, time
+started = time.perf_counter()
+timings = {}
+from app.utils import create_app
+from app.services.startup import preload, prepare_database
+now = time.perf_counter(); timings['import'] = now - started; mark = now
+app = create_app()
+now = time.perf_counter(); timings['create_app'] = now - mark; mark = now
+prepare_database(app)
+now = time.perf_counter(); timings['prepare'] = now - mark; mark = now
+if app.config['STARTUP_MODE'] == 'production':
+    preload(app)
+now = time.perf_counter(); timings['preload'] = now - mark; mark = now
+status = app.test_client().get('/').status_code
+now = time.perf_counter(); timings['first_request'] = now - mark
+assert status == 200, status
+print(json.dumps(timings))
+"""
+
+
+def _prepare_db(path, products):
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    from sqlalchemy import text
+
+    from app.utils import create_app, db
+    from app.models.models import Product
+    from app.services.startup import migration_heads
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Product(name=f'Vinho {i}', price=10 + i, stock=5)
+                            for i in range(products)])
+        db.session.execute(text('CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)'))
+        for head in migration_heads():
+            db.session.execute(text('INSERT INTO alembic_version VALUES (:v)'), {'v': head})
+        db.session.commit()
+        db.engine.dispose()
+
+
+def run(mode, runs, db_path):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', STARTUP_MODE=mode,
+               LOG_LEVEL='WARNING', FLASK_SKIP_DOTENV='1')
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', _CHILD], env=env, check=True,
+                             capture_output=True, text=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    row = {phase: statistics.median(s[phase] for s in samples) * 1000 for phase in PHASES}
+    row['total'] = statistics.median(sum(s.values()) for s in samples) * 1000
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--products', type=int, default=50)
+    args = parser.parse_args()
+
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    db_file.close()
+    try:
+        _prepare_db(db_file.name, args.products)
+        header = ''.join(f'{phase:>15}' for phase in PHASES + ('total',))
+        print(f"{'modo (ms)':>12}{header}")
+        for mode in MODES:
+            row = run(mode, args.runs, db_file.name)
+            print(f'{mode:>12}' + ''.join(f'{row[p]:>15.1f}' for p in PHASES + ('total',)))
+    finally:
+        os.unlink(db_file.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""add cart_items (carrinho no servidor)
+
+Revision ID: 5b8e2f4c1a7d
+Revises: 113f867f86d5
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5b8e2f4c1a7d"
+down_revision = "113f867f86d5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "cart_items",
+        sa.Column("cart_id", sa.String(length=64), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("cart_id", "product_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("cart_items")
@@ -0,0 +1,34 @@
+"""add indexes for catalog, order history and reporting queries
+
+Revision ID: 9c3d7a1e5f20
+Revises: 5b8e2f4c1a7d
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9c3d7a1e5f20"
+down_revision = "5b8e2f4c1a7d"
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    # catálogo: paginação por (name, id), prefixo do nome e faixa de preço
+    ("ix_produtos_name_id", "produtos", ["name", "id"]),
+    ("ix_produtos_price", "produtos", ["price"]),
+    # histórico de pedidos do usuário e relatórios por status/período
+    ("ix_orders_user_id_created_at", "orders", ["user_id", "created_at"]),
+    ("ix_orders_status_created_at", "orders", ["status", "created_at"]),
+    # itens do pedido e vendas por produto
+    ("ix_order_items_order_id", "order_items", ["order_id"]),
+    ("ix_order_items_product_id_order_id", "order_items", ["product_id", "order_id"]),
+)
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
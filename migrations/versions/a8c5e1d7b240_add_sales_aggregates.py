@@ -0,0 +1,57 @@
+"""add agregados de vendas (sales_daily, sales_daily_product, product_sales)
+
+Revision ID: a8c5e1d7b240
+Revises: f3b9d2a6c184
+
+Depois de aplicar, preencha com o histórico: ``flask reports rebuild``.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "a8c5e1d7b240"
+down_revision = "f3b9d2a6c184"
+branch_labels = None
+depends_on = None
+
+
+def _counters():
+    return [
+        sa.Column("order_count", sa.Integer(), nullable=False),
+        sa.Column("units", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Numeric(precision=12, scale=2), nullable=False),
+    ]
+
+
+def upgrade():
+    op.create_table(
+        "sales_daily",
+        sa.Column("day", sa.Date(), nullable=False),
+        *_counters(),
+        sa.PrimaryKeyConstraint("day"),
+    )
+    op.create_table(
+        "sales_daily_product",
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        *_counters(),
+        sa.PrimaryKeyConstraint("day", "product_id"),
+    )
+    op.create_table(
+        "product_sales",
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        *_counters(),
+        sa.PrimaryKeyConstraint("product_id"),
+    )
+    op.create_index("ix_product_sales_units", "product_sales", ["units"])
+    op.create_index("ix_product_sales_revenue", "product_sales", ["revenue"])
+    op.create_index("ix_produtos_stock", "produtos", ["stock"])
+
+
+def downgrade():
+    op.drop_index("ix_produtos_stock", table_name="produtos")
+    op.drop_index("ix_product_sales_revenue", table_name="product_sales")
+    op.drop_index("ix_product_sales_units", table_name="product_sales")
+    op.drop_table("product_sales")
+    op.drop_table("sales_daily_product")
+    op.drop_table("sales_daily")
@@ -0,0 +1,23 @@
+"""add checkout_jobs.claim_token (token da tentativa que processa o job)
+
+Revision ID: b6e1f4c8d293
+Revises: c4d7a2e9f015
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b6e1f4c8d293"
+down_revision = "c4d7a2e9f015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("checkout_jobs") as batch:
+        batch.add_column(sa.Column("claim_token", sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("checkout_jobs") as batch:
+        batch.drop_column("claim_token")
@@ -0,0 +1,33 @@
+"""add stock_reservations (reservas de estoque dos carrinhos)
+
+Revision ID: c4d7a2e9f015
+Revises: a8c5e1d7b240
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "c4d7a2e9f015"
+down_revision = "a8c5e1d7b240"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "stock_reservations",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id", "product_id"),
+    )
+    op.create_index("ix_stock_reservations_product_expires", "stock_reservations",
+                    ["product_id", "expires_at", "quantity"])
+    op.create_index("ix_stock_reservations_expires_at", "stock_reservations", ["expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_stock_reservations_expires_at", table_name="stock_reservations")
+    op.drop_index("ix_stock_reservations_product_expires", table_name="stock_reservations")
+    op.drop_table("stock_reservations")
@@ -0,0 +1,33 @@
+"""add produtos_fts (busca FTS5, apenas SQLite)
+
+Revision ID: d41f6b8e2c93
+Revises: 9c3d7a1e5f20
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d41f6b8e2c93"
+down_revision = "9c3d7a1e5f20"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # em outros bancos a busca usa o índice em memória (SEARCH_BACKEND=memory)
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS produtos_fts USING fts5("
+        "name, description, tokenize = 'unicode61 remove_diacritics 2', "
+        "prefix = '2 3 4 5 6')"
+    )
+    op.execute(
+        "INSERT INTO produtos_fts (rowid, name, description) "
+        "SELECT id, name, coalesce(description, '') FROM produtos"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("DROP TABLE IF EXISTS produtos_fts")
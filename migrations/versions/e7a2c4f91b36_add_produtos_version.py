@@ -0,0 +1,26 @@
+"""add produtos.version e produtos.updated_at (cache de fragmentos)
+
+Revision ID: e7a2c4f91b36
+Revises: d41f6b8e2c93
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "e7a2c4f91b36"
+down_revision = "d41f6b8e2c93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("produtos") as batch_op:
+        batch_op.add_column(sa.Column("version", sa.Integer(), nullable=False,
+                                      server_default="1"))
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("produtos") as batch_op:
+        batch_op.drop_column("updated_at")
+        batch_op.drop_column("version")
@@ -0,0 +1,48 @@
+"""add orders.idempotency_key/warnings e checkout_jobs
+
+Revision ID: f3b9d2a6c184
+Revises: e7a2c4f91b36
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "f3b9d2a6c184"
+down_revision = "e7a2c4f91b36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.add_column(sa.Column("idempotency_key", sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column("warnings", sa.Text(), nullable=True))
+        batch_op.create_unique_constraint(
+            "uq_orders_user_id_idempotency_key", ["user_id", "idempotency_key"])
+
+    op.create_table(
+        "checkout_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("order_id", sa.Integer(), nullable=False),
+        sa.Column("cart", sa.Text(), nullable=False),
+        sa.Column("allow_partial", sa.Boolean(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["order_id"], ["orders.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("order_id"),
+    )
+    op.create_index("ix_checkout_jobs_status_updated_at", "checkout_jobs",
+                    ["status", "updated_at"])
+
+
+def downgrade():
+    op.drop_index("ix_checkout_jobs_status_updated_at", table_name="checkout_jobs")
+    op.drop_table("checkout_jobs")
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.drop_constraint("uq_orders_user_id_idempotency_key", type_="unique")
+        batch_op.drop_column("warnings")
+        batch_op.drop_column("idempotency_key")
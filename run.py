@@ -1,10 +1,14 @@
-from app.utils import create_app, db
-from app.models.models import User
+from app.utils import create_app
+from app.services.startup import preload, prepare_database
 
-app = create_app()
+# os processos do pool de hash de senha (multiprocessing "spawn") reimportam
+# o script principal como __mp_main__: neles não se cria app nem se toca no banco
+if __name__ != '__mp_main__':
+    app = create_app()
+    prepare_database(app)
 
-with app.app_context():
-    db.create_all()
+    if app.config['STARTUP_MODE'] == 'production':
+        preload(app)
 
 if __name__ == '__main__':
     app.run(debug=True)
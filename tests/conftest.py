@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.utils import create_app, db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # create_app resolve os templates a partir do diretório atual
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv('DATABASE_URL', os.getenv(
+        'TEST_DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}"))
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
@@ -0,0 +1,59 @@
+"""Funções compartilhadas pelos módulos de teste."""
+from sqlalchemy import event
+
+from app.utils import db
+from app.models.models import Product, User
+
+
+def seed(app, stock):
+    """Cria o usuário ``cliente``/``senha`` e o produto 'Vinho Tinto' (R$ 50)."""
+    with app.app_context():
+        user = User(username='cliente', email='cliente@example.com')
+        user.set_password('senha')
+        product = Product(name='Vinho Tinto', price=50.0, stock=stock)
+        db.session.add_all([user, product])
+        db.session.commit()
+        return user.id, product.id
+
+
+def add_user(app, username):
+    with app.app_context():
+        user = User(username=username, email=f'{username}@example.com')
+        user.set_password('senha')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def stock(app, product_id):
+    with app.app_context():
+        return db.session.get(Product, product_id).stock
+
+
+def token(client, username='cliente'):
+    resp = client.post('/api/auth/token', json={'username': username, 'password': 'senha'})
+    assert resp.status_code == 200
+    return {'Authorization': f"Bearer {resp.get_json()['access_token']}"}
+
+
+def login(client, username='cliente'):
+    resp = client.post('/login', data={'username': username, 'password': 'senha'})
+    assert resp.status_code == 302
+
+
+class QueryCounter:
+    """Conta os comandos SQL executados no engine dentro do ``with``."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
@@ -0,0 +1,278 @@
+import io
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from app.utils import db
+from app.models.models import Order, Product, User
+from app.services.order_service import finalize_order
+from tests.helpers import seed, token
+
+
+@pytest.fixture
+def api(app):
+    """Cliente da API com token do ``cliente`` e o id do 'Vinho Tinto' (5 em estoque)."""
+    _, pid = seed(app, stock=5)
+    client = app.test_client()
+    return client, token(client), pid
+
+
+def test_api_requires_jwt(app):
+    seed(app, stock=1)
+    client = app.test_client()
+    assert client.get('/api/produtos').status_code == 401
+    assert client.post('/api/auth/token', json={
+        'username': 'cliente', 'password': 'errada'}).status_code == 401
+
+
+def test_api_creates_and_lists_products_without_a_session_cookie(api):
+    client, headers, _ = api
+    resp = client.post('/api/produtos', headers=headers,
+                       json={'name': 'Espumante', 'price': 80.0, 'stock': 4})
+    assert resp.status_code == 201
+    assert 'Set-Cookie' not in resp.headers
+    resp = client.get('/api/produtos?order=name', headers=headers)
+    assert [p['name'] for p in resp.get_json()['items']] == ['Espumante', 'Vinho Tinto']
+    assert 'Set-Cookie' not in resp.headers
+
+
+def test_api_partial_update_keeps_other_fields(api):
+    client, headers, pid = api
+    resp = client.put(f'/api/produtos/{pid}', headers=headers, json={'price': 75.0})
+    assert resp.get_json()['price'] == 75.0
+    product = client.get(f'/api/produtos/{pid}', headers=headers).get_json()
+    assert (product['name'], product['price']) == ('Vinho Tinto', 75.0)
+
+
+@pytest.mark.parametrize('bad', [{'price': 'abc'}, {'price': -5, 'name': ''}, {'stock': 'x'}])
+def test_api_update_rejects_invalid_data(api, bad):
+    client, headers, pid = api
+    assert client.put(f'/api/produtos/{pid}', headers=headers, json=bad).status_code == 400
+    assert client.get(f'/api/produtos/{pid}', headers=headers).get_json()['price'] == 50.0
+
+
+def test_api_update_of_unknown_product_is_404(api):
+    client, headers, _ = api
+    assert client.put('/api/produtos/9999', headers=headers,
+                      json={'price': 1.0}).status_code == 404
+
+
+def test_api_delete_product(api):
+    client, headers, pid = api
+    assert client.delete(f'/api/produtos/{pid}', headers=headers).status_code == 204
+    assert client.get(f'/api/produtos/{pid}', headers=headers).status_code == 404
+
+
+def test_api_export_streams_ndjson(app):
+    seed(app, stock=1)
+    with app.app_context():
+        db.session.add_all([Product(name=f'Vinho {i}', price=10.0 + i, stock=i)
+                            for i in range(2500)])
+        db.session.commit()
+    client = app.test_client()
+    resp = client.get('/api/produtos/export', headers=token(client))
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert resp.mimetype == 'application/x-ndjson'
+    lines = resp.get_data(as_text=True).splitlines()
+    assert len(lines) == 2501
+    assert json.loads(lines[-1])['name'] == 'Vinho 2499'
+
+
+def test_api_create_and_get_order(api):
+    client, headers, pid = api
+    resp = client.post('/api/orders', headers=headers,
+                       json={'items': [{'product_id': pid, 'quantity': 2}]})
+    assert resp.status_code == 201
+    order = resp.get_json()['order']
+    assert order['total_amount'] == '100.00'
+
+    resp = client.get(f"/api/orders/{order['id']}", headers=headers)
+    assert resp.get_json()['items'] == [
+        {'product_id': pid, 'quantity': 2, 'unit_price': '50.00'}]
+
+
+@pytest.mark.parametrize('items', [
+    'abc',
+    [{'product_id': 1, 'quantity': 0}],
+    [{'product_id': 1, 'quantity': -3}],
+    [{'product_id': 1}],
+    [],
+])
+def test_api_order_rejects_invalid_items(app, api, items):
+    client, headers, _ = api
+    resp = client.post('/api/orders', headers=headers, json={'items': items})
+    assert resp.status_code == 400
+    assert len(resp.get_json()['error']) > 5
+    with app.app_context():
+        assert Order.query.count() == 0
+
+
+@pytest.fixture
+def imported(app, api):
+    """Relatório da importação de um CSV com 5 linhas (2 com erro)."""
+    client, headers, _ = api
+    csv_body = (
+        "name,price,stock,description\n"
+        "Vinho Tinto,55.5,7,\n"          # atualiza o produto existente
+        "Rosé,30,2,Seco\n"
+        "Sem preço,,1,\n"
+        "Malbec,-1,1,\n"
+        "Rosé,32,3,Seco\n"               # mesmo nome no lote: um só produto
+    )
+    resp = client.post('/api/produtos/import', headers=headers,
+                       data=csv_body, content_type='text/csv')
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_api_import_reports_counts_and_row_errors(imported):
+    assert imported['rows'] == 5
+    assert (imported['created'], imported['updated'], imported['error_count']) == (1, 1, 2)
+    assert [e['row'] for e in imported['errors']] == [4, 5]
+    assert imported['rows_per_second'] > 0
+
+
+def test_api_import_upserts_by_name(app, imported):
+    with app.app_context():
+        products = {p.name: p for p in Product.query}
+    assert (products['Vinho Tinto'].price, products['Vinho Tinto'].stock) == (55.5, 7)
+    assert products['Rosé'].price == 32.0
+    assert len(products) == 2
+
+
+def test_api_import_accepts_an_ndjson_upload(api):
+    client, headers, _ = api
+    ndjson = '{"name": "Vinho Tinto", "price": 33}\n{"oops"\n'
+    resp = client.post('/api/produtos/import', headers=headers,
+                       data={'file': (io.BytesIO(ndjson.encode()), 'lote.ndjson')},
+                       content_type='multipart/form-data')
+    report = resp.get_json()
+    assert (report['updated'], report['error_count']) == (1, 1)
+
+
+def test_api_creates_products_after_importing_explicit_ids(api):
+    client, headers, _ = api
+    resp = client.post('/api/produtos/import', headers=headers,
+                       data='id,name,price\n40,Merlot,20\n', content_type='text/csv')
+    assert resp.get_json()['created'] == 1
+    resp = client.post('/api/produtos', headers=headers,
+                       json={'name': 'Espumante', 'price': 80.0, 'stock': 4})
+    assert resp.status_code == 201 and resp.get_json()['id'] == 41
+
+
+def test_api_order_history_pages_newest_first(app):
+    user_id, pid = seed(app, stock=1000)
+    with app.app_context():
+        for i in range(30):
+            finalize_order(SimpleNamespace(id=user_id), {pid: 1 + i % 4})
+    client = app.test_client()
+    headers = token(client)
+
+    resp = client.get('/api/orders?limit=20', headers=headers).get_json()
+    assert len(resp['items']) == 20
+    assert resp['items'][0]['item_count'] == 2  # 30º pedido: 1 + 29 % 4
+    rest = client.get(f"/api/orders?cursor={resp['next_cursor']}",
+                      headers=headers).get_json()
+    assert rest['next_cursor'] is None
+    ids = [o['id'] for o in resp['items'] + rest['items']]
+    assert ids == sorted(ids, reverse=True) and len(set(ids)) == 30
+
+
+@pytest.fixture
+def sales(app):
+    """Duas vendas (4 Tinto + 1 Branco) e um pedido cancelado."""
+    user_id, pid = seed(app, stock=20)
+    user = SimpleNamespace(id=user_id)
+    with app.app_context():
+        other = Product(name='Vinho Branco', price=30.0, stock=2)
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+        finalize_order(user, {pid: 3, other_id: 1})
+        finalize_order(user, {pid: 1})
+        # pendente/cancelado não conta como venda
+        db.session.add(Order(user_id=user_id, status='cancelled', total_amount=0))
+        db.session.commit()
+    client = app.test_client()
+    headers = token(client)
+
+    def report(path):
+        statements = []
+
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            try:
+                resp = client.get(path, headers=headers)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture)
+        assert resp.status_code == 200
+        # os relatórios leem só os agregados, nunca os pedidos
+        assert not any('order_items' in s or 'FROM orders' in s for s in statements)
+        return resp
+
+    return SimpleNamespace(report=report, client=client, headers=headers, pid=pid,
+                           other_id=other_id, today=datetime.utcnow().date().isoformat())
+
+
+def test_daily_sales_report(sales):
+    daily = sales.report('/api/reports/sales/daily').get_json()
+    assert daily['items'] == [{'day': sales.today, 'order_count': 2, 'units': 5,
+                               'revenue': '230.00'}]
+    assert daily['revenue'] == '230.00'
+
+
+def test_top_products_and_low_stock_reports(sales):
+    top = sales.report('/api/reports/top-products?by=revenue').get_json()['items']
+    assert [(row['name'], row['units'], row['revenue']) for row in top] == [
+        ('Vinho Tinto', 4, '200.00'), ('Vinho Branco', 1, '30.00')]
+    low = sales.report('/api/reports/low-stock?threshold=5').get_json()['items']
+    assert low == [{'product_id': sales.other_id, 'name': 'Vinho Branco', 'stock': 1}]
+
+
+def test_product_sales_report_as_csv(sales):
+    resp = sales.report(
+        f'/api/reports/sales/products?start={sales.today}&end={sales.today}&format=csv')
+    assert resp.mimetype == 'text/csv'
+    assert resp.get_data(as_text=True).splitlines() == [
+        'day,product_id,name,order_count,units,revenue',
+        f'{sales.today},{sales.pid},Vinho Tinto,2,4,200.00',
+        f'{sales.today},{sales.other_id},Vinho Branco,1,1,30.00',
+    ]
+
+
+def test_report_rejects_a_range_too_long(sales):
+    assert sales.client.get('/api/reports/sales/daily?start=2020-01-01',
+                            headers=sales.headers).status_code == 400
+
+
+def test_rebuilt_aggregates_match_the_incremental_ones(app, sales):
+    from app.services.reporting import rebuild_aggregates
+
+    daily = sales.report('/api/reports/sales/daily').get_json()['items']
+    top = sales.report('/api/reports/top-products?by=revenue').get_json()['items']
+    with app.app_context():
+        assert rebuild_aggregates() == {'sales_daily': 1, 'sales_daily_product': 2,
+                                        'product_sales': 2}
+    assert sales.report('/api/reports/sales/daily').get_json()['items'] == daily
+    assert sales.report('/api/reports/top-products?by=revenue').get_json()['items'] == top
+
+
+@pytest.mark.parametrize('mode', ['sync', 'queue'])
+def test_api_order_with_a_token_for_a_deleted_user_is_401(app, api, mode):
+    client, headers, pid = api
+    app.config['CHECKOUT_MODE'] = mode
+    with app.app_context():
+        db.session.delete(User.query.filter_by(username='cliente').one())
+        db.session.commit()
+    resp = client.post('/api/orders', headers=headers,
+                       json={'items': [{'product_id': pid, 'quantity': 1}]})
+    assert resp.status_code == 401 and resp.get_json()['error']
+    with app.app_context():
+        assert Order.query.count() == 0
@@ -0,0 +1,120 @@
+import io
+import os
+import re
+
+import pytest
+
+from app.models.models import Product
+from app.services.assets import precompress
+from tests.helpers import login, seed
+
+
+@pytest.fixture
+def uploads(app, tmp_path):
+    """Pipeline de imagens gravando em ``tmp_path`` e um cliente logado."""
+    from app.services.image_pipeline import init_image_pipeline
+
+    app.static_folder = str(tmp_path)
+    init_image_pipeline(app)
+    seed(app, stock=1)
+    client = app.test_client()
+    login(client)
+    return client, tmp_path / 'uploads'
+
+
+def _jpeg():
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new('RGB', (800, 600), 'darkred').save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+def _upload(client, name, data):
+    resp = client.post('/produtos/novo', content_type='multipart/form-data', data={
+        'name': name, 'price': '10', 'stock': '1',
+        'image': (io.BytesIO(data), 'garrafa.jpg')})
+    assert resp.status_code == 302
+
+
+def test_same_image_is_stored_once(app, uploads):
+    from app.services.image_pipeline import get_image_pipeline
+
+    client, folder = uploads
+    data = _jpeg()
+    _upload(client, 'Malbec', data)
+    _upload(client, 'Malbec 2', data)
+    with app.app_context():
+        get_image_pipeline().wait()
+        assert len({p.image for p in Product.query if p.image}) == 1
+    assert len(list(folder.glob('*.jpg'))) == 1
+    assert len(list(folder.glob('*-320.webp'))) == 1
+
+
+def test_catalog_lists_variants_once_they_exist(app, uploads):
+    from app.services.image_pipeline import get_image_pipeline
+
+    client, _ = uploads
+    _upload(client, 'Malbec', _jpeg())
+    with app.app_context():
+        get_image_pipeline().wait()
+    html = client.get('/produtos').get_data(as_text=True)
+    assert 'type="image/webp"' in html
+    assert '-160.webp 160w' in html
+
+
+@pytest.fixture
+def style(app, tmp_path):
+    """``style.css`` em ``tmp_path`` e a URL com a impressão digital dele."""
+    (tmp_path / 'style.css').write_text('body { color: #333; }\n' * 50)
+    app.static_folder = str(tmp_path)
+    seed(app, stock=1)
+    client = app.test_client()
+    login(client)
+    html = client.get('/produtos').get_data(as_text=True)
+    url = re.search(r'href="(/assets/[0-9a-f]+/style\.css)"', html).group(1)
+    return client, url, tmp_path
+
+
+def test_fingerprinted_asset_is_immutable_and_revalidates(style):
+    client, url, _ = style
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert 'immutable' in resp.headers['Cache-Control']
+    assert 'Set-Cookie' not in resp.headers
+    assert client.get(url, headers={'If-None-Match': resp.headers['ETag']}).status_code == 304
+
+
+def test_precompressed_asset_is_served_to_clients_that_accept_it(style):
+    client, url, folder = style
+    assert precompress(str(folder)) >= 1
+    resp = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    assert len(resp.data) < len((folder / 'style.css').read_bytes())
+
+
+def test_stale_fingerprint_is_no_longer_immutable(style):
+    client, url, folder = style
+    (folder / 'style.css').write_text('body { color: #000; }\n')
+    assert client.get(url).headers['Cache-Control'] == 'no-cache'
+
+
+def test_catalog_grid_and_etag_change_when_variants_appear(app, uploads, monkeypatch):
+    from app.services.image_pipeline import ImagePipeline, get_image_pipeline
+
+    client, _ = uploads
+    schedule = ImagePipeline.schedule
+    monkeypatch.setattr(ImagePipeline, 'schedule', lambda self, name: None)
+    _upload(client, 'Malbec', _jpeg())
+    client.get('/produtos')  # consome o flash
+    resp = client.get('/produtos')
+    assert 'type="image/webp"' not in resp.get_data(as_text=True)
+
+    with app.app_context():
+        pipeline = get_image_pipeline()
+        for name in os.listdir(pipeline.upload_dir):
+            schedule(pipeline, name)
+        pipeline.wait()
+    resp = client.get('/produtos', headers={'If-None-Match': resp.headers['ETag']})
+    assert resp.status_code == 200 and 'type="image/webp"' in resp.get_data(as_text=True)
@@ -0,0 +1,135 @@
+import os
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.utils import db
+from app.models.models import User
+from app.services.login_guard import (
+    HashUnavailable, PasswordHasher, TokenBucketLimiter, init_login_guard)
+from tests.helpers import QueryCounter, login, seed
+
+
+def test_session_is_refreshed_only_near_expiry(app, monkeypatch):
+    import app.utils as utils
+    seed(app, stock=1)
+    client = app.test_client()
+    login(client)
+    client.get('/')  # consome o flash do login
+
+    now = time.time()
+    monkeypatch.setattr(utils.time, 'time', lambda: now)
+    assert 'Set-Cookie' not in client.get('/').headers
+    assert 'Set-Cookie' not in client.get('/static/style.css').headers
+
+    # passou da metade dos 15 minutos: a sessão é renovada uma vez
+    monkeypatch.setattr(utils.time, 'time', lambda: now + 8 * 60)
+    assert 'Set-Cookie' in client.get('/').headers
+    assert 'Set-Cookie' not in client.get('/').headers
+
+
+def test_token_bucket_refills_over_time():
+    now = [0.0]
+    bucket = TokenBucketLimiter(2, 60, clock=lambda: now[0])
+    assert [bucket.hit('a'), bucket.hit('a'), bucket.hit('b')] == [0, 0, 0]
+    assert bucket.hit('a') == pytest.approx(30)
+    now[0] = 30
+    assert bucket.hit('a') == 0
+
+
+@pytest.fixture
+def guarded(app):
+    """Usuário ``antigo`` com hash pbkdf2 fraco e limite de 3 logins por minuto."""
+    app.config.update(LOGIN_USER_RATE='3/60', PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0)
+    guard = init_login_guard(app)
+    with app.app_context():
+        db.session.add(User(username='antigo', email='antigo@example.com',
+                            password_hash=generate_password_hash('senha', 'pbkdf2:sha256:1000')))
+        db.session.commit()
+    client = app.test_client()
+
+    def token(password='senha'):
+        return client.post('/api/auth/token', json={'username': 'antigo', 'password': password})
+
+    return client, guard, token
+
+
+def test_login_upgrades_old_password_hashes(app, guarded):
+    _, _, token = guarded
+    assert token('errada').status_code == 401
+    assert token().status_code == 200
+    with app.app_context():
+        assert User.query.filter_by(username='antigo').one().password_hash.startswith('scrypt:')
+
+
+def test_busy_hash_pool_refuses_at_once(guarded):
+    client, guard, _ = guarded
+    guard['hasher']._slots.acquire()
+    try:
+        busy = client.post('/login', data={'username': 'antigo', 'password': 'senha'})
+    finally:
+        guard['hasher']._slots.release()
+    assert busy.status_code == 429 and busy.headers['Retry-After'] == '1'
+
+
+def test_logins_per_user_are_rate_limited(guarded):
+    _, _, token = guarded
+    for _ in range(3):
+        token('errada')
+    limited = token()
+    assert limited.status_code == 429 and int(limited.headers['Retry-After']) > 1
+
+
+def test_stuck_hash_times_out_with_503():
+    with pytest.raises(HashUnavailable) as exc:
+        PasswordHasher(workers=1, timeout=1e-6).hash('senha')
+    assert exc.value.status == 503
+
+
+def test_spawned_workers_do_not_build_the_app():
+    # os filhos do pool (spawn) reimportam run.py como __mp_main__
+    import runpy
+    assert 'app' not in runpy.run_path(os.path.join(os.path.dirname(__file__), '..', 'run.py'),
+                                       run_name='__mp_main__')
+
+
+@pytest.fixture
+def home(app):
+    """Cliente logado e uma função que conta as consultas de ``/``."""
+    user_id, _ = seed(app, stock=1)
+    client = app.test_client()
+    login(client)
+    client.get('/')  # consome o flash do login
+
+    def page_queries():
+        with app.app_context(), QueryCounter(db.engine) as counter:
+            resp = client.get('/')
+            assert resp.status_code == 200
+        return counter.count, resp.get_data(as_text=True)
+
+    page_queries()
+    return client, user_id, page_queries
+
+
+def test_cached_user_saves_queries(app, home):
+    from app.services.user_cache import init_user_cache
+
+    _, _, page_queries = home
+    cached, html = page_queries()
+    assert 'Olá, cliente!' in html
+    app.config['USER_CACHE_TTL'] = 0
+    init_user_cache(app)
+    uncached, _ = page_queries()
+    assert cached < uncached
+
+
+def test_cached_user_is_invalidated_on_change_and_logout(app, home):
+    client, user_id, page_queries = home
+    cache = app.extensions['user_cache']
+    with app.app_context():
+        db.session.get(User, user_id).username = 'cliente2'
+        db.session.commit()
+    assert 'Olá, cliente2!' in page_queries()[1]
+    client.get('/logout')
+    assert cache.get(user_id) is None
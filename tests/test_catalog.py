@@ -0,0 +1,307 @@
+import base64
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import update
+
+from app.utils import db
+from app.models.models import Product, User
+from app.models.product_models import (
+    create_product, delete_product, get_product_snapshot, update_product)
+from app.services import product_cache
+from app.services.order_service import finalize_order
+from tests.helpers import login, seed, token
+
+
+@pytest.fixture
+def catalog(app):
+    """151 produtos (o do ``seed`` + 150) e um cliente com token da API."""
+    seed(app, stock=1)
+    with app.app_context():
+        db.session.add_all([Product(name=f'Vinho {i:03d}', price=10.0 + i, stock=i % 2)
+                            for i in range(150)])
+        db.session.commit()
+    client = app.test_client()
+    return client, token(client)
+
+
+def _walk(client, headers, query):
+    ids, cursor = [], None
+    while True:
+        url = f'/api/produtos?{query}' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url, headers=headers).get_json()
+        assert len(page['items']) <= page['limit']
+        ids += [p['id'] for p in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+
+def _encoded(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def test_catalog_pages_by_id_cover_every_product_once(catalog):
+    ids = _walk(*catalog, 'limit=40')
+    assert ids == sorted(ids) and len(ids) == 151
+
+
+def test_catalog_pages_by_name_with_text_filter(catalog):
+    ids = _walk(*catalog, 'order=name&limit=7&q=Vinho%200')
+    assert len(ids) == 100 and len(set(ids)) == 100
+
+
+def test_catalog_price_and_stock_filters(app, catalog):
+    ids = _walk(*catalog, 'min_price=20&max_price=29,5&in_stock=1')
+    with app.app_context():
+        assert sorted(ids) == sorted(
+            p.id for p in Product.query.filter(Product.price.between(20, 29.5),
+                                               Product.stock > 0))
+
+
+def test_catalog_page_size_is_capped(catalog):
+    client, headers = catalog
+    assert client.get('/api/produtos?limit=100000', headers=headers).get_json()['limit'] == 100
+
+
+@pytest.mark.parametrize('query', [
+    f"cursor={_encoded([{'a': 1}])}",
+    f"cursor={_encoded(['x'])}",
+    f"order=name&cursor={_encoded(['x', {'a': 1}])}",
+    f"order=name&cursor={_encoded([1, 2])}",
+    'cursor=%%%',
+])
+def test_malformed_catalog_cursor_is_rejected(catalog, query):
+    client, headers = catalog
+    assert client.get(f'/api/produtos?{query}', headers=headers).status_code == 400
+
+
+def test_malformed_order_history_cursor_is_rejected(catalog):
+    client, headers = catalog
+    assert client.get(f"/api/orders?cursor={_encoded([1, 'x'])}",
+                      headers=headers).status_code == 400
+
+
+def test_malformed_cursor_on_html_page_falls_back_to_first_page(catalog):
+    client, _ = catalog
+    login(client)
+    assert client.get(f"/produtos?cursor={_encoded([{'a': 1}])}").status_code == 200
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(product_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_memory_cache_expires_entries_after_ttl(clock):
+    cache = product_cache.MemoryCacheBackend(max_entries=2, default_ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=0)  # 0: não expira
+    assert cache.get('a') == 1
+    clock[0] += 11
+    assert cache.get('a') is None and cache.get('b') == 2
+
+
+def test_memory_cache_evicts_least_recently_used(clock):
+    cache = product_cache.MemoryCacheBackend(max_entries=2, default_ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)  # cheio: despeja o usado há mais tempo ('b')
+    assert cache.get('b') is None and cache.get('a') == 1 and cache.get('c') == 3
+
+
+def test_memory_cache_counts_hits_misses_and_evictions(clock):
+    cache = product_cache.MemoryCacheBackend(max_entries=1, default_ttl=10)
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('x')
+    cache.set('b', 2)
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'evictions': 1, 'size': 1}
+
+
+@pytest.fixture
+def loads(app, monkeypatch):
+    """Ids lidos do banco pelo cache de produtos."""
+    loaded = []
+    monkeypatch.setattr('app.models.product_models._load_product',
+                        lambda i: loaded.append(i) or db.session.get(Product, i))
+    return loaded
+
+
+def test_product_snapshot_is_read_through(app, loads):
+    _, pid = seed(app, stock=5)
+    with app.app_context():
+        assert get_product_snapshot(pid)['stock'] == 5
+        assert get_product_snapshot(pid)['stock'] == 5
+    assert loads == [pid]
+
+
+def test_checkout_invalidates_the_cached_product(app, loads):
+    user_id, pid = seed(app, stock=5)
+    with app.app_context():
+        get_product_snapshot(pid)
+        finalize_order(SimpleNamespace(id=user_id), {pid: 2})
+        assert get_product_snapshot(pid)['stock'] == 3
+    assert loads == [pid, pid]
+
+
+def test_update_invalidates_the_cached_product(app, loads):
+    _, pid = seed(app, stock=5)
+    with app.app_context():
+        get_product_snapshot(pid)
+        update_product(pid, {'price': 55.0})
+        assert get_product_snapshot(pid)['price'] == 55.0
+    assert loads == [pid, pid]
+
+
+def test_create_and_delete_change_the_catalog_version(app):
+    with app.app_context():
+        version = product_cache.catalog_version()
+        product = create_product({'name': 'Rosé', 'price': 30})
+        assert product_cache.catalog_version() != version
+        assert get_product_snapshot(product.id)['name'] == 'Rosé'
+        version = product_cache.catalog_version()
+        delete_product(product.id)
+        assert product_cache.catalog_version() != version
+        assert get_product_snapshot(product.id) is None
+
+
+@pytest.fixture
+def browsing(app):
+    """Cliente logado com dois produtos no catálogo e o flash do login consumido."""
+    _, pid = seed(app, stock=5)
+    with app.app_context():
+        db.session.add(Product(name='Vinho Branco', price=40.0, stock=5))
+        db.session.commit()
+    client = app.test_client()
+    login(client)
+    client.get('/produtos')
+    return client, pid
+
+
+def test_catalog_page_answers_304_to_its_etag(browsing):
+    client, _ = browsing
+    resp = client.get('/produtos')
+    assert resp.headers['Last-Modified']
+    assert client.get('/produtos', headers={'If-None-Match': resp.headers['ETag']}
+                      ).status_code == 304
+
+
+def test_changed_product_rerenders_only_its_card(app, browsing):
+    from app.services.fragment_cache import get_fragment_cache
+
+    client, pid = browsing
+    etag = client.get('/produtos').headers['ETag']
+    with app.app_context():
+        update_product(pid, {'name': 'Vinho Tinto Reserva'})
+        cache = get_fragment_cache()
+        hits = cache.stats()['hits']
+    resp = client.get('/produtos', headers={'If-None-Match': etag})
+    assert resp.status_code == 200 and 'Vinho Tinto Reserva' in resp.get_data(as_text=True)
+    assert cache.stats()['hits'] == hits + 1
+
+
+def test_cart_counter_is_part_of_the_etag(browsing):
+    client, pid = browsing
+    etag = client.get('/produtos').headers['ETag']
+    client.post(f'/carrinho/adicionar/{pid}', data={'qty': 1})
+    client.get('/carrinho')  # consome o flash
+    resp = client.get('/produtos', headers={'If-None-Match': etag})
+    assert resp.status_code == 200 and 'itens no carrinho' in resp.get_data(as_text=True)
+
+
+def test_greeting_username_is_part_of_the_etag(app, browsing):
+    client, _ = browsing
+    etag = client.get('/produtos').headers['ETag']
+    with app.app_context():
+        User.query.filter_by(username='cliente').one().username = 'cliente2'
+        db.session.commit()
+    resp = client.get('/produtos', headers={'If-None-Match': etag})
+    assert resp.status_code == 200 and 'cliente2' in resp.get_data(as_text=True)
+
+
+def test_fragment_cache_evicts_by_byte_budget():
+    from app.services.fragment_cache import FragmentCache
+
+    lru = FragmentCache(max_bytes=10)
+    lru.set('a', '12345')
+    lru.set('b', '12345')
+    lru.get('a')
+    lru.set('c', '12345')
+    assert lru.get('b') is None and lru.get('a') == '12345'
+    assert lru.stats()['bytes'] <= 10 and lru.stats()['evictions'] == 1
+
+
+def test_main_queries_use_indexes(app):
+    from app.services.query_plan import check_query_plans
+    with app.app_context():
+        flagged = {r['name']: r['seq_scans'] for r in check_query_plans() if r['seq_scans']}
+    assert flagged == {}
+
+
+@pytest.fixture(params=['fts5', 'memory'])
+def search(app, request):
+    """Índice de busca (cada backend) com três vinhos."""
+    from app.services.search import get_search_backend, rebuild_index, search_products
+
+    app.config['SEARCH_BACKEND'] = request.param
+    seed(app, stock=1)
+    with app.app_context():
+        assert get_search_backend().name == request.param
+        rebuild_index()  # seed grava direto pelo ORM
+        create_product({'name': 'Vinho Verde Português', 'price': 40,
+                        'description': 'Leve e cítrico'})
+        create_product({'name': 'Espumante Brut', 'price': 60,
+                        'description': 'Ótimo com vinho do porto'})
+        yield lambda q: [p['name'] for p in search_products(q)]
+
+
+def test_search_ignores_accents_and_case(search):
+    assert search('portugues') == ['Vinho Verde Português']
+    assert search('CITRICO') == ['Vinho Verde Português']
+
+
+def test_search_matches_prefixes_and_plurals_ranking_name_over_description(search):
+    assert search('vinhos')[-1] == 'Espumante Brut'
+    assert set(search('vinh')) == {'Vinho Tinto', 'Vinho Verde Português', 'Espumante Brut'}
+    assert search('vinho verde') == ['Vinho Verde Português']
+
+
+def test_search_index_follows_updates_and_deletes(search):
+    from app.services.search import search_products
+
+    espumante = search_products('espumante')[0]['id']
+    update_product(espumante, {'name': 'Cava Reserva'})
+    assert search('espumante') == []
+    assert search('cava') == ['Cava Reserva']
+    delete_product(espumante)
+    assert search('cava') == []
+
+
+def test_search_ranks_every_match_not_only_recent_ones(search):
+    from app.services.search import rebuild_index
+
+    db.session.add_all([Product(name=f'Tinto {i}', price=10,
+                                description='vinho malbec') for i in range(2500)])
+    db.session.commit()
+    db.session.execute(update(Product).where(Product.name == 'Vinho Tinto')
+                       .values(name='Malbec Malbec', description='malbec'))
+    db.session.commit()
+    rebuild_index()
+    # o melhor documento é o mais antigo
+    assert search('malbec')[0] == 'Malbec Malbec'
+
+
+def test_rolled_back_product_leaves_no_index_entry(search):
+    from app.services.search import index_products
+
+    product = Product(name='Rosé Fantasma', price=10)
+    db.session.add(product)
+    db.session.flush()
+    index_products([product.id])
+    db.session.rollback()
+    assert search('fantasma') == []
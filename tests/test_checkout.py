@@ -0,0 +1,520 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import update
+
+from app.utils import db
+from app.models.models import Order, OrderItem, Product, StockReservation
+from app.models.product_models import update_product
+from app.services import product_cache
+from app.services.cart_pricing import price_cart
+from app.services.cart_store import get_cart_store
+from app.services.order_service import fill_order, finalize_order, reserve_stock
+from app.services.reservations import available_stock, sweep_expired
+from tests.helpers import QueryCounter, add_user, login, seed, stock, token
+
+
+def test_reserve_stock_is_conditional(app):
+    _, pid = seed(app, stock=3)
+    with app.app_context():
+        assert reserve_stock(pid, 5) == 0
+        assert reserve_stock(pid, 5, allow_partial=True) == 3
+        assert reserve_stock(pid, 1, allow_partial=True) == 0
+        db.session.commit()
+    assert stock(app, pid) == 0
+
+
+def test_concurrent_checkouts_do_not_oversell(app):
+    user_id, pid = seed(app, stock=25)
+    user = SimpleNamespace(id=user_id)
+    errors = []
+    lock = threading.Lock()
+
+    def buy(qty, allow_partial):
+        with app.app_context():
+            try:
+                finalize_order(user, {pid: qty}, allow_partial=allow_partial)
+            except ValueError:
+                return
+            except Exception as exc:  # pragma: no cover - aparece no assert
+                with lock:
+                    errors.append(exc)
+                return
+            finally:
+                db.session.remove()
+
+    threads = [
+        threading.Thread(target=buy, args=(1 + i % 3, i % 2 == 0))
+        for i in range(40)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    with app.app_context():
+        sold = sum(oi.quantity for oi in OrderItem.query.filter_by(product_id=pid))
+    remaining = stock(app, pid)
+    assert remaining >= 0
+    assert sold + remaining == 25
+    # há mais demanda (~80 unidades) do que estoque: tudo deve ser vendido
+    assert remaining == 0
+
+
+@pytest.fixture
+def shopper(app):
+    """Cliente logado e o id do 'Vinho Tinto' (5 em estoque)."""
+    _, pid = seed(app, stock=5)
+    client = app.test_client()
+    login(client)
+    return client, pid
+
+
+def test_cart_is_kept_in_the_store_not_the_cookie(app, shopper):
+    client, pid = shopper
+    client.post(f'/carrinho/adicionar/{pid}', data={'qty': 2})
+    client.post(f'/carrinho/adicionar/{pid}', data={'qty': 1})
+    client.get('/carrinho')
+    # o cookie só carrega o id do usuário (e flashes), nunca o carrinho
+    serializer = app.session_interface.get_signing_serializer(app)
+    assert 'cart' not in serializer.loads(client.get_cookie('session').value)
+    with app.app_context():
+        assert get_cart_store().items('1') == {pid: 3}
+
+
+def test_cart_update_and_checkout_empty_the_store(app, shopper):
+    client, pid = shopper
+    client.post(f'/carrinho/adicionar/{pid}', data={'qty': 1})
+    client.post('/carrinho/atualizar', data={f'qty_{pid}': 4})
+    assert b'R$ 200,00' in client.get('/carrinho').data
+
+    assert client.post('/orders/checkout').status_code == 302
+    assert stock(app, pid) == 1
+    with app.app_context():
+        assert get_cart_store().items('1') == {}
+
+
+@pytest.mark.parametrize('qty', ['abc', '0', '-4'])
+def test_cart_add_rejects_invalid_quantities(app, shopper, qty):
+    client, pid = shopper
+    resp = client.post(f'/carrinho/adicionar/{pid}', data={'qty': qty})
+    assert resp.status_code == 302
+    assert 'pelo menos 1 unidade' in client.get('/carrinho').data.decode()
+    with app.app_context():
+        assert get_cart_store().items('1') == {}
+        assert StockReservation.query.count() == 0
+
+
+@pytest.mark.parametrize('store_name', ['sql', 'memory'])
+def test_cart_store_refuses_non_positive_quantities(app, store_name):
+    from app.services.cart_store import init_cart_store
+
+    app.config['CART_STORE'] = store_name
+    with app.app_context():
+        store = init_cart_store(app)
+        store.add('1', 7, 2)
+        for qty in (0, -4):
+            with pytest.raises(ValueError):
+                store.add('1', 7, qty)
+            with pytest.raises(ValueError):
+                store.set('1', 7, qty)
+        assert store.items('1') == {7: 2}
+
+
+class FakeRedis:
+    """Subconjunto em memória dos comandos de hash do redis-py."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def hgetall(self, key):
+        return {str(k).encode(): str(v).encode() for k, v in self.data.get(key, {}).items()}
+
+    def hvals(self, key):
+        return [str(v).encode() for v in self.data.get(key, {}).values()]
+
+    def hincrby(self, key, field, amount):
+        h = self.data.setdefault(key, {})
+        h[str(field)] = int(h.get(str(field), 0)) + amount
+        return h[str(field)]
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[str(field)] = value
+
+    def hdel(self, key, field):
+        return 1 if self.data.get(key, {}).pop(str(field), None) is not None else 0
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def expire(self, key, ttl):
+        self.ttls[key] = ttl
+
+
+def test_redis_cart_store_with_fake_client():
+    from app.services.cart_store import RedisCartStore
+    store = RedisCartStore(FakeRedis(), ttl=60)
+    store.add('7', 1, 2)
+    store.add('7', 1, 3)
+    store.set('7', 2, 1)
+    assert store.items('7') == {1: 5, 2: 1}
+    assert store.count('7') == 6
+    assert store.remove('7', 2) is True
+    assert store.remove('7', 2) is False
+    store.clear('7')
+    assert store.items('7') == {}
+    assert store.client.ttls == {'cart:7': 60}
+    with pytest.raises(ValueError):
+        store.add('7', 1, -1)
+
+
+def test_checkout_queries_do_not_grow_with_cart_size(app):
+    user_id, _ = seed(app, stock=0)
+    with app.app_context():
+        products = [Product(name=f'Vinho {i}', price=10.0 + i, stock=100) for i in range(20)]
+        db.session.add_all(products)
+        db.session.commit()
+        ids = [p.id for p in products]
+
+    def checkout_queries(size):
+        with app.app_context():
+            with QueryCounter(db.engine) as counter:
+                order, _, _ = finalize_order(SimpleNamespace(id=user_id),
+                                             {pid: 2 for pid in ids[:size]})
+            assert len(order.items) == size
+            return counter.count
+
+    # carga dos produtos num IN, débito num executemany e itens num INSERT em lote
+    assert checkout_queries(1) == checkout_queries(5) == checkout_queries(20)
+    with app.app_context():
+        assert OrderItem.query.count() == 26
+        assert db.session.get(Product, ids[0]).stock == 94
+
+
+def test_order_history_page_queries_do_not_grow_with_page_size(app):
+    user_id, pid = seed(app, stock=1000)
+    with app.app_context():
+        for i in range(30):
+            finalize_order(SimpleNamespace(id=user_id), {pid: 1 + i % 4})
+    client = app.test_client()
+    login(client)
+
+    def history_queries(limit):
+        with app.app_context(), QueryCounter(db.engine) as counter:
+            assert client.get(f'/pedidos?limit={limit}').status_code == 200
+        return counter.count
+
+    history_queries(2)  # usuário logado fica no cache
+    assert history_queries(2) == history_queries(25)
+
+
+def test_order_detail_page_is_scoped_to_the_user(app):
+    user_id, pid = seed(app, stock=10)
+    with app.app_context():
+        order, _, _ = finalize_order(SimpleNamespace(id=user_id), {pid: 1})
+        order_id = order.id
+    client = app.test_client()
+    login(client)
+    resp = client.get(f'/pedidos/{order_id}')
+    assert resp.status_code == 200 and 'Vinho Tinto' in resp.get_data(as_text=True)
+    assert client.get('/pedidos/999999').status_code == 404
+
+
+def test_concurrent_checkouts_with_one_idempotency_key_make_one_order(app):
+    user_id, pid = seed(app, stock=10)
+    user = SimpleNamespace(id=user_id)
+    results = []
+
+    def buy():
+        with app.app_context():
+            try:
+                order, _, _ = finalize_order(user, {pid: 2}, idempotency_key='abc')
+                results.append(order.id)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=buy) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(results) == 5 and len(set(results)) == 1
+    assert stock(app, pid) == 8
+
+
+def test_double_submitted_checkout_form_debits_stock_once(app, shopper):
+    client, pid = shopper
+    client.post(f'/carrinho/adicionar/{pid}', data={'qty': 3})
+    form = {'idempotency_key': 'form-1', f'qty_{pid}': '3'}
+    client.post('/orders/checkout', data=form)
+    client.post('/orders/checkout', data=form)
+    assert stock(app, pid) == 2
+    with app.app_context():
+        assert Order.query.count() == 1
+
+
+def test_api_idempotency_key_replays_the_same_order(app):
+    _, pid = seed(app, stock=5)
+    client = app.test_client()
+    headers = {**token(client), 'Idempotency-Key': 'api-1'}
+    body = {'items': [{'product_id': pid, 'quantity': 1}]}
+    first = client.post('/api/orders', headers=headers, json=body).get_json()
+    again = client.post('/api/orders', headers=headers, json=body).get_json()
+    assert first == again and stock(app, pid) == 4
+
+
+@pytest.fixture
+def queued(app):
+    app.config['CHECKOUT_MODE'] = 'queue'
+    _, pid = seed(app, stock=3)
+    client = app.test_client()
+    return client, token(client), pid
+
+
+def _queue_order(client, headers, pid, quantity):
+    from app.services.checkout_queue import get_checkout_pool
+
+    resp = client.post('/api/orders', headers=headers,
+                       json={'items': [{'product_id': pid, 'quantity': quantity}]})
+    assert resp.status_code == 202
+    assert resp.get_json()['order']['status'] == 'pending'
+    get_checkout_pool().wait()
+    return client.get(resp.headers['Location'], headers=headers).get_json()
+
+
+def test_queued_checkout_is_paid_when_the_job_runs(app, queued):
+    client, headers, pid = queued
+    with app.app_context():
+        order = _queue_order(client, headers, pid, 2)
+    assert order['status'] == 'paid' and order['total_amount'] == '100.00'
+    assert order['items'][0]['quantity'] == 2
+    assert stock(app, pid) == 1
+
+
+def test_queued_checkout_without_stock_is_cancelled(app, queued):
+    client, headers, pid = queued
+    with app.app_context():
+        order = _queue_order(client, headers, pid, 5)
+    assert order['status'] == 'cancelled' and 'Estoque insuficiente' in order['error']
+    assert stock(app, pid) == 3
+
+
+def test_malformed_queued_cart_fails_the_job_instead_of_leaving_it_running(app):
+    from app.models.models import CheckoutJob
+    from app.services.checkout_queue import process_checkout_job
+
+    user_id, _ = seed(app, stock=1)
+    with app.app_context():
+        order = Order(user_id=user_id, status='pending', total_amount=0)
+        db.session.add(order)
+        db.session.flush()
+        job = CheckoutJob(order_id=order.id, cart='[{"product_id": null}]')
+        db.session.add(job)
+        db.session.commit()
+        assert process_checkout_job(job.id)
+        db.session.expire_all()
+        assert job.status == 'failed' and 'TypeError' in job.error
+        assert db.session.get(Order, order.id).status == 'cancelled'
+
+
+@pytest.fixture
+def claimed(app):
+    """Job de 2 'Vinho Tinto' (3 em estoque) já reivindicado; retorna ids e o token."""
+    from app.models.models import CheckoutJob
+    from app.services.checkout_queue import _claim_job
+
+    user_id, pid = seed(app, stock=3)
+    with app.app_context():
+        order = Order(user_id=user_id, status='pending', total_amount=0)
+        db.session.add(order)
+        db.session.flush()
+        job = CheckoutJob(order_id=order.id,
+                          cart=json.dumps([{'product_id': pid, 'quantity': 2}]))
+        db.session.add(job)
+        db.session.commit()
+        return SimpleNamespace(job_id=job.id, order_id=order.id, pid=pid,
+                               token=_claim_job(job.id))
+
+
+def _age_job(job_id, seconds):
+    from app.models.models import CheckoutJob
+
+    db.session.get(CheckoutJob, job_id).updated_at = \
+        datetime.utcnow() - timedelta(seconds=seconds)
+    db.session.commit()
+
+
+def test_running_job_with_a_live_heartbeat_is_not_requeued(app, claimed):
+    from app.services.checkout_queue import _Heartbeat, requeue_stale_jobs
+
+    with app.app_context():
+        _age_job(claimed.job_id, 60)
+        with _Heartbeat(app, claimed.job_id, claimed.token, interval=0.01):
+            time.sleep(0.2)
+        assert requeue_stale_jobs(timeout=30) == []
+        _age_job(claimed.job_id, 60)
+        assert requeue_stale_jobs(timeout=30) == [claimed.job_id]
+
+
+def test_requeued_job_is_not_completed_by_its_old_worker(app, claimed):
+    from app.models.models import CheckoutJob
+    from app.services.checkout_queue import _fill_job, process_checkout_job, requeue_stale_jobs
+
+    with app.app_context():
+        _age_job(claimed.job_id, 600)
+        assert requeue_stale_jobs(timeout=300) == [claimed.job_id]
+        assert process_checkout_job(claimed.job_id)
+        # o worker antigo ainda estava vivo e termina depois: nada é gravado de novo
+        assert _fill_job(claimed.job_id, claimed.token) == ()
+        job = db.session.get(CheckoutJob, claimed.job_id)
+        assert (job.status, job.attempts) == ('done', 2)
+        assert db.session.get(Order, claimed.order_id).status == 'paid'
+    assert stock(app, claimed.pid) == 1
+
+
+@pytest.fixture
+def two_wines(app):
+    """Cliente logado com 2 'Vinho Tinto' (1 em estoque) e 1 'Vinho Branco' no carrinho."""
+    _, tinto = seed(app, stock=1)
+    with app.app_context():
+        branco = Product(name='Vinho Branco', price=30.0, stock=10)
+        db.session.add(branco)
+        db.session.commit()
+        branco = branco.id
+    client = app.test_client()
+    login(client)
+    client.post(f'/carrinho/adicionar/{tinto}', data={'qty': 2})
+    client.post(f'/carrinho/adicionar/{branco}', data={'qty': 1})
+    return client, tinto, branco
+
+
+def test_cart_is_priced_in_one_query_then_from_the_cache(app, two_wines):
+    _, tinto, branco = two_wines
+    with app.test_request_context():
+        product_cache.get_cache().clear()
+        with QueryCounter(db.engine) as counter:
+            price_cart({tinto: 2, branco: 1})
+        assert counter.count == 1
+        with QueryCounter(db.engine) as counter:
+            assert price_cart({tinto: 2, branco: 1})['total'] == Decimal('130.00')
+        assert counter.count == 0
+
+
+def test_cart_page_warns_about_low_stock(app, two_wines):
+    client, tinto, branco = two_wines
+    with app.test_request_context():
+        cart = price_cart({tinto: 2, branco: 1})
+    assert [w['code'] for w in cart['items'][str(tinto)]['warnings']] == ['low_stock']
+    page = client.get('/carrinho').data.decode()
+    assert 'Só há 1 unidade(s)' in page and 'R$ 130,00' in page
+
+
+def _checkout_form(tinto, branco, branco_price):
+    return {f'qty_{tinto}': 2, f'qty_{branco}': 1,
+            f'price_{tinto}': '50.00', f'price_{branco}': branco_price}
+
+
+def test_checkout_with_a_changed_price_goes_back_to_the_cart(app, two_wines):
+    client, tinto, branco = two_wines
+    with app.app_context():
+        update_product(branco, {'price': 35.0})
+    resp = client.post('/orders/checkout', data=_checkout_form(tinto, branco, '30.00'))
+    assert resp.headers['Location'].endswith('/carrinho')
+    with app.app_context():
+        assert Order.query.count() == 0
+    assert 'mudou de R$ 30,00 para R$ 35,00' in client.get('/carrinho').data.decode()
+
+
+def test_checkout_prices_from_the_database_not_a_stale_cache(app, two_wines):
+    client, tinto, branco = two_wines
+    client.get('/carrinho')  # cache com o preço 30,00
+    with app.app_context():
+        # outro worker mudou o preço: o cache deste processo ainda tem 30,00
+        db.session.execute(update(Product).where(Product.id == branco).values(price=40.0))
+        db.session.commit()
+    resp = client.post('/orders/checkout', data=_checkout_form(tinto, branco, '30.00'))
+    assert resp.headers['Location'].endswith('/carrinho')
+
+    client.post('/orders/checkout', data=_checkout_form(tinto, branco, '40.00'))
+    with app.app_context():
+        # tinto reduzido a 1 + branco
+        assert Order.query.one().total_amount == Decimal('90.00')
+
+
+@pytest.fixture
+def holds(app):
+    """O cliente reservou 2 de 3 unidades; 'outro' só conseguiu reservar 1."""
+    _, pid = seed(app, stock=3)
+    other_id = add_user(app, 'outro')
+    buyer = app.test_client()
+    login(buyer)
+    buyer.post(f'/carrinho/adicionar/{pid}', data={'qty': 2})
+    late = app.test_client()
+    login(late, 'outro')
+    late.post(f'/carrinho/adicionar/{pid}', data={'qty': 2})
+    return SimpleNamespace(buyer=buyer, late=late, pid=pid, other_id=other_id)
+
+
+def _expire_holds(user_id):
+    db.session.execute(update(StockReservation)
+                       .where(StockReservation.user_id == user_id)
+                       .values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+
+
+def test_hold_is_capped_at_the_stock_left(app, holds):
+    assert 'Só 1 de 2 unidade(s)' in holds.late.get('/carrinho').data.decode()
+    with app.app_context():
+        assert available_stock([holds.pid]) == {holds.pid: 0}
+
+
+def test_cart_warns_when_other_holds_leave_too_little_stock(app, holds):
+    holds.late.get('/carrinho')  # consome o flash da reserva parcial
+    assert 'Só há 1 unidade(s)' in holds.late.get('/carrinho').data.decode()
+    # as reservas do próprio usuário continuam disponíveis para ele
+    assert 'Só há' not in holds.buyer.get('/carrinho').data.decode()
+    with app.test_request_context():
+        cart = price_cart({holds.pid: 2}, live=True, user_id=holds.other_id)
+        assert [w['code'] for w in cart['warnings']] == ['low_stock']
+        _expire_holds(holds.other_id)
+        cart = price_cart({holds.pid: 2}, live=True, user_id=1)
+        assert cart['warnings'] == []
+
+
+def test_held_stock_is_not_sold_to_other_checkouts(app, holds):
+    with app.app_context():
+        assert reserve_stock(holds.pid, 1, allow_partial=True) == 0
+        db.session.rollback()
+
+
+def test_expired_hold_stops_counting_and_is_swept(app, holds):
+    with app.app_context():
+        _expire_holds(holds.other_id)
+        assert available_stock([holds.pid]) == {holds.pid: 1}
+        assert sweep_expired(batch_size=1) == 1
+        assert StockReservation.query.count() == 1
+
+
+def test_fill_order_rejects_non_positive_quantities_before_taking_holds(app, holds):
+    with app.app_context():
+        order = Order(user_id=holds.other_id, status='pending', total_amount=0)
+        db.session.add(order)
+        with pytest.raises(ValueError):
+            fill_order(order, [{'product_id': holds.pid, 'quantity': -1}])
+        db.session.rollback()
+        assert StockReservation.query.filter_by(user_id=holds.other_id).count() == 1
+
+
+def test_checkout_turns_the_hold_into_the_order(app, holds):
+    holds.buyer.post('/orders/checkout', data={f'qty_{holds.pid}': 2})
+    with app.app_context():
+        assert OrderItem.query.one().quantity == 2
+        assert StockReservation.query.filter_by(product_id=holds.pid).count() == 1
+    assert stock(app, holds.pid) == 1
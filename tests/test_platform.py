@@ -0,0 +1,231 @@
+import io
+import json
+import logging
+import os
+import re
+
+import pytest
+from flask import jsonify
+from sqlalchemy import insert, text, update
+
+from app.utils import create_app, db
+from app.models.models import Product
+from app.models.product_models import update_product
+from tests.helpers import login, seed
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """App no perfil de produção com um primário e uma réplica SQLite."""
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setenv('DATABASE_REPLICA_URL', f"sqlite:///{tmp_path / 'replica.db'}")
+    monkeypatch.setenv('DB_PROFILE', 'production')
+    monkeypatch.setenv('DB_SQLITE_BUSY_TIMEOUT', '1234')
+    monkeypatch.setenv('PRODUCT_CACHE_BACKEND', 'null')
+    app = create_app()
+    with app.app_context():
+        replica = app.extensions['database']['replica']
+        db.create_all()
+        db.metadata.create_all(replica)
+        yield app, replica
+        db.session.rollback()
+        db.session.remove()
+        replica.dispose()
+        db.engine.dispose()
+
+
+def test_production_profile_sets_pool_and_sqlite_pragmas(replicated):
+    app, _ = replicated
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_pre_ping'] is True
+    assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+    assert db.session.execute(text('PRAGMA busy_timeout')).scalar() == 1234
+
+
+def test_catalog_reads_from_the_replica_until_the_session_writes(replicated):
+    from app.models.product_models import get_product_snapshot, list_products_page
+
+    _, replica = replicated
+    db.session.add(Product(name='No primário', price=10.0, stock=1))
+    db.session.commit()
+    with replica.begin() as conn:
+        conn.execute(insert(Product), [{'name': 'Na réplica', 'price': 10.0, 'stock': 1}])
+
+    # catálogo lê da réplica; leitura por id e leitura após escrita ficam no primário
+    assert [p['name'] for p in list_products_page()['items']] == ['Na réplica']
+    assert get_product_snapshot(1)['name'] == 'No primário'
+    db.session.execute(update(Product).values(stock=2))
+    assert [p['name'] for p in list_products_page()['items']] == ['No primário']
+
+
+@pytest.fixture
+def production(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'prod.db'}")
+    monkeypatch.setenv('STARTUP_MODE', 'production')
+    app = create_app()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _stamp_heads(app):
+    from app.services.startup import migration_heads
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(text('CREATE TABLE alembic_version (version_num VARCHAR(32))'))
+        for head in migration_heads():
+            db.session.execute(text('INSERT INTO alembic_version VALUES (:v)'), {'v': head})
+        db.session.commit()
+
+
+def test_production_startup_refuses_an_unmigrated_database(production):
+    from app.services.startup import prepare_database
+
+    assert 'migrate' not in production.extensions
+    with pytest.raises(RuntimeError, match='flask db upgrade'):
+        prepare_database(production)
+    with production.app_context():
+        assert not db.inspect(db.engine).has_table('produtos')
+
+
+def test_production_startup_accepts_a_migrated_database_and_preloads(production):
+    from app.services.startup import migration_heads, preload, prepare_database
+
+    assert len(migration_heads()) == 1
+    _stamp_heads(production)
+    prepare_database(production)
+    preload(production)
+    assert 'product/_card.html' in {key[1] for key in production.jinja_env.cache}
+    assert production.test_client().get('/').status_code == 200
+
+
+def test_development_startup_registers_flask_migrate(app):
+    assert 'migrate' in app.extensions
+
+
+def test_optional_services_are_created_on_first_use(app):
+    from app.services.checkout_queue import get_checkout_pool
+    from app.services.image_pipeline import get_image_pipeline
+
+    assert 'checkout_queue' not in app.extensions
+    assert 'image_pipeline' not in app.extensions
+    with app.app_context():
+        assert get_checkout_pool() is get_checkout_pool()
+        assert get_image_pipeline() is app.extensions['image_pipeline']
+
+
+def test_create_app_does_not_import_queue_or_extra_dialects(tmp_path):
+    import subprocess
+    import sys
+
+    code = ("import sys; from app.utils import create_app; create_app(); "
+            "print(sorted(m for m in ('app.services.checkout_queue', "
+            "'sqlalchemy.dialects.postgresql', 'PIL') if m in sys.modules))")
+    env = {**os.environ, 'STARTUP_MODE': 'production',
+           'DATABASE_URL': f"sqlite:///{tmp_path / 'boot.db'}"}
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                         env=env, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert out.stdout.strip() == '[]'
+
+
+@pytest.fixture
+def instrumented(app):
+    from app.services.instrumentation import init_instrumentation
+
+    app.config['INSTRUMENTATION'] = True
+    init_instrumentation(app)
+
+    @app.route('/_n_plus_one')
+    def n_plus_one():
+        ids = [p.id for p in Product.query.all()]
+        return jsonify([db.session.get(Product, pid).name for pid in ids])
+
+    seed(app, stock=1)
+    with app.app_context():
+        db.session.add_all([Product(name=f'Vinho {i}', price=10.0, stock=1)
+                            for i in range(6)])
+        db.session.commit()
+    client = app.test_client()
+    login(client)
+    return client
+
+
+def test_server_timing_reports_app_render_and_db_time(instrumented):
+    timing = instrumented.get('/produtos').headers['Server-Timing']
+    assert 'app;dur=' in timing and 'render;dur=' in timing
+    assert re.search(r'db;dur=[\d.]+;desc="\d+ queries"', timing)
+
+
+def test_metrics_count_requests_queries_and_n_plus_one(instrumented):
+    instrumented.get('/produtos')
+    instrumented.get('/_n_plus_one')
+    metrics = instrumented.get('/metrics').get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{endpoint="main.get_products"} 1' in metrics
+    assert 'http_request_sql_queries_bucket{endpoint="main.get_products",le="+Inf"} 1' in metrics
+    assert 'http_request_n_plus_one_total{endpoint="n_plus_one"} 1' in metrics
+    assert 'n_plus_one_total{endpoint="main.get_products"}' not in metrics
+
+
+def test_structured_logging_through_queue_with_levels_and_sampling(app):
+    from app.services.logging_config import init_logging, shutdown_logging
+
+    stream = io.StringIO()
+    app.config.update(LOG_LEVEL='WARNING', LOG_LEVELS={'app.routes': 'DEBUG'},
+                      LOG_SAMPLING={'catalog.page': 0.0})
+    init_logging(app, stream=stream)
+    seed(app, stock=1)
+    client = app.test_client()
+    login(client)
+    client.get('/produtos')  # evento amostrado a 0%: descartado
+    app.config['LOG_SAMPLING'] = {}
+    init_logging(app, stream=stream)
+    client.get('/produtos')
+    with app.app_context():
+        update_product(1, {'price': 60.0})  # DEBUG em app.models: abaixo do nível
+    shutdown_logging()
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [e['event'] for e in events] == ['catalog.page']
+    assert events[0]['logger'] == 'app.routes.routes' and events[0]['items'] == 1
+
+
+def test_sampling_filter_keeps_the_configured_fraction():
+    from app.services.logging_config import SamplingFilter
+
+    record = logging.LogRecord('app', logging.DEBUG, '', 0, 'x', (), None)
+    record.event = 'catalog.page'
+    sampler = SamplingFilter({'catalog.page': 0.25}, rng=iter([0.1, 0.9]).__next__)
+    assert sampler.filter(record) and record.sample_rate == 0.25
+    assert not sampler.filter(record)
+
+
+@pytest.fixture
+def flow_result(monkeypatch):
+    from benchmarks import flows
+
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    monkeypatch.setenv('DATABASE_URL', 'sqlite://')
+    monkeypatch.setenv('LOG_LEVEL', 'WARNING')
+    return flows.run('client', users=2, iterations=2, products=10, orders=5)
+
+
+def test_flow_benchmark_reports_percentiles_per_endpoint(flow_result):
+    assert flow_result['total'] == {**flow_result['total'], 'requests': 24, 'errors': 0}
+    assert set(flow_result['endpoints']) == {'get_products', 'get_products_id', 'cart_add',
+                                             'cart_view', 'cart_update', 'checkout'}
+    row = flow_result['endpoints']['checkout']
+    assert row['count'] == 4 and row['p50'] <= row['p95'] <= row['p99']
+
+
+def test_flow_benchmark_flags_regressions(flow_result):
+    from benchmarks import flows
+
+    assert flows.compare(flow_result, flow_result) == []
+    slower = json.loads(json.dumps(flow_result))
+    row = flow_result['endpoints']['checkout']
+    slower['endpoints']['checkout']['p95'] = row['p95'] * 2
+    slower['total']['rps'] = flow_result['total']['rps'] / 2
+    problems = flows.compare(flow_result, slower, tolerance=0.25)
+    assert len(problems) == 2 and problems[0].startswith('checkout: p95')